@@ -0,0 +1,183 @@
+"""Report the images and videos of the docs that no page uses, and the heaviest.
+
+Every Markdown and MDX page of the site, including the cookbook pages that
+build_cookbook.py moves to the versioned docs, is scanned once with the scanner
+of check_links.py. Its Markdown images, JSX `src`s and `href`s, and relative
+imports and requires build a graph from pages to the assets under the docs
+directories they reference. From that graph the report lists:
+
+- orphaned assets, which no page references, largest first
+- for the pages with the heaviest assets, their largest referenced assets
+
+The WebP variants optimize_assets.py writes next to images (`image.png.webp`)
+follow their image. Orphans are only deleted with --prune:
+
+    python _scripts/asset_report.py [--pages N] [--top N] [--prune] [--workers N]
+"""
+import argparse
+import os
+import sys
+import time
+from typing import NamedTuple
+
+from check_links import ROOT, LinkChecker, docs_directories, scan_site
+
+ASSET_SUFFIXES = (".png", ".jpg", ".jpeg", ".gif", ".svg", ".webp", ".mp4", ".webm")
+# Written next to images by optimize_assets.py
+VARIANT_SUFFIX = ".webp"
+
+
+class Reference(NamedTuple):
+    """A use of an asset by a page."""
+
+    page: str
+    line: int
+
+
+def find_assets() -> dict:
+    """
+    Find the images and videos under the docs directories.
+
+    :return: The size of each asset, by path relative to the repository root
+    """
+    assets = {}
+    for directory, _ in docs_directories():
+        for dirpath, _, files in os.walk(directory):
+            for file in files:
+                if file.lower().endswith(ASSET_SUFFIXES):
+                    path = os.path.join(dirpath, file)
+                    assets[os.path.relpath(path, ROOT)] = os.path.getsize(path)
+    return assets
+
+
+def asset_references(pages: list, assets: dict) -> dict:
+    """
+    Build the graph of the assets referenced by pages.
+
+    :param pages: The pages of the site, as returned by `scan_site`
+    :param assets: The assets to look for, as returned by `find_assets`
+    :return: The references to each asset, by path; unreferenced assets are
+        mapped to an empty list
+    """
+    checker = LinkChecker(pages, [], anchors=False)
+    references = {asset: [] for asset in assets}
+    for page in pages:
+        for link in page.links + page.imports:
+            file = checker.linked_file(page, link.target)
+            if file in references:
+                references[file].append(Reference(page.path, link.line))
+    for asset in assets:
+        image = asset[: -len(VARIANT_SUFFIX)]
+        if asset.endswith(VARIANT_SUFFIX) and image in references:
+            references[asset] = references[image]
+    return references
+
+
+def page_assets(references: dict) -> dict:
+    """Invert the reference graph: the assets each page uses, by page."""
+    pages = {}
+    for asset, uses in references.items():
+        for page in dict.fromkeys(use.page for use in uses):
+            pages.setdefault(page, []).append(asset)
+    return pages
+
+
+def _format_size(size: int) -> str:
+    if size >= 1024 * 1024:
+        return f"{size / 1024 / 1024:,.1f} MB"
+    return f"{size / 1024:,.0f} KB"
+
+
+def format_report(assets: dict, references: dict, pages: int, top: int) -> str:
+    """
+    Render the orphans and the heaviest pages as text.
+
+    :param assets: The size of each asset, by path
+    :param references: The references to each asset, by path
+    :param pages: How many of the heaviest pages to list (0 for all)
+    :param top: How many of the largest assets of each page to list
+    """
+    orphans = sorted(
+        (asset for asset, uses in references.items() if not uses),
+        key=lambda asset: (-assets[asset], asset),
+    )
+    lines = [
+        f"{len(orphans)} orphaned assets, "
+        f"{_format_size(sum(assets[asset] for asset in orphans))}:"
+    ]
+    lines.extend(f"{_format_size(assets[a]):>10}  {a}" for a in orphans)
+    used = sorted(
+        page_assets(references).items(),
+        key=lambda item: (-sum(assets[asset] for asset in item[1]), item[0]),
+    )
+    lines.append("")
+    lines.append(f"Largest assets of the {len(used[:pages or None])} heaviest pages:")
+    for page, page_uses in used[: pages or None]:
+        page_uses.sort(key=lambda asset: (-assets[asset], asset))
+        total = sum(assets[asset] for asset in page_uses)
+        lines.append(f"{_format_size(total):>10}  {page} ({len(page_uses)} assets)")
+        lines.extend(
+            f"{_format_size(assets[asset]):>22}  {asset}" for asset in page_uses[:top]
+        )
+    return "\n".join(lines)
+
+
+def prune(references: dict) -> list:
+    """
+    Delete the assets no page references.
+
+    :return: The deleted files
+    """
+    removed = []
+    for asset, uses in sorted(references.items()):
+        if not uses:
+            os.remove(ROOT / asset)
+            removed.append(asset)
+    return removed
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--pages",
+        type=int,
+        default=20,
+        help="How many of the heaviest pages to list; 0 for all (default: 20).",
+    )
+    parser.add_argument(
+        "--top",
+        type=int,
+        default=3,
+        help="How many of the largest assets of each page to list (default: 3).",
+    )
+    parser.add_argument(
+        "--prune",
+        action="store_true",
+        help="Delete the orphaned assets.",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=None,
+        help="Number of worker processes (default: CPU count).",
+    )
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    pages = scan_site(args.workers)
+    assets = find_assets()
+    references = asset_references(pages, assets)
+    print(format_report(assets, references, args.pages, args.top))
+    if args.prune:
+        for removed in prune(references):
+            print(f"Removed {removed}")
+    print(
+        f"\nIndexed {len(assets)} assets, "
+        f"{_format_size(sum(assets.values()))}, from {len(pages)} pages "
+        f"in {time.perf_counter() - start:.2f}s"
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,65 @@
+"""Measure how long the cookbook build takes to start for each command.
+
+Every measurement runs in a fresh interpreter, so nothing is already imported.
+`move` only imports `build_cookbook`; `convert` and `all` also import
+`notebook_export` with nbconvert, Black and BeautifulSoup, which is what every
+command used to pay:
+
+    python _scripts/benchmarks/bench_import_time.py [--repeat 7]
+
+Pass -X importtime through `--importtime` to see where the time goes.
+"""
+import argparse
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).parents[2]
+SCRIPTS = ROOT / "subdirectories" / "scripts"
+
+CASES = {
+    "interpreter": "pass",
+    "move": "import build_cookbook",
+    "convert": "import build_cookbook, notebook_export",
+}
+
+
+def time_import(code: str, repeat: int) -> float:
+    """Return the best wall time, in seconds, of running code in a new interpreter."""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, "-c", code], cwd=SCRIPTS, check=True)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=7)
+    parser.add_argument(
+        "--importtime",
+        choices=[case for case in CASES if case != "interpreter"],
+        help="Print the -X importtime tree of a command instead.",
+    )
+    args = parser.parse_args()
+
+    if args.importtime:
+        return subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", CASES[args.importtime]],
+            cwd=SCRIPTS,
+        ).returncode
+
+    timings = {case: time_import(code, args.repeat) for case, code in CASES.items()}
+    startup = timings.pop("interpreter")
+    print(f"interpreter:  {startup * 1000:.1f} ms")
+    for case, seconds in timings.items():
+        print(f"{case + ':':<13} {(seconds - startup) * 1000:.1f} ms of imports")
+    speedup = (timings["convert"] - startup) / (timings["move"] - startup)
+    print(f"move imports {speedup:.1f}x faster than convert")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
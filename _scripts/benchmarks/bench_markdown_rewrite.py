@@ -0,0 +1,179 @@
+"""Benchmark the cookbook Markdown rewrite against the previous chain of passes.
+
+Runs both implementations over every Markdown file of a cookbook checkout,
+checks that they produce identical output and reports the timings:
+
+    python _scripts/benchmarks/bench_markdown_rewrite.py [cookbook_dir]
+
+Without a cookbook checkout, the MDX pages of the docs make a stand-in corpus:
+on the 176 pages of docs/ (1.3 MB), the outputs are identical and the single
+pass is about 1.2x faster (1.14x to 1.29x over four runs of `docs --suffix .mdx
+--repeat 20`).
+"""
+import argparse
+import os
+import re
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).parents[2]
+sys.path.insert(0, str(ROOT / "subdirectories" / "scripts"))
+
+from build_cookbook import _REPO_ROOT, add_github_backlink, rewrite_markdown  # noqa: E402
+
+
+def legacy_rewrite_markdown(content: str, rel_dir: str) -> str:
+    """The sequence of full-text passes that `move_to_docs` used to apply."""
+    content = content.replace("img/", "static/")
+
+    def replace_relative_link(match):
+        match_group = match.group(1)
+        if match_group.startswith("../"):
+            path_parts = rel_dir.split(os.sep)
+            relative_parts = match_group.split("/")
+            while relative_parts and relative_parts[0] == "..":
+                relative_parts.pop(0)
+                path_parts.pop()
+            relative_link = "/".join(relative_parts)
+            absolute_link = os.path.join("/old/cookbook", *path_parts, relative_link)
+        else:
+            absolute_link = os.path.join("/old/cookbook", rel_dir, match_group)
+        absolute_link = absolute_link.replace("/./", "/")
+        if "/static/" in absolute_link:
+            return f"]({match_group})".replace("/./", "/")
+        return f"]({absolute_link})"
+
+    content = re.compile(r"\]\((\.{1,2}/[^\)]+)\)").sub(replace_relative_link, content)
+
+    def replace_code_links(match):
+        relative_link = match.group(1).lstrip("./")
+        absolute_link = (
+            os.path.join(_REPO_ROOT, "blob/main", rel_dir, relative_link)
+            .replace("/./", "/")
+            .replace("/cookbook/", "/")
+        )
+        return f"]({absolute_link})"
+
+    content = re.compile(r"\]\(([^)]*\.(py|ts|txt|json))\)").sub(
+        replace_code_links, content
+    )
+
+    def replace_md_ipynb_links(match):
+        relative_link = match.group(1)
+        if relative_link.startswith("http"):
+            return match.group(0)
+        parent_dir = os.path.normpath(os.path.dirname(relative_link))
+        return f"]({parent_dir})"
+
+    content = re.sub(r"^\s*<!--.*?-->", "", content, flags=re.MULTILINE | re.DOTALL)
+    content = re.sub(
+        r"(^#\s+.*?)(\&amp;)(.*?$)", r"\1&\3", content, flags=re.MULTILINE
+    )
+    content = re.compile(r"\]\(([^)]*\.(md|ipynb))\)").sub(
+        replace_md_ipynb_links, content
+    )
+
+    in_code_block = False
+    new_content = ""
+    for line in content.split("\n"):
+        if line.startswith("```"):
+            in_code_block = not in_code_block
+        if not in_code_block:
+            line = line.replace("<", "&lt;")
+            line = line.replace(">", "&gt;")
+            line = line.replace("{", "&#123;")
+            line = line.replace("}", "&#125;")
+        new_content += line + "\n"
+    content = new_content
+
+    content = re.sub(r"\((?!http:|https:).*?(/README\.md\))", "(/)", content)
+    return add_github_backlink(content).strip()
+
+
+def _outcome(rewrite, content: str, rel_dir: str):
+    try:
+        return rewrite(content, rel_dir)
+    except IndexError as e:
+        # Links climbing above the cookbook root fail in both implementations.
+        return repr(e)
+
+
+def load_corpus(root: Path, suffixes: tuple) -> list:
+    """Return (relative directory, content) for every matching file under root."""
+    corpus = []
+    for path in sorted(root.rglob("*")):
+        if path.suffix in suffixes and path.is_file():
+            rel_dir = os.path.relpath(path.parent, root)
+            corpus.append((rel_dir, path.read_text(encoding="utf-8")))
+    return corpus
+
+
+def time_rewrites(rewrites: list, corpus: list, repeat: int) -> list:
+    """
+    Return the best total time, in seconds, of rewriting the whole corpus with
+    each implementation.
+
+    Repetitions alternate between the implementations, so that a change in the
+    machine's speed during the run affects them alike.
+    """
+    best = [float("inf")] * len(rewrites)
+    for _ in range(repeat):
+        for index, rewrite in enumerate(rewrites):
+            start = time.perf_counter()
+            for rel_dir, content in corpus:
+                rewrite(content, rel_dir)
+            best[index] = min(best[index], time.perf_counter() - start)
+    return best
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "corpus",
+        nargs="?",
+        default=str(ROOT / "subdirectories" / "langsmith-cookbook"),
+        help="Directory of Markdown files (default: the cookbook checkout).",
+    )
+    parser.add_argument(
+        "--suffix",
+        action="append",
+        help="File suffix to include (repeatable, default: .md).",
+    )
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    corpus = load_corpus(Path(args.corpus), tuple(args.suffix or [".md"]))
+    if not corpus:
+        print(f"No Markdown files found under {args.corpus}")
+        return 1
+
+    mismatches = [
+        rel_dir
+        for rel_dir, content in corpus
+        if _outcome(legacy_rewrite_markdown, content, rel_dir)
+        != _outcome(rewrite_markdown, content, rel_dir)
+    ]
+    corpus = [
+        (rel_dir, content)
+        for rel_dir, content in corpus
+        if not _outcome(rewrite_markdown, content, rel_dir).startswith("IndexError")
+    ]
+    legacy, single_pass = time_rewrites(
+        [legacy_rewrite_markdown, rewrite_markdown], corpus, args.repeat
+    )
+    size = sum(len(content) for _, content in corpus)
+
+    print(f"files:        {len(corpus)} ({size / 1e6:.1f} MB)")
+    print(f"legacy chain: {legacy * 1000:.1f} ms")
+    print(f"single pass:  {single_pass * 1000:.1f} ms")
+    print(f"speedup:      {legacy / single_pass:.2f}x")
+    if mismatches:
+        print(f"{len(mismatches)} files differ, e.g. in {mismatches[0]}")
+        return 1
+    print("outputs identical")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,592 @@
+"""Benchmark the docs build stages on synthetic corpora and flag regressions.
+
+MDX pages full of PythonBlock/TypeScriptBlock code tabs and ```python fences,
+and notebooks with large HTML DataFrame outputs and embedded images, are
+generated at several scales. Every stage is timed on them and compared with
+the stored baseline:
+
+    python _scripts/benchmarks/run_benchmarks.py [--scale small] [--update-baseline]
+
+Everything is generated locally from a fixed seed, so the suite runs offline and
+always measures the same inputs. Timings are normalized by a fixed pure-Python
+calibration workload timed just before and after each stage, so that a baseline
+recorded on one machine, or under another load, is still meaningful. A stage is
+flagged when its normalized time exceeds the baseline by more than the
+threshold in every one of up to 1 + --confirm rounds of timing. The best time
+of some stages (BeautifulSoup's in clean_markdown) shifts by a third between
+otherwise identical rounds, so the baseline keeps the fastest of as many rounds
+and, as a per-stage noise margin added to the threshold, how much slower the
+slowest of them was.
+"""
+import argparse
+import base64
+import contextlib
+import functools
+import gc
+import io
+import json
+import os
+import platform
+import random
+import re
+import shutil
+import struct
+import sys
+import tempfile
+import time
+import zlib
+from pathlib import Path
+from typing import Callable, NamedTuple, Optional
+
+ROOT = Path(__file__).parents[2]
+sys.path.insert(0, str(ROOT / "_scripts"))
+sys.path.insert(0, str(ROOT / "subdirectories" / "scripts"))
+
+import nbformat  # noqa: E402
+
+import extract_python_blocks  # noqa: E402
+import extract_ts_blocks  # noqa: E402
+import mdx_index  # noqa: E402
+from build_cookbook import replace_brackets, rewrite_markdown  # noqa: E402
+from notebook_export import clean_markdown, convert_notebooks_to_markdown  # noqa: E402
+
+BASELINE_PATH = Path(__file__).with_name("baseline.json")
+BASELINE_VERSION = 2
+SEED = 1234
+# Runs of the calibration workload before and after each stage
+CALIBRATION_REPEAT = 3
+
+
+class Scale(NamedTuple):
+    mdx_files: int
+    # Code tabs and fences per MDX file
+    blocks: int
+    notebooks: int
+    # Code cells per notebook
+    cells: int
+    # Rows of each DataFrame output
+    rows: int
+
+
+SCALES = {
+    "small": Scale(mdx_files=40, blocks=6, notebooks=3, cells=8, rows=40),
+    "medium": Scale(mdx_files=200, blocks=12, notebooks=8, cells=16, rows=120),
+    "large": Scale(mdx_files=800, blocks=24, notebooks=20, cells=32, rows=400),
+}
+
+_PYTHON_SNIPPETS = [
+    'from langsmith import Client\\n\nclient = Client()\nproject = "{name}"\\n\n'
+    'runs = client.list_runs(\n    project_name=project,\n    filter=\'eq(name, "{name}")\',\n)',
+    "import asyncio\\n\nasync def main():\n    await asyncio.sleep({n})\\n\n"
+    "asyncio.run(main())",
+    "from langsmith import traceable\\n\n@traceable\ndef step_{n}(x: int) -> int:\n"
+    '    """Return x plus {n}."""\n    return x + {n}\\n\nstep_{n}({n})',
+    'examples = [\n  {{"inputs": {{"question": "{name}?"}}, '
+    '"outputs": {{"answer": "{name}"}}}},\n]\\n\nprint(len(examples))',
+]
+_TYPESCRIPT_SNIPPETS = [
+    'import {{ Client }} from "langsmith";\nconst client = new Client();\\n\n'
+    'for await (const run of client.listRuns({{ projectName: "{name}" }})) {{\n'
+    "  console.log(run.id);\n}}",
+    'import {{ traceable }} from "langsmith/traceable";\\n\n'
+    "const step{n} = traceable(async (x: number) => x + {n});\nawait step{n}({n});",
+]
+_PROSE = (
+    "LangSmith lets you trace, evaluate and monitor {name}. See the "
+    "[reference](/reference/{name}) for details, or the `{name}` helper below.\n"
+)
+
+
+def _words(rng: random.Random, count: int) -> str:
+    return "_".join(rng.choice(["alpha", "beta", "gamma", "delta"]) for _ in range(count))
+
+
+def generate_mdx_corpus(root: Path, scale: Scale, rng: random.Random) -> list:
+    """Write synthetic MDX pages and return their paths."""
+    paths = []
+    for i in range(scale.mdx_files):
+        lines = [
+            "---",
+            f"sidebar_position: {i}",
+            "---",
+            "",
+            'import { CodeTabs, PythonBlock, TypeScriptBlock } from "@site/src/components/InstructionsWithCode";',
+            "",
+            f"# Page {i}",
+            "",
+        ]
+        for j in range(scale.blocks):
+            name = _words(rng, 2)
+            lines.append(_PROSE.format(name=name) * rng.randint(1, 4))
+            python = rng.choice(_PYTHON_SNIPPETS).format(name=name, n=j)
+            if j % 3 == 2:
+                lines += ["```python", python.replace("\\n", ""), "```", ""]
+                continue
+            typescript = rng.choice(_TYPESCRIPT_SNIPPETS).format(name=name, n=j)
+            lines += [
+                "<CodeTabs",
+                "  tabs={[",
+                f"    PythonBlock(`{python}`),",
+                f"    TypeScriptBlock(`{typescript}`),",
+                "  ]}",
+                '  groupId="client-language"',
+                "/>",
+                "",
+            ]
+        path = root / f"section{i % 10}" / f"page{i}.mdx"
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text("\n".join(lines))
+        paths.append(path)
+    return paths
+
+
+def _png(width: int, height: int, rng: random.Random) -> bytes:
+    """Encode an RGB PNG of random pixels."""
+
+    def chunk(tag: bytes, data: bytes) -> bytes:
+        return (
+            struct.pack(">I", len(data))
+            + tag
+            + data
+            + struct.pack(">I", zlib.crc32(tag + data))
+        )
+
+    rows = b"".join(b"\x00" + rng.randbytes(width * 3) for _ in range(height))
+    header = struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)
+    return (
+        b"\x89PNG\r\n\x1a\n"
+        + chunk(b"IHDR", header)
+        + chunk(b"IDAT", zlib.compress(rows))
+        + chunk(b"IEND", b"")
+    )
+
+
+def _dataframe_html(rows: int, rng: random.Random) -> str:
+    """Render a table the way pandas renders a DataFrame in a notebook."""
+    columns = ["input", "output", "score", "latency"]
+    body = "".join(
+        "    <tr>\n      <th>{}</th>\n{}    </tr>\n".format(
+            row,
+            "".join(
+                f"      <td>{rng.random():.3f}</td>\n"
+                if column == "score"
+                else f"      <td>{_words(rng, 3)}</td>\n"
+                for column in columns
+            ),
+        )
+        for row in range(rows)
+    )
+    header = "".join(f"      <th>{column}</th>\n" for column in columns)
+    return (
+        "<div>\n<style scoped>\n"
+        "    .dataframe tbody tr th:only-of-type {\n        vertical-align: middle;\n    }\n"
+        "    .dataframe thead th {\n        text-align: right;\n    }\n"
+        "</style>\n"
+        '<table border="1" class="dataframe">\n  <thead>\n'
+        f'    <tr style="text-align: right;">\n      <th></th>\n{header}    </tr>\n'
+        f"  </thead>\n  <tbody>\n{body}  </tbody>\n</table>\n</div>"
+    )
+
+
+def generate_notebook_corpus(root: Path, scale: Scale, rng: random.Random) -> list:
+    """Write synthetic notebooks and return their paths."""
+    paths = []
+    for i in range(scale.notebooks):
+        cells = [
+            nbformat.v4.new_markdown_cell(
+                f"# Notebook {i}\n\n"
+                "[![Open In Collab](https://colab.research.google.com/assets/colab-badge.svg)]"
+                f"(https://colab.research.google.com/github/langchain-ai/langsmith-cookbook/blob/main/nb{i}.ipynb)"
+            )
+        ]
+        for j in range(scale.cells):
+            name = _words(rng, 2)
+            cells.append(
+                nbformat.v4.new_markdown_cell(
+                    f"## Step {j} <{name}>\n\nUse `{{{name}}}` as in [the guide](../nb{j}/nb{j}.ipynb)."
+                )
+            )
+            code = nbformat.v4.new_code_cell(
+                f"def   step_{j}( x ):\n  return {{'{name}' : x}}\nstep_{j}( {j} )",
+                metadata={"tags": ["black"]},
+            )
+            kind = j % 3
+            if kind == 0:
+                code.outputs = [
+                    nbformat.v4.new_output(
+                        "execute_result",
+                        data={
+                            "text/html": _dataframe_html(scale.rows, rng),
+                            "text/plain": f"<DataFrame {name}>",
+                        },
+                        execution_count=j,
+                    )
+                ]
+            elif kind == 1:
+                image = base64.b64encode(_png(64, 48, rng)).decode()
+                code.outputs = [
+                    nbformat.v4.new_output("display_data", data={"image/png": image})
+                ]
+            else:
+                code.outputs = [
+                    nbformat.v4.new_output(
+                        "stream", name="stdout", text=f"```\n{name}\n```\n" * 5
+                    )
+                ]
+            cells.append(code)
+        path = root / f"group{i % 3}" / f"nb{i}" / f"nb{i}.ipynb"
+        path.parent.mkdir(parents=True, exist_ok=True)
+        nbformat.write(nbformat.v4.new_notebook(cells=cells), str(path))
+        paths.append(path)
+    return paths
+
+
+def best_time(
+    run: Callable[[], None], repeat: int, setup=None, min_total: float = 1.0
+) -> float:
+    """
+    Return the best wall time of at least `repeat` runs, excluding `setup`.
+
+    Fast stages are repeated until `min_total` seconds were spent on them (up to
+    100 runs), so that their best time is as stable as that of slow ones. Like
+    `timeit`, garbage collection is disabled while timing, so that collections
+    triggered by earlier stages don't land in later ones.
+    """
+    best = float("inf")
+    runs = 0
+    total = 0.0
+    while runs < repeat or (total < min_total and runs < 100):
+        runs += 1
+        if setup is not None:
+            setup()
+        gc.collect()
+        gc.disable()
+        try:
+            start = time.perf_counter()
+            run()
+            elapsed = time.perf_counter() - start
+        finally:
+            gc.enable()
+        best = min(best, elapsed)
+        total += elapsed
+    return best
+
+
+def calibrate(repeat: int) -> float:
+    """Time a fixed pure-Python workload that stands in for the machine's speed."""
+
+    def work():
+        text = "".join(f"<td>{i}</td>{'{'}x{'}'}\n" for i in range(100_000))
+        re.findall(r"<td>(\d+)</td>", text)
+        "\n".join(line.replace("{", "&#123;") for line in text.split("\n"))
+        sorted(text.split("\n"), key=len)
+
+    return best_time(work, repeat, min_total=0)
+
+
+class Timing(NamedTuple):
+    seconds: float
+    # The calibration workload's time, measured around the stage
+    calibration: float
+    # How much slower, as a fraction, the slowest round was than this one
+    noise: float = 0.0
+
+    @property
+    def normalized(self) -> float:
+        return self.seconds / self.calibration
+
+
+def time_stage(
+    run: Callable[[], None],
+    setup: Optional[Callable[[], None]],
+    repeat: int,
+    rounds: int = 1,
+    done: Optional[Callable[[Timing], bool]] = None,
+) -> Timing:
+    """
+    Time a stage in up to `rounds` rounds and return its fastest normalized timing.
+
+    Each round calibrates just before and after timing the stage, so that the
+    machine's speed is sampled when the stage runs. Rounds stop early once
+    `done` accepts the fastest timing so far.
+    """
+    timings = []
+    for _ in range(rounds):
+        before = calibrate(CALIBRATION_REPEAT)
+        seconds = best_time(run, repeat, setup)
+        timings.append(Timing(seconds, min(before, calibrate(CALIBRATION_REPEAT))))
+        fastest = min(timings, key=lambda timing: timing.normalized)
+        if done is not None and done(fastest):
+            break
+    slowest = max(timing.normalized for timing in timings)
+    return fastest._replace(noise=slowest / fastest.normalized - 1)
+
+
+def scale_stages(scale: Scale, workdir: Path) -> dict:
+    """Generate the corpora of a scale and return its stages as (run, setup)."""
+    rng = random.Random(SEED)
+    mdx_files = [str(path) for path in generate_mdx_corpus(workdir / "mdx", scale, rng)]
+    # The extractors read the corpus from its own code block index, like they
+    # read docs/ from theirs; the index stage times tokenizing it from scratch.
+    mdx_index.use_index(workdir / "mdx-index.sqlite", workdir / "mdx")
+
+    def rebuild_index():
+        index = mdx_index.MdxIndex(workdir / "rebuilt-index.sqlite", workdir / "mdx")
+        index.refresh()
+        index.close()
+
+    def remove_rebuilt_index():
+        for path in workdir.glob("rebuilt-index.sqlite*"):
+            path.unlink()
+
+    notebooks_root = workdir / "notebooks"
+    notebooks = generate_notebook_corpus(notebooks_root, scale, rng)
+    html_outputs = [
+        output["data"]["text/html"]
+        for notebook in notebooks
+        for cell in nbformat.read(str(notebook), as_version=4).cells
+        for output in cell.get("outputs", [])
+        if "text/html" in output.get("data", {})
+    ]
+
+    convert_root = workdir / "convert"
+
+    def fresh_notebooks():
+        shutil.rmtree(convert_root, ignore_errors=True)
+        shutil.copytree(notebooks_root, convert_root)
+
+    def convert():
+        # Keep tqdm's progress bars out of the report.
+        with contextlib.redirect_stderr(io.StringIO()):
+            convert_notebooks_to_markdown(str(convert_root), workers=1)
+
+    fresh_notebooks()
+    convert()
+    markdown = [
+        (os.path.relpath(path.parent, convert_root), path.read_text())
+        for path in sorted(convert_root.rglob("*.md"))
+    ]
+
+    def extract_python():
+        extract_python_blocks._list_runs_transform.cache_clear()
+        for mdx_file in mdx_files:
+            extract_python_blocks.extract_code_blocks(mdx_file)
+
+    def extract_typescript():
+        for mdx_file in mdx_files:
+            extract_ts_blocks.extract_code_blocks(mdx_file)
+
+    return {
+        "mdx_index": (rebuild_index, remove_rebuilt_index),
+        "extract_python_blocks": (extract_python, None),
+        "extract_ts_blocks": (extract_typescript, None),
+        "clean_markdown": (lambda: [clean_markdown(html) for html in html_outputs], None),
+        "replace_brackets": (
+            lambda: [replace_brackets(content) for _, content in markdown],
+            None,
+        ),
+        "rewrite_markdown": (
+            lambda: [rewrite_markdown(content, rel_dir) for rel_dir, content in markdown],
+            None,
+        ),
+        "convert_notebooks_to_markdown": (convert, fresh_notebooks),
+    }
+
+
+def benchmark_scale(
+    scale: Scale,
+    workdir: Path,
+    repeat: int,
+    rounds: int = 1,
+    baseline: Optional[dict] = None,
+    threshold: float = 0.25,
+) -> dict:
+    """
+    Time every stage of a scale.
+
+    Without a baseline, each stage is timed in `rounds` rounds. With one, only
+    the stages that regressed in the first round are timed again, in up to
+    `rounds` rounds in all, to tell a regression from a slow round.
+
+    Returns:
+    - dict: The fastest Timing of each stage, by name.
+    """
+    results = {}
+    for name, (run, setup) in scale_stages(scale, workdir).items():
+        base = (baseline or {}).get(name)
+        done = None
+        if baseline is not None:
+            done = functools.partial(_not_regressed, base=base, threshold=threshold)
+        results[name] = time_stage(run, setup, repeat, rounds, done)
+    return results
+
+
+def _not_regressed(timing: Timing, base: Optional[dict], threshold: float) -> bool:
+    return base is None or classify(timing, base, threshold) != "REGRESSION"
+
+
+class Comparison(NamedTuple):
+    scale: str
+    stage: str
+    seconds: float
+    # The baseline time, rescaled to the machine's speed when the stage ran
+    expected: Optional[float]
+    status: str
+
+
+def expected_seconds(timing: Timing, base: dict) -> float:
+    """Rescale a baseline entry to the calibration measured around `timing`."""
+    return base["seconds"] * timing.calibration / base["calibration"]
+
+
+def classify(
+    timing: Timing, base: dict, threshold: float, min_delta: float = 0.005
+) -> str:
+    """
+    Compare a timing with its baseline entry.
+
+    A stage regressed when it is slower than its rescaled baseline time by more
+    than `threshold` plus the noise measured when recording the baseline (both
+    fractions), and by more than `min_delta` seconds, which keeps timer noise on
+    tiny stages from being flagged.
+    """
+    expected = expected_seconds(timing, base)
+    delta = timing.seconds - expected
+    if delta > expected * (threshold + base.get("noise", 0)) and delta > min_delta:
+        return "REGRESSION"
+    if -delta > expected * threshold and -delta > min_delta:
+        return "improved"
+    return "ok"
+
+
+def compare(results: dict, baseline: Optional[dict], threshold: float) -> list:
+    """Compare the Timing of every stage with a baseline."""
+    comparisons = []
+    for scale, stages in results.items():
+        for stage, timing in stages.items():
+            expected = None
+            status = "new"
+            base = (baseline or {}).get("results", {}).get(scale, {}).get(stage)
+            if base is not None:
+                expected = expected_seconds(timing, base)
+                status = classify(timing, base, threshold)
+            comparisons.append(
+                Comparison(scale, stage, timing.seconds, expected, status)
+            )
+    return comparisons
+
+
+def format_comparisons(comparisons: list) -> str:
+    lines = [
+        f"{'scale':<8} {'stage':<32} {'time':>10} {'baseline':>10} {'change':>8}  status"
+    ]
+    for c in comparisons:
+        expected = f"{c.expected * 1000:8.1f}ms" if c.expected else f"{'-':>10}"
+        change = (
+            f"{(c.seconds / c.expected - 1) * 100:+7.1f}%" if c.expected else f"{'-':>8}"
+        )
+        lines.append(
+            f"{c.scale:<8} {c.stage:<32} {c.seconds * 1000:8.1f}ms {expected} {change}"
+            f"  {c.status}"
+        )
+    return "\n".join(lines)
+
+
+def load_baseline(path: Path) -> Optional[dict]:
+    if not path.exists():
+        return None
+    baseline = json.loads(path.read_text())
+    return baseline if baseline.get("version") == BASELINE_VERSION else None
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--scale",
+        action="append",
+        choices=list(SCALES),
+        help="Scale to run (repeatable, default: small and medium).",
+    )
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.25,
+        help="Slowdown, as a fraction of the baseline, flagged as a regression "
+        "(default: 0.25).",
+    )
+    parser.add_argument(
+        "--confirm",
+        type=int,
+        default=3,
+        help="Rounds of timing added to confirm a regression before flagging it; "
+        "the baseline keeps the fastest of 1 + N rounds (default: 3).",
+    )
+    parser.add_argument("--baseline", default=str(BASELINE_PATH))
+    parser.add_argument(
+        "--update-baseline",
+        action="store_true",
+        help="Store these timings as the baseline of the scales that were run.",
+    )
+    parser.add_argument("--json", help="Write the timings and comparisons here.")
+    args = parser.parse_args()
+
+    scales = args.scale or ["small", "medium"]
+    baseline_path = Path(args.baseline)
+    baseline = load_baseline(baseline_path)
+    rounds = 1 + args.confirm
+    results = {}
+    for name in scales:
+        # Recording a baseline times every stage in all rounds.
+        scale_baseline = None
+        if not args.update_baseline:
+            scale_baseline = (baseline or {}).get("results", {}).get(name, {})
+        with tempfile.TemporaryDirectory(prefix=f"bench-{name}-") as workdir:
+            results[name] = benchmark_scale(
+                SCALES[name],
+                Path(workdir),
+                args.repeat,
+                rounds,
+                scale_baseline,
+                args.threshold,
+            )
+
+    comparisons = compare(results, baseline, args.threshold)
+    print(format_comparisons(comparisons))
+
+    results = {
+        scale: {stage: timing._asdict() for stage, timing in stages.items()}
+        for scale, stages in results.items()
+    }
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(
+                {
+                    "results": results,
+                    "comparisons": [c._asdict() for c in comparisons],
+                },
+                f,
+                indent=2,
+            )
+    if args.update_baseline:
+        # Entries carry their own calibration, so scales that weren't run are kept.
+        kept = {} if baseline is None else baseline["results"]
+        baseline_path.write_text(
+            json.dumps(
+                {
+                    "version": BASELINE_VERSION,
+                    "python": platform.python_version(),
+                    "results": {**kept, **results},
+                },
+                indent=2,
+                sort_keys=True,
+            )
+            + "\n"
+        )
+        print(f"Baseline written to {baseline_path}")
+        return 0
+    return 1 if any(c.status == "REGRESSION" for c in comparisons) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,297 @@
+"""Per-stage instrumentation for the docs build scripts.
+
+Code marks its stages with `PROFILER.stage(name, file=...)`. While profiling is
+enabled, every stage records its call count, wall time and, optionally, peak
+memory, both in total and per input file, so a slow notebook or MDX page stands
+out. Stages nest: the time and memory of a stage include its inner stages, and a
+stage without a file is attributed to the file of the stage it runs in.
+
+Profiling is off by default, and a disabled stage costs next to nothing. Scripts
+enable it with the options added by `add_profiling_arguments`:
+
+    --profile report.json  Write a JSON report of the stages
+    --profile-memory       Also record peak memory (slows the build down)
+    --cprofile out.prof    Dump cProfile stats of the main process
+
+The report has the form:
+
+    {
+      "wall_time": 12.3,
+      "memory_tracked": false,
+      "stages": {"convert": {"calls": 10, "wall_time": 8.1, "peak_memory": null}},
+      "files": {"path/to/notebook.ipynb": {"convert": {...}, ...}}
+    }
+
+Stages and files are sorted by decreasing wall time. Peak memory is in bytes and
+only counts memory allocated by Python.
+"""
+import argparse
+import contextlib
+import cProfile
+import functools
+import json
+import os
+import time
+import tracemalloc
+from typing import Any, Callable, Iterator, Optional
+
+
+class _Frame:
+    __slots__ = ("file", "start_memory", "peak_memory")
+
+    def __init__(self, file: Optional[str]):
+        self.file = file
+        self.start_memory = 0
+        self.peak_memory = 0
+
+
+def _record(table: dict, name: str, calls: int, wall_time: float, peak_memory) -> None:
+    entry = table.setdefault(name, {"calls": 0, "wall_time": 0.0, "peak_memory": None})
+    entry["calls"] += calls
+    entry["wall_time"] += wall_time
+    if peak_memory is not None:
+        entry["peak_memory"] = max(entry["peak_memory"] or 0, peak_memory)
+
+
+def _by_wall_time(table: dict) -> dict:
+    return dict(sorted(table.items(), key=lambda item: -item[1]["wall_time"]))
+
+
+class Profiler:
+    """Collects per-stage and per-file statistics while enabled."""
+
+    def __init__(self):
+        self.enabled = False
+        self.track_memory = False
+        self.reset()
+
+    def reset(self) -> None:
+        self.stages = {}
+        self.files = {}
+        self._stack = []
+        self._start = time.perf_counter()
+
+    def enable(self, track_memory: bool = False) -> None:
+        self.enabled = True
+        self.track_memory = track_memory
+        if track_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        self._start = time.perf_counter()
+
+    def disable(self) -> None:
+        self.enabled = False
+        if self.track_memory and tracemalloc.is_tracing():
+            tracemalloc.stop()
+        self.track_memory = False
+
+    @contextlib.contextmanager
+    def stage(self, name: str, file: Optional[str] = None) -> Iterator[None]:
+        """
+        Record the execution of a block as a stage.
+
+        :param name: Name of the stage
+        :param file: The input file the stage works on (default: the file of
+            the enclosing stage, if any)
+        """
+        if not self.enabled:
+            yield
+            return
+        parent = self._stack[-1] if self._stack else None
+        frame = _Frame(str(file) if file is not None else parent and parent.file)
+        if self.track_memory:
+            current, peak = tracemalloc.get_traced_memory()
+            if parent is not None:
+                parent.peak_memory = max(parent.peak_memory, peak)
+            tracemalloc.reset_peak()
+            frame.start_memory = frame.peak_memory = current
+        self._stack.append(frame)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            wall_time = time.perf_counter() - start
+            self._stack.pop()
+            peak_memory = None
+            if self.track_memory:
+                frame.peak_memory = max(
+                    frame.peak_memory, tracemalloc.get_traced_memory()[1]
+                )
+                peak_memory = frame.peak_memory - frame.start_memory
+                if parent is not None:
+                    parent.peak_memory = max(parent.peak_memory, frame.peak_memory)
+            _record(self.stages, name, 1, wall_time, peak_memory)
+            if frame.file is not None:
+                _record(
+                    self.files.setdefault(frame.file, {}),
+                    name,
+                    1,
+                    wall_time,
+                    peak_memory,
+                )
+
+    def snapshot(self) -> dict:
+        """Return the statistics collected so far."""
+        return {
+            "stages": self.stages,
+            "files": self.files,
+        }
+
+    def drain(self) -> Optional[dict]:
+        """Return the statistics collected so far and forget them."""
+        if not self.enabled:
+            return None
+        snapshot = self.snapshot()
+        self.stages = {}
+        self.files = {}
+        return snapshot
+
+    def merge(self, snapshot: Optional[dict]) -> None:
+        """Add the statistics of another profiler, e.g. of a worker process."""
+        if not snapshot:
+            return
+        tables = [(self.stages, snapshot["stages"])] + [
+            (self.files.setdefault(file, {}), stages)
+            for file, stages in snapshot["files"].items()
+        ]
+        for table, stages in tables:
+            for name, entry in stages.items():
+                _record(
+                    table,
+                    name,
+                    entry["calls"],
+                    entry["wall_time"],
+                    entry["peak_memory"],
+                )
+
+    def report(self) -> dict:
+        """Return the JSON report."""
+        return {
+            "wall_time": time.perf_counter() - self._start,
+            "memory_tracked": self.track_memory,
+            "stages": _by_wall_time(self.stages),
+            "files": dict(
+                sorted(
+                    (
+                        (file, _by_wall_time(stages))
+                        for file, stages in self.files.items()
+                    ),
+                    key=lambda item: -max(s["wall_time"] for s in item[1].values()),
+                )
+            ),
+        }
+
+    def summary(self, top: int = 10) -> str:
+        """Return a human-readable summary of the slowest stages and files."""
+        report = self.report()
+        lines = [f"Profiled {report['wall_time']:.2f}s"]
+        lines.append("Slowest stages:")
+        for name, entry in list(report["stages"].items())[:top]:
+            lines.append(
+                f"  {entry['wall_time']:8.3f}s {entry['calls']:6d}x  {name}"
+                + _format_memory(entry["peak_memory"])
+            )
+        if report["files"]:
+            lines.append("Slowest files:")
+            for file, stages in list(report["files"].items())[:top]:
+                name, entry = next(iter(stages.items()))
+                lines.append(
+                    f"  {entry['wall_time']:8.3f}s  {file} ({name})"
+                    + _format_memory(entry["peak_memory"])
+                )
+        return "\n".join(lines)
+
+
+def _format_memory(peak_memory: Optional[int]) -> str:
+    if peak_memory is None:
+        return ""
+    return f", peak {peak_memory / 1024 / 1024:.1f} MB"
+
+
+PROFILER = Profiler()
+
+
+def init_worker(enabled: bool, track_memory: bool) -> None:
+    """
+    Set up the profiler of a worker process like the parent's.
+
+    Use as the initializer of a process pool, with `worker_args()`. Statistics
+    inherited from a forked parent are discarded, so they aren't counted twice.
+    """
+    PROFILER.reset()
+    if enabled:
+        PROFILER.enable(track_memory)
+    else:
+        PROFILER.disable()
+
+
+def worker_args() -> tuple:
+    """The arguments of `init_worker` for the current profiler settings."""
+    return PROFILER.enabled, PROFILER.track_memory
+
+
+def call_and_drain(func: Callable, *args: Any) -> tuple:
+    """
+    Call a function and return its result with the statistics it collected.
+
+    Submit `functools.partial(call_and_drain, func)` to a process pool and pass
+    the statistics to `PROFILER.merge` in the parent.
+    """
+    return func(*args), PROFILER.drain()
+
+
+def profiled_map(executor, func: Callable, iterable, **kwargs) -> Iterator:
+    """Like `executor.map`, merging the workers' statistics into `PROFILER`."""
+    for result, snapshot in executor.map(
+        functools.partial(call_and_drain, func), iterable, **kwargs
+    ):
+        PROFILER.merge(snapshot)
+        yield result
+
+
+def add_profiling_arguments(parser: argparse.ArgumentParser) -> None:
+    """Add the --profile, --profile-memory and --cprofile options to a parser."""
+    group = parser.add_argument_group("profiling")
+    group.add_argument(
+        "--profile",
+        metavar="PATH",
+        help="Write a JSON report of the time spent per stage and per file.",
+    )
+    group.add_argument(
+        "--profile-memory",
+        action="store_true",
+        help="Also record peak memory per stage (slower).",
+    )
+    group.add_argument(
+        "--cprofile",
+        metavar="PATH",
+        help="Dump cProfile stats of the main process, e.g. for snakeviz.",
+    )
+
+
+@contextlib.contextmanager
+def profiling(args: argparse.Namespace) -> Iterator[Profiler]:
+    """
+    Profile a block according to the options of `add_profiling_arguments`.
+
+    The reports are written when the block exits, even if it fails.
+    """
+    profile = cProfile.Profile() if args.cprofile else None
+    if args.profile or args.profile_memory:
+        PROFILER.enable(track_memory=args.profile_memory)
+    if profile is not None:
+        profile.enable()
+    try:
+        yield PROFILER
+    finally:
+        if profile is not None:
+            profile.disable()
+            profile.dump_stats(args.cprofile)
+        if PROFILER.enabled:
+            if args.profile:
+                os.makedirs(
+                    os.path.dirname(os.path.abspath(args.profile)), exist_ok=True
+                )
+                with open(args.profile, "w") as f:
+                    json.dump(PROFILER.report(), f, indent=2)
+            print(PROFILER.summary())
+            PROFILER.disable()
@@ -0,0 +1,488 @@
+"""Check the internal links of the docs without building the site.
+
+Every Markdown and MDX page under docs/, and under the versioned docs listed in
+versions.json (where build_cookbook.py puts the cookbook), is scanned in a worker
+process for its route, its heading anchors and its links. Then every link is
+checked against that index:
+
+- links to other pages, by route (`/evaluation/concepts#datasets`), relative URL
+  (`./annotate_code`) or file (`../concepts/index.mdx`), must reach a page, and
+  their fragment one of its anchors
+- links to assets (`./static/trace.png`, `/img/favicon.png`) and relative
+  imports must reach a file
+- internal destinations of the vercel.json redirects must reach a page, an asset
+  or another redirect
+
+Routes follow Docusaurus: `a/b/page.mdx` is served at `/a/b/page`, index pages at
+their directory, and `slug` or `id` front matter override that. Anchors are the
+GitHub slugs of the headings, explicit `{#id}`s and JSX `id`s. Code blocks, as
+found by mdx_index.py, are ignored. Links to the production site
+(https://docs.smith.langchain.com/...) are checked too, and may also reach a
+redirect source.
+
+This catches what `docusaurus build` would fail on in well under a second, and
+broken anchors too, which `docusaurus build` only warns about. Pass --anchors
+warn to report them without failing:
+
+    python _scripts/check_links.py [--workers N] [--anchors error|warn|ignore]
+"""
+import argparse
+import json
+import os
+import posixpath
+import re
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Iterator, NamedTuple, Optional
+from urllib.parse import unquote, urlsplit
+
+import mdx_index
+
+ROOT = Path(__file__).parent.parent.absolute()
+DOCS_ROOT = ROOT / "docs"
+STATIC_ROOT = ROOT / "static"
+VERSIONS_PATH = ROOT / "versions.json"
+VERSIONED_DOCS_ROOT = ROOT / "versioned_docs"
+VERCEL_CONFIG = ROOT / "vercel.json"
+SITE_URL = "https://docs.smith.langchain.com"
+PAGE_SUFFIXES = (".md", ".mdx")
+# Extensions tried, in order, for relative imports that have none
+IMPORT_SUFFIXES = ("", ".js", ".jsx", ".ts", ".tsx", ".md", ".mdx", ".json")
+
+_FRONT_MATTER = re.compile(r"\A---\n(.*?)\n---\n", re.DOTALL)
+_HEADING = re.compile(r"^ {0,3}#{1,6}[ \t]+(.*?)(?:[ \t]+#+)?[ \t]*$")
+_HEADING_ID = re.compile(r"\s*\{#([^}\s]+)\}$")
+_JSX_ID = re.compile(r"""<[A-Za-z][^>]*?\s(?:id|name)=["']([^"']+)["']""")
+_INLINE_CODE = re.compile(r"(`+)(?!`).*?(?<!`)\1(?!`)")
+_MARKDOWN_LINK = re.compile(r"\]\(\s*<?([^)\s>]*)>?(?:\s+[\"'(][^)]*)?\)")
+_REFERENCE_LINK = re.compile(r"^ {0,3}\[[^\]]+\]:\s*<?(\S+?)>?(?:\s|$)")
+_JSX_LINK = re.compile(r"""\s(?:href|to|src)=["']([^"']+)["']""")
+_IMPORT = re.compile(
+    r"""(?:^import\s[^;]*?from\s*|\brequire\(\s*)["']((?:\.{1,2}/|@site/)[^"']+)["']""",
+    re.MULTILINE,
+)
+_REDIRECT_PARAM = re.compile(r":\w+[*+?]?|\(.*?\)")
+
+
+class Link(NamedTuple):
+    """A link or relative import of a page."""
+
+    target: str
+    line: int
+
+
+class Page(NamedTuple):
+    """What a Markdown or MDX file contributes to the site."""
+
+    # Path of the file, relative to the repository root
+    path: str
+    # None for partials, e.g. `_setup.mdx`, which are only imported
+    route: Optional[str]
+    anchors: frozenset
+    links: tuple
+    imports: tuple
+
+
+class Broken(NamedTuple):
+    """A link that doesn't reach what it points to."""
+
+    source: str
+    line: int
+    target: str
+    reason: str
+    # Whether only its anchor is missing
+    anchor: bool = False
+
+
+def parse_front_matter(text: str) -> dict:
+    """Return the top-level scalar fields of a page's front matter."""
+    match = _FRONT_MATTER.match(text)
+    if match is None:
+        return {}
+    fields = {}
+    for line in match.group(1).split("\n"):
+        key, colon, value = line.partition(":")
+        if colon and key and not key[0].isspace():
+            fields[key.strip()] = value.strip().strip("\"'")
+    return fields
+
+
+def page_route(relative_path: str, front_matter: dict, prefix: str = "") -> str:
+    """
+    Return the route Docusaurus serves a page at.
+
+    :param relative_path: Path of the file, relative to its docs directory
+    :param front_matter: The page's front matter
+    :param prefix: Route of the docs directory, e.g. "/old" for a version
+    """
+    directory, name = posixpath.split(posixpath.splitext(relative_path)[0])
+    slug = front_matter.get("slug")
+    if slug is not None:
+        route = slug if slug.startswith("/") else f"{directory}/{slug}"
+    elif name.lower() in ("index", "readme") or name == posixpath.basename(directory):
+        route = directory
+    else:
+        route = f"{directory}/{front_matter.get('id', name)}"
+    return normalize_route(f"{prefix}/{route}")
+
+
+def normalize_route(route: str) -> str:
+    route = posixpath.normpath("/" + route.strip("/"))
+    # normpath keeps a leading double slash.
+    return "/" + route.lstrip("/")
+
+
+def slugify(text: str) -> str:
+    """Return the anchor of a heading, like github-slugger."""
+    return re.sub(r"[^\w\- ]", "", text.lower()).replace(" ", "-")
+
+
+def _heading_text(heading: str) -> str:
+    heading = re.sub(r"!?\[([^\]]*)\]\([^)]*\)", r"\1", heading)
+    heading = re.sub(r"<[^>]*>", "", heading)
+    return re.sub(r"\*+|__|`", "", heading).strip()
+
+
+def _masked_lines(path: str, text: str) -> list:
+    """The lines of a page, with the lines of its code blocks blanked."""
+    lines = text.split("\n")
+    match = _FRONT_MATTER.match(text)
+    if match is not None:
+        for number in range(match.group(0).count("\n")):
+            lines[number] = ""
+    for block in mdx_index.file_blocks(path):
+        for number in range(block.start_line - 1, min(block.end_line, len(lines))):
+            lines[number] = ""
+    return lines
+
+
+def scan_page(path: str, docs_dir: str, prefix: str) -> Page:
+    """
+    Read the route, anchors, links and relative imports of a page.
+
+    :param path: Absolute path of the Markdown or MDX file
+    :param docs_dir: The docs directory the file belongs to
+    :param prefix: Route of the docs directory
+    """
+    with open(path, encoding="utf-8") as f:
+        text = f.read()
+    relative_path = Path(path).relative_to(docs_dir).as_posix()
+    route = None
+    if not any(part.startswith("_") for part in relative_path.split("/")):
+        route = page_route(relative_path, parse_front_matter(text), prefix)
+    lines = _masked_lines(path, text)
+    anchors = set()
+    occurrences = {}
+    links = []
+    for number, line in enumerate(lines, 1):
+        heading = _HEADING.match(line)
+        if heading is not None:
+            explicit = _HEADING_ID.search(heading.group(1))
+            if explicit is not None:
+                anchors.add(explicit.group(1))
+            else:
+                slug = slugify(_heading_text(heading.group(1)))
+                count = occurrences.get(slug, 0)
+                occurrences[slug] = count + 1
+                anchors.add(f"{slug}-{count}" if count else slug)
+        anchors.update(_JSX_ID.findall(line))
+        line = _INLINE_CODE.sub("", line)
+        for pattern in (_MARKDOWN_LINK, _REFERENCE_LINK, _JSX_LINK):
+            links.extend(Link(target, number) for target in pattern.findall(line))
+    text = "\n".join(lines)
+    imports = [
+        Link(match.group(1), text.count("\n", 0, match.start()) + 1)
+        for match in _IMPORT.finditer(text)
+    ]
+    return Page(
+        os.path.relpath(path, ROOT),
+        route,
+        frozenset(anchors),
+        tuple(links),
+        tuple(imports),
+    )
+
+
+def _scan(job: tuple) -> Page:
+    return scan_page(*job)
+
+
+def docs_directories() -> list:
+    """
+    Return the docs directories of the site, with the route of each.
+
+    The current docs are served at the root, and each version listed in
+    versions.json at its name.
+    """
+    directories = [(DOCS_ROOT, "")]
+    try:
+        versions = json.loads(VERSIONS_PATH.read_text())
+    except FileNotFoundError:
+        versions = []
+    for version in versions:
+        directory = VERSIONED_DOCS_ROOT / f"version-{version}"
+        if directory.is_dir():
+            directories.append((directory, f"/{version}"))
+    return directories
+
+
+def scan_site(workers: Optional[int] = None) -> list:
+    """
+    Scan every page of the site in a process pool.
+
+    :param workers: Number of worker processes (default: CPU count)
+    :return: One Page per Markdown or MDX file
+    """
+    jobs = [
+        (os.path.join(dirpath, file), str(directory), prefix)
+        for directory, prefix in docs_directories()
+        for dirpath, _, files in os.walk(directory)
+        for file in sorted(files)
+        if file.endswith(PAGE_SUFFIXES)
+    ]
+    # Tokenize changed files once, so that workers only query the index.
+    mdx_index.default_index().refresh()
+    workers = max(1, min(workers or os.cpu_count() or 1, len(jobs)))
+    if workers == 1:
+        return [_scan(job) for job in jobs]
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(_scan, jobs, chunksize=max(1, len(jobs) // workers)))
+
+
+def load_redirects(path: Path = VERCEL_CONFIG) -> list:
+    """Return the (source, destination) pairs of the vercel.json redirects."""
+    try:
+        config = json.loads(path.read_text())
+    except FileNotFoundError:
+        return []
+    return [
+        (redirect["source"], redirect["destination"])
+        for redirect in config.get("redirects", [])
+    ]
+
+
+def _redirect_pattern(source: str) -> re.Pattern:
+    parts = []
+    end = 0
+    for match in _REDIRECT_PARAM.finditer(source):
+        parts.append(re.escape(source[end : match.start()]))
+        token = match.group(0)
+        if token.startswith("("):
+            parts.append(token)
+        elif token[-1] in "*+":
+            parts.append(".*")
+        else:
+            parts.append("[^/]+" + ("?" if token.endswith("?") else ""))
+        end = match.end()
+    parts.append(re.escape(source[end:]))
+    return re.compile("".join(parts) + "/?")
+
+
+class LinkChecker:
+    """Checks links against the routes, anchors and files of the site."""
+
+    def __init__(self, pages: list, redirects: list, anchors: bool = True):
+        self.pages = {page.path: page for page in pages}
+        self.routes = {page.route: page for page in pages if page.route is not None}
+        self.redirects = [_redirect_pattern(source) for source, _ in redirects]
+        self.check_anchors = anchors
+        self.anchors = {}
+        self.docs_dirs = [
+            os.path.relpath(directory, ROOT) for directory, _ in docs_directories()
+        ]
+
+    def page_anchors(self, page: Page) -> frozenset:
+        """The anchors of a page, including the headings of the partials it imports."""
+        anchors = self.anchors.get(page.path)
+        if anchors is None:
+            # Guards against import cycles.
+            self.anchors[page.path] = page.anchors
+            anchors = set(page.anchors)
+            for target in page.imports:
+                partial = self.pages.get(self._import(page, target.target) or "")
+                if partial is not None:
+                    anchors |= self.page_anchors(partial)
+            anchors = self.anchors[page.path] = frozenset(anchors)
+        return anchors
+
+    def _file(self, page: Page, target: str) -> str:
+        if target.startswith("@site/"):
+            return posixpath.normpath(target[len("@site/") :])
+        if target.startswith("/"):
+            # Absolute file links are relative to the docs directory, or the site.
+            for directory in self.docs_dirs:
+                file = posixpath.normpath(directory + target)
+                if file in self.pages:
+                    return file
+            return posixpath.normpath(target.lstrip("/"))
+        return posixpath.normpath(posixpath.join(posixpath.dirname(page.path), target))
+
+    def _import(self, page: Page, target: str) -> Optional[str]:
+        """The file a relative import resolves to, if it exists."""
+        file = self._file(page, target)
+        for candidate in [file + suffix for suffix in IMPORT_SUFFIXES] + [
+            f"{file}/index{suffix}" for suffix in IMPORT_SUFFIXES[1:]
+        ]:
+            if (ROOT / candidate).is_file():
+                return candidate
+        return None
+
+    def _redirected(self, route: str) -> bool:
+        return any(pattern.fullmatch(route) for pattern in self.redirects)
+
+    def _anchor(self, page: Page, fragment: str) -> Optional[str]:
+        if not fragment or not self.check_anchors:
+            return None
+        if unquote(fragment) in self.page_anchors(page):
+            return None
+        return f"no anchor #{fragment} in {page.path}"
+
+    def linked_file(self, page: Page, target: str) -> Optional[str]:
+        """
+        Return the file a link or relative import of a page reaches, if any.
+
+        :return: The path of the file relative to the repository root, or None
+            for links to routes, external links, and files that don't exist
+        """
+        parts = urlsplit(target)
+        if parts.scheme or parts.netloc or target.startswith("{") or not parts.path:
+            return None
+        path = unquote(parts.path)
+        if path.startswith("/") and not path.endswith(PAGE_SUFFIXES):
+            file = STATIC_ROOT / path.lstrip("/")
+            return os.path.relpath(file, ROOT) if file.is_file() else None
+        return self._import(page, path)
+
+    def check_route(
+        self, route: str, fragment: str, redirects: bool = False
+    ) -> Optional[str]:
+        """
+        Check a site path, returning why it is broken or None.
+
+        :param route: The path, e.g. "/evaluation/concepts" or "/img/favicon.png"
+        :param fragment: The anchor it links to, if any
+        :param redirects: Whether reaching a redirect source is enough
+        """
+        route = normalize_route(unquote(route))
+        page = self.routes.get(route)
+        if page is not None:
+            return self._anchor(page, fragment)
+        if (STATIC_ROOT / route.lstrip("/")).is_file():
+            return None
+        if redirects and self._redirected(route):
+            return None
+        return f"no page at {route}"
+
+    def check_link(self, page: Page, target: str) -> Optional[str]:
+        """
+        Check a link of a page, returning why it is broken or None.
+
+        External links, and JSX expressions that can't be resolved statically,
+        are not checked.
+        """
+        if target.startswith(SITE_URL):
+            target = target[len(SITE_URL) :] or "/"
+            parts = urlsplit(target)
+            return self.check_route(parts.path, parts.fragment, redirects=True)
+        parts = urlsplit(target)
+        if parts.scheme or parts.netloc or target.startswith("{"):
+            return None
+        path, fragment = parts.path, parts.fragment
+        if not path:
+            return self._anchor(page, fragment)
+        if path.startswith("/") and not path.endswith(PAGE_SUFFIXES):
+            return self.check_route(path, fragment)
+        if path.endswith(PAGE_SUFFIXES) or posixpath.splitext(path)[1]:
+            # Files are linked relative to the page's file.
+            file = self._file(page, unquote(path))
+            linked = self.pages.get(file)
+            if linked is not None:
+                if linked.route is None:
+                    return f"{file} is a partial, not a page"
+                return self._anchor(linked, fragment)
+            if (ROOT / file).is_file():
+                return None
+            return f"no file {file}"
+        if page.route is None:
+            return None
+        # Other links are URLs, relative to the page's route.
+        route = posixpath.join(posixpath.dirname(page.route), path)
+        return self.check_route(route, fragment)
+
+    def check_page(self, page: Page) -> Iterator[Broken]:
+        for link in page.links:
+            reason = self.check_link(page, link.target)
+            if reason is not None:
+                anchor = reason.startswith("no anchor")
+                yield Broken(page.path, link.line, link.target, reason, anchor)
+        for link in page.imports:
+            if self._import(page, link.target) is None:
+                file = self._file(page, link.target)
+                yield Broken(page.path, link.line, link.target, f"no file {file}")
+
+    def check_redirects(self, redirects: list) -> Iterator[Broken]:
+        """Check the internal destinations of redirects without parameters."""
+        for number, (source, destination) in enumerate(redirects):
+            if destination.startswith(SITE_URL):
+                destination = destination[len(SITE_URL) :] or "/"
+            parts = urlsplit(destination)
+            if (
+                parts.scheme
+                or parts.netloc
+                or _REDIRECT_PARAM.search(parts.path)
+                or not parts.path.startswith("/")
+            ):
+                continue
+            reason = self.check_route(parts.path, parts.fragment, redirects=True)
+            if reason is not None:
+                yield Broken(
+                    VERCEL_CONFIG.name,
+                    number,
+                    destination,
+                    f"{source}: {reason}",
+                    reason.startswith("no anchor"),
+                )
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=None,
+        help="Number of worker processes (default: CPU count).",
+    )
+    parser.add_argument(
+        "--anchors",
+        choices=("error", "warn", "ignore"),
+        default="error",
+        help="What to do about links to missing anchors (default: error).",
+    )
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    pages = scan_site(args.workers)
+    redirects = load_redirects()
+    checker = LinkChecker(pages, redirects, anchors=args.anchors != "ignore")
+    broken = [b for page in pages for b in checker.check_page(page)]
+    broken.extend(checker.check_redirects(redirects))
+    errors = [b for b in broken if not b.anchor or args.anchors == "error"]
+    for b in broken:
+        location = f"redirect {b.line}" if b.source == VERCEL_CONFIG.name else b.line
+        level = "error" if b in errors else "warning"
+        print(
+            f"{b.source}:{location}: {level}: {b.target}: {b.reason}", file=sys.stderr
+        )
+    links = sum(len(page.links) + len(page.imports) for page in pages)
+    print(
+        f"Checked {links} links in {len(pages)} pages and {len(redirects)} "
+        f"redirects in {time.perf_counter() - start:.2f}s "
+        f"({len(errors)} broken, {len(broken) - len(errors)} warnings)"
+    )
+    return 1 if errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
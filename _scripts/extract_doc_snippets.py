@@ -0,0 +1,286 @@
+"""Generate pytest and Jest tests for the code snippets of the whole docs tree.
+
+Every MDX file under docs/ is processed in a worker process: its Python blocks
+are written to tests/py_unit_tests and its TypeScript blocks to
+tests/js_unit_tests, mirroring the docs layout. Code blocks are read from the
+shared index of mdx_index.py, which is refreshed before the workers start.
+
+Generation is incremental: a manifest records the content hash of each MDX file
+and the tests generated from it, so unchanged files are skipped, tests of deleted
+files are removed, and test files whose content doesn't change are not rewritten.
+
+With --jest-shards N, the Jest tests of each MDX file are bundled into at most N
+files (plus one per block that conflicts with every shard), with hoisted imports
+and one `test()` per block, as Jest's startup costs are paid per file.
+
+    python _scripts/extract_doc_snippets.py [--workers N] [--force]
+        [--jest-shards N] [mdx_file ...]
+"""
+import argparse
+import functools
+import itertools
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import NamedTuple, Optional
+
+import extract_python_blocks
+import extract_ts_blocks
+import mdx_index
+from build_profiler import (
+    PROFILER,
+    add_profiling_arguments,
+    init_worker,
+    profiled_map,
+    profiling,
+    worker_args,
+)
+from incremental import SnippetManifest, generator_hash, hash_bytes
+
+ROOT = Path(__file__).parent.parent.absolute()
+DOCS_ROOT = ROOT / "docs"
+PY_TESTS_ROOT = ROOT / "tests/py_unit_tests"
+JS_TESTS_ROOT = ROOT / "tests/js_unit_tests"
+MANIFEST_PATH = ROOT / "tests/.snippets-manifest.json"
+GENERATOR_SCRIPTS = [
+    Path(__file__),
+    Path(extract_python_blocks.__file__),
+    Path(extract_ts_blocks.__file__),
+    Path(mdx_index.__file__),
+]
+
+
+class ExtractionResult(NamedTuple):
+    """What was generated for a single MDX file."""
+
+    mdx_file: str
+    python_blocks: int = 0
+    typescript_blocks: int = 0
+    error: Optional[str] = None
+    outputs: tuple = ()
+    # Blocks left out of the tests, as extract_python_blocks.Diagnostic
+    diagnostics: tuple = ()
+
+
+def discover_mdx_files(docs_root: Path = DOCS_ROOT) -> list[str]:
+    """
+    Find every MDX file under the docs root.
+
+    :param docs_root: Root of the docs tree
+    :return: Sorted paths relative to the docs root
+    """
+    return sorted(
+        path.relative_to(docs_root).as_posix() for path in docs_root.rglob("*.mdx")
+    )
+
+
+def _extract_python(mdx_file: str, diagnostics: list) -> tuple[int, list[str]]:
+    output_file = extract_python_blocks.pytest_file_for(PY_TESTS_ROOT, mdx_file)
+    blocks = extract_python_blocks.iter_testable_blocks(
+        str(DOCS_ROOT / mdx_file), diagnostics
+    )
+    first = next(blocks, None)
+    if first is None:
+        output_file.unlink(missing_ok=True)
+        return 0, []
+    output_file.parent.mkdir(parents=True, exist_ok=True)
+    count = extract_python_blocks.write_pytest_tests_if_changed(
+        itertools.chain([first], blocks),
+        str(output_file),
+        boilerplate=extract_python_blocks.PYTHON_BOILERPLATE,
+    )
+    return count, [str(output_file)]
+
+
+def _extract_typescript(
+    mdx_file: str, diagnostics: list, jest_shards: int = 0
+) -> tuple[int, list[str]]:
+    code_blocks = extract_ts_blocks.extract_code_blocks(str(DOCS_ROOT / mdx_file))
+    dest_folder = extract_ts_blocks.jest_dir_for(JS_TESTS_ROOT, mdx_file)
+    if not code_blocks:
+        if dest_folder.is_dir():
+            extract_ts_blocks.remove_stale_tests(str(dest_folder), [])
+        return 0, []
+    dest_folder.mkdir(parents=True, exist_ok=True)
+    if jest_shards:
+        written = extract_ts_blocks.write_jest_shards(
+            code_blocks, str(dest_folder), jest_shards
+        )
+    else:
+        written = extract_ts_blocks.write_jest_tests(code_blocks, str(dest_folder))
+    extract_ts_blocks.remove_stale_tests(str(dest_folder), written)
+    return len(code_blocks), written
+
+
+def extract_file(mdx_file: str, jest_shards: int = 0) -> ExtractionResult:
+    """
+    Generate the pytest module and the Jest tests for a single MDX file.
+
+    Nothing is written for a language the file has no blocks for, and test files
+    that are already up to date are left untouched. A failure in one language
+    doesn't prevent the other from being generated.
+
+    :param mdx_file: Path to the MDX file, relative to the docs root
+    :param jest_shards: Bundle the Jest tests into this many files (default: one
+        file per block)
+    """
+    counts = []
+    outputs = []
+    errors = []
+    diagnostics = []
+    for language, extract in [
+        ("python", _extract_python),
+        (
+            "typescript",
+            functools.partial(_extract_typescript, jest_shards=jest_shards),
+        ),
+    ]:
+        try:
+            with PROFILER.stage(f"extract:{language}", file=mdx_file):
+                count, written = extract(mdx_file, diagnostics)
+        except Exception as e:
+            count, written = 0, []
+            errors.append(f"{language}: {type(e).__name__}: {e}")
+        counts.append(count)
+        outputs.extend(written)
+    return ExtractionResult(
+        mdx_file,
+        *counts,
+        error="; ".join(errors) or None,
+        outputs=tuple(outputs),
+        diagnostics=tuple(diagnostics),
+    )
+
+
+def extract_files(
+    mdx_files: list[str],
+    workers: Optional[int] = None,
+    manifest: Optional[SnippetManifest] = None,
+    force: bool = False,
+    jest_shards: int = 0,
+) -> list:
+    """
+    Generate tests for many MDX files in a process pool.
+
+    :param mdx_files: Paths to the MDX files, relative to the docs root
+    :param workers: Number of worker processes (default: CPU count)
+    :param manifest: Records what was generated; unless `force` is set, files
+        unchanged since the last run are skipped
+    :param force: Regenerate every file
+    :param jest_shards: Bundle the Jest tests of each file into this many files
+        (default: one file per block)
+    :return: One ExtractionResult per processed file, in input order
+    """
+    hashes = {}
+    if manifest is not None:
+        hashes = {
+            mdx_file: manifest.source_hash(DOCS_ROOT / mdx_file) for mdx_file in mdx_files
+        }
+    if manifest is not None and not force:
+        mdx_files = [
+            mdx_file
+            for mdx_file in mdx_files
+            if not manifest.is_fresh(mdx_file, hashes[mdx_file])
+        ]
+    results = _run_extraction(mdx_files, workers, jest_shards)
+    if manifest is not None:
+        for result in results:
+            # Failed files are retried on the next run.
+            if result.error is None:
+                manifest.record(result.mdx_file, hashes[result.mdx_file], result.outputs)
+    return results
+
+
+def _run_extraction(
+    mdx_files: list[str], workers: Optional[int], jest_shards: int = 0
+) -> list:
+    if not mdx_files:
+        return []
+    # Tokenize the changed files once, so that workers only query the index.
+    with PROFILER.stage("index"):
+        mdx_index.default_index().refresh(mdx_files)
+    extract = functools.partial(extract_file, jest_shards=jest_shards)
+    workers = max(1, min(workers or os.cpu_count() or 1, len(mdx_files)))
+    if workers == 1:
+        return [extract(mdx_file) for mdx_file in mdx_files]
+    with ProcessPoolExecutor(
+        max_workers=workers, initializer=init_worker, initargs=worker_args()
+    ) as executor:
+        chunksize = max(1, len(mdx_files) // (workers * 4))
+        return list(profiled_map(executor, extract, mdx_files, chunksize=chunksize))
+
+
+def manifest_hash(jest_shards: int = 0) -> str:
+    """Hash what the generated tests depend on besides the MDX files."""
+    scripts_hash = generator_hash(GENERATOR_SCRIPTS)
+    if not jest_shards:
+        return scripts_hash
+    return hash_bytes(scripts_hash.encode(), f"jest_shards={jest_shards}".encode())
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "mdx_files",
+        nargs="*",
+        help="MDX files relative to docs/ (default: every MDX file).",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=None,
+        help="Number of worker processes (default: CPU count).",
+    )
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="Regenerate every file, ignoring the manifest.",
+    )
+    parser.add_argument(
+        "--jest-shards",
+        type=int,
+        default=0,
+        help="Bundle the Jest tests of each MDX file into at most N files "
+        "(default: one file per block).",
+    )
+    add_profiling_arguments(parser)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    all_files = discover_mdx_files()
+    mdx_files = [Path(f).as_posix() for f in args.mdx_files] or all_files
+    manifest = SnippetManifest(MANIFEST_PATH, manifest_hash(args.jest_shards))
+    if not args.mdx_files:
+        for removed in manifest.prune(all_files):
+            print(f"Removed {removed}")
+    with profiling(args):
+        results = extract_files(
+            mdx_files,
+            workers=args.workers,
+            manifest=manifest,
+            force=args.force,
+            jest_shards=args.jest_shards,
+        )
+    manifest.save()
+    errors = [result for result in results if result.error]
+    for result in results:
+        for diagnostic in result.diagnostics:
+            print(
+                f"{result.mdx_file}:{diagnostic.line}: skipped, {diagnostic.message}",
+                file=sys.stderr,
+            )
+    for result in errors:
+        print(f"{result.mdx_file}: {result.error}", file=sys.stderr)
+    print(
+        f"Extracted {sum(r.python_blocks for r in results)} Python and "
+        f"{sum(r.typescript_blocks for r in results)} TypeScript blocks from "
+        f"{len(results)} files in {time.perf_counter() - start:.2f}s"
+        f" ({len(mdx_files) - len(results)} unchanged, {len(errors)} failed)"
+    )
+    return 1 if errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,6 +1,15 @@
+import filecmp
+import functools
+import inspect
+import os
 import re
+import sys
 from pathlib import Path
 import ast
+from typing import Iterable, Iterator, NamedTuple, Optional, TextIO, Union
+
+from build_profiler import PROFILER
+from mdx_index import file_blocks
 
 class ReplaceListRunsVisitor(ast.NodeTransformer):
     def visit_Call(self, node):
@@ -22,58 +31,243 @@ def _call_list_on_list_runs(code_block: str):
     return  ast.unparse(transformed_tree)
 
 
+@functools.lru_cache(maxsize=4096)
+def _list_runs_transform(code_block: str) -> tuple[str, Optional[str]]:
+    """
+    Check that a block parses, and wrap its `list_runs` calls in `list(...)`.
+
+    Results are memoized on the block's content, so identical blocks, e.g.
+    shared setup repeated across pages, are only parsed once per process. Blocks
+    that never mention `list_runs` are returned as they are, without being
+    unparsed.
+
+    :return: The transformed code and None, or the original code and a message
+        if the block can't be parsed
+    """
+    try:
+        ast.parse(code_block)
+    except SyntaxError as e:
+        return code_block, f"{type(e).__name__}: {e}"
+    if "list_runs" not in code_block:
+        return code_block, None
+    with PROFILER.stage("list_runs_transform"):
+        return _call_list_on_list_runs(code_block), None
+
+
+class CodeBlock(NamedTuple):
+    """A code block found in an MDX file."""
+
+    code: str
+    # 1-based line of the MDX file on which the code starts
+    line: int
+    # "tab" for PythonBlock(`...`) code tabs, "fence" for ```python fences
+    kind: str
+
+
+def iter_code_blocks(mdx_file: str) -> Iterator[CodeBlock]:
+    """
+    Lazily yield the raw Python code blocks of an MDX file in document order.
+
+    Blocks come from the code block index: `PythonBlock(\`...\`)` code tabs
+    (up to the first backtick followed by `,` or `)`) and ```python fences.
+
+    :param mdx_file: Path to the MDX file
+    :return: An iterator of code blocks, with unescaped tab content
+    """
+    for block in file_blocks(mdx_file, language="python", kinds=("tab", "fence")):
+        code = block.code.strip() if block.kind == "fence" else block.code
+        yield CodeBlock(code, block.start_line, block.kind)
+
+
+class Diagnostic(NamedTuple):
+    """A problem with a code block that kept it out of the generated tests."""
+
+    mdx_file: str
+    line: int
+    message: str
+
+
+def iter_testable_blocks(
+    mdx_file: str, diagnostics: Optional[list] = None
+) -> Iterator[CodeBlock]:
+    """
+    Lazily yield the code blocks of an MDX file that can run as tests.
+
+    Escaped newlines and backslashes are unescaped, `list_runs` calls are
+    wrapped in `list(...)`, and blocks that need values we don't have are skipped.
+    Blocks that can't be parsed are skipped too, with a diagnostic.
+
+    :param mdx_file: Path to the MDX file
+    :param diagnostics: A list to append a Diagnostic to for every skipped
+        block that can't be parsed (default: print them to stderr)
+    :return: An iterator of code blocks ready to be written as tests
+    """
+    for block in iter_code_blocks(mdx_file):
+        # Skip because we don't have the actual UUID to run in the test.
+        if (
+            "<run_id>" in block.code
+            or "<your_project>" in block.code
+            or "create_dataset" in block.code
+        ):
+            continue
+        code = block.code.replace("\\n", "\n").replace("\\\\", "\\")
+        code, error = _list_runs_transform(code)
+        if error is not None:
+            if diagnostics is None:
+                print(f"{mdx_file}:{block.line}: skipped, {error}", file=sys.stderr)
+            else:
+                diagnostics.append(Diagnostic(mdx_file, block.line, error))
+            continue
+        yield block._replace(code=code)
+
 
 def extract_code_blocks(mdx_file: str) -> list[str]:
     """
     Extract all code blocks from an MDX file.
 
+    Code tabs come first, followed by ```python fences.
+
     :param mdx_file: Path to the MDX file
     :return: A list of code blocks
     """
-    with open(mdx_file, "r") as file:
-        content = file.read()
-        # Pattern to match code inside PythonBlock(\``) from code tabs
-        code_blocks = re.findall(r"PythonBlock\(`(.*?)`(?:,|\))", content, re.DOTALL)
-        # Assuming code blocks are enclosed between triple backticks
-        code_blocks += [
-            c.strip() for c in re.findall(r"```python\n(.*?)\n```", content, re.DOTALL)
-        ]
-        code_blocks = [
-            _call_list_on_list_runs(
-                code_block.replace("\\n", "\n").replace("\\\\", "\\")
-            )
-            for code_block in code_blocks
-            # Skip because we don't have the actual UUID to run in the test.
-            if "<run_id>" not in code_block
-            and "<your_project>" not in code_block
-            and "create_dataset" not in code_block
-        ]
+    blocks = list(iter_testable_blocks(mdx_file))
+    return [block.code for block in blocks if block.kind == "tab"] + [
+        block.code for block in blocks if block.kind == "fence"
+    ]
+
+
+_ASYNC_PATTERN = re.compile(r"\bawait\b|\basync\s+(?:for|with)\b")
+
 
-        return code_blocks
+@functools.lru_cache(maxsize=4096)
+def is_async_code(code_block: str) -> bool:
+    """
+    Whether a code block needs to run inside a coroutine.
+
+    Only top-level `await`, `async for` and `async with` count: a block that
+    defines a coroutine and runs it with `asyncio.run` is synchronous, and
+    can't run inside an event loop. Blocks that don't compile fall back to a
+    textual check.
+    """
+    try:
+        code = compile(
+            code_block,
+            "<snippet>",
+            "exec",
+            flags=ast.PyCF_ALLOW_TOP_LEVEL_AWAIT,
+            dont_inherit=True,
+        )
+    except (SyntaxError, ValueError):
+        return _ASYNC_PATTERN.search(code_block) is not None
+    return bool(code.co_flags & inspect.CO_COROUTINE)
+
+
+def write_pytest_module(
+    code_blocks: Iterable[Union[str, CodeBlock]],
+    file: TextIO,
+    boilerplate: str = "",
+) -> int:
+    """
+    Write a pytest unit test for each code block to an open text stream.
+
+    Blocks are consumed one at a time, so a lazy iterator is written as it is
+    produced.
+
+    :param code_blocks: Code blocks to test
+    :param file: The stream to write the module to
+    :param boilerplate: Code to put at the top of the module
+    :return: The number of tests written
+    """
+    index = -1
+    file.write("import pytest\n")
+    file.write(boilerplate)
+    for index, code_block in enumerate(code_blocks):
+        source = ""
+        if isinstance(code_block, CodeBlock):
+            source = f"# Line {code_block.line}\n"
+            code_block = code_block.code
+        indented_code = "\n".join(["    " + line for line in code_block.split("\n")])
+        if is_async_code(code_block):
+            header = f"@pytest.mark.asyncio\nasync def test_code_block_{index}():"
+        else:
+            header = f"def test_code_block_{index}():"
+        test_code = f"""
+{source}{header}
+{indented_code}
+"""
+        file.write(test_code)
+    return index + 1
 
 
 def write_pytest_tests(
-    code_blocks: list[str], output_file: str, boilerplate: str = ""
-) -> None:
+    code_blocks: Iterable[Union[str, CodeBlock]],
+    output_file: str,
+    boilerplate: str = "",
+) -> int:
     """
     Write pytest unit tests to a Python file for each code block.
 
-    :param code_blocks: List of code blocks to test
+    :param code_blocks: Code blocks to test
     :param output_file: Path to the output Python file
+    :return: The number of tests written
     """
     with open(output_file, "w") as file:
-        file.write("import pytest\n")
-        file.write(boilerplate)
-        for index, code_block in enumerate(code_blocks):
-            indented_code = "\n".join(
-                ["    " + line for line in code_block.split("\n")]
-            )
-            test_code = f"""
-@pytest.mark.asyncio
-async def test_code_block_{index}():
-{indented_code}
+        return write_pytest_module(code_blocks, file, boilerplate=boilerplate)
+
+
+def write_pytest_tests_if_changed(
+    code_blocks: Iterable[Union[str, CodeBlock]],
+    output_file: str,
+    boilerplate: str = "",
+) -> int:
+    """
+    Like `write_pytest_tests`, but leave the file untouched if it is up to date.
+
+    The module is streamed to a temporary file next to the output, which is
+    compared with the existing module chunk by chunk and then either moved
+    into place or discarded.
+
+    :param code_blocks: Code blocks to test
+    :param output_file: Path to the output Python file
+    :return: The number of tests in the module
+    """
+    tmp_file = f"{output_file}.tmp"
+    try:
+        count = write_pytest_tests(code_blocks, tmp_file, boilerplate=boilerplate)
+    except BaseException:
+        os.remove(tmp_file)
+        raise
+    unchanged = os.path.exists(output_file) and filecmp.cmp(
+        tmp_file, output_file, shallow=False
+    )
+    if unchanged:
+        os.remove(tmp_file)
+    else:
+        os.replace(tmp_file, output_file)
+    return count
+
+
+PYTHON_BOILERPLATE = """from langsmith import Client
+
+client = Client()
 """
-            file.write(test_code)
+
+
+def pytest_file_for(tests_root: Path, mdx_file: str) -> Path:
+    """
+    Return the pytest module generated for an MDX file.
+
+    Tests mirror the docs layout, and are named after the whole path of their
+    page: `a/b/page.mdx` becomes `a/b/test_a_b_page.py`. pytest imports test
+    modules by basename as there are no packages, so pages with the same name in
+    different directories (`index.mdx`, `faq.mdx`) must not share one.
+
+    :param tests_root: Root of the generated Python tests
+    :param mdx_file: Path to the MDX file, relative to the docs root
+    """
+    path = Path(mdx_file)
+    stem = "_".join(path.with_suffix("").parts)
+    return tests_root / path.parent / f"test_{stem}.py"
 
 
 def main(mdx_file: str, output_file: str, boilerplate: str = "") -> None:
@@ -83,28 +277,21 @@ def main(mdx_file: str, output_file: str, boilerplate: str = "") -> None:
     :param mdx_file: Path to the MDX file
     :param output_file: Path to the output Python file
     """
-    code_blocks = extract_code_blocks(mdx_file)
-    write_pytest_tests(code_blocks, output_file, boilerplate=boilerplate)
+    code_blocks = iter_testable_blocks(mdx_file)
+    write_pytest_tests_if_changed(code_blocks, output_file, boilerplate=boilerplate)
     print(f"Tests written to {output_file}")
 
 
 if __name__ == "__main__":
     root = Path(__file__).parent.parent.absolute()
     files = [
-        (
-            "tracing/faq/querying_traces.mdx",
-            """from langsmith import Client
-    
-client = Client()
-""",
-        ),
+        ("tracing/faq/querying_traces.mdx", PYTHON_BOILERPLATE),
     ]
     for file, boilerplate in files:
-        stem = Path(file).stem
-        dest_folder = root / "tests/py_unit_tests" / Path(file).parent
-        dest_folder.mkdir(parents=True, exist_ok=True)
+        output_file = pytest_file_for(root / "tests/py_unit_tests", file)
+        output_file.parent.mkdir(parents=True, exist_ok=True)
         main(
             str(root / "docs" / file),
-            str(dest_folder / f"test_{stem}.py"),
+            str(output_file),
             boilerplate=boilerplate,
         )
@@ -1,46 +1,232 @@
+"""Generate the pytest module of a multi-step tutorial, like the evaluation quickstart.
+
+A tutorial is a chain of steps, one per CodeTabs group, each depending on the
+ones before it. A step's Python tabs are its variants, e.g. the same app written
+with different frameworks; variants at the same position across steps belong
+together, so one test is generated per variant.
+
+Statements that every variant of a step shares are set up once per session, in
+a fixture, when nothing they use or define is specific to a variant. The rest of
+each step runs in the test of its variant, so the setup doesn't grow with the
+number of variants. The last statement of the last step always runs in the tests.
+
+    python _scripts/extract_python_eval_qs.py [mdx_file] [--output test_file]
+"""
+import argparse
+import ast
+import itertools
+import sys
+import textwrap
 from pathlib import Path
-import re
-
-
-qs = Path(__file__).parents[1] / "docs/evaluation/quickstart.mdx"
-test_directory = Path(__file__).parents[1] / "tests/py_unit_tests"
-test_directory.mkdir(parents=True, exist_ok=True)
-test_file = test_directory / "test_evals_quickstart.py"
-# Assuming mdx_content contains your MDX file content
-with qs.open("r") as file:
-    all_mdx_content = file.read()
-
-# Regular expression to find code blocks within `content: ````
-code_block_pattern = re.compile(r"content: `([^`]*)`", re.DOTALL)
-
-# Find all matches
-by_code_tabs = all_mdx_content.split("<CodeTabs")
-steps = []
-for mdx_content in by_code_tabs:
-    python_code_blocks = code_block_pattern.findall(mdx_content)
-
-    # Process each match
-    formatted = []
-    for index, code in enumerate(python_code_blocks, start=1):
-        if ";" in code or "@langchain" in code or "pip install" in code:
-            # Silly.
+from typing import NamedTuple
+
+from extract_python_blocks import is_async_code
+from incremental import write_if_changed
+from mdx_index import file_blocks
+
+ROOT = Path(__file__).parents[1]
+DEFAULT_MDX_FILE = "evaluation/index.mdx"
+DEFAULT_OUTPUT = ROOT / "tests/py_unit_tests/test_evals_quickstart.py"
+
+
+class Statement(NamedTuple):
+    """A top-level statement of a step variant."""
+
+    # With the comments and blank lines before it
+    source: str
+    # ast.dump of the statement, to compare statements across variants
+    dump: str
+    # Names the statement reads and binds, including in nested scopes
+    loads: frozenset
+    binds: frozenset
+
+
+def _statements(code: str, location: str) -> list:
+    try:
+        tree = ast.parse(code)
+    except SyntaxError as e:
+        raise SystemExit(f"{location}: {type(e).__name__}: {e}")
+    lines = code.split("\n")
+    statements = []
+    # Each statement keeps the comments and blank lines before it.
+    start = 0
+    for node in tree.body:
+        names = [n for n in ast.walk(node) if isinstance(n, ast.Name)]
+        binds = {n.id for n in names if not isinstance(n.ctx, ast.Load)}
+        for n in ast.walk(node):
+            if isinstance(n, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+                binds.add(n.name)
+            elif isinstance(n, (ast.Import, ast.ImportFrom)):
+                binds.update(
+                    (alias.asname or alias.name).split(".")[0] for alias in n.names
+                )
+        statements.append(
+            Statement(
+                "\n".join(lines[start : node.end_lineno]),
+                ast.dump(node),
+                frozenset(n.id for n in names if isinstance(n.ctx, ast.Load)),
+                frozenset(binds),
+            )
+        )
+        start = node.end_lineno
+    return statements
+
+
+def _dedent_content(code: str) -> str:
+    """
+    Remove the indent of the MDX around a CodeTabs from the code's later lines.
+
+    The first line starts right after the backtick, so it has no such indent.
+    """
+    try:
+        ast.parse(code)
+        return code
+    except SyntaxError:
+        first, _, rest = code.partition("\n")
+        return f"{first}\n{textwrap.dedent(rest)}"
+
+
+def read_steps(mdx_file: str) -> list:
+    """
+    Read the steps of a tutorial, in document order.
+
+    :param mdx_file: Path to the MDX file
+    :return: For each CodeTabs group with Python tabs, the statements of each tab
+    """
+    steps = []
+    python_blocks = file_blocks(mdx_file, language="python", kinds=("content",))
+    for _, blocks in itertools.groupby(python_blocks, key=lambda b: b.group):
+        variants = []
+        for block in blocks:
+            code = _dedent_content(block.code.replace("\\n", "\n").strip())
+            variants.append(_statements(code, f"{mdx_file}:{block.start_line}"))
+        steps.append(variants)
+    return steps
+
+
+def _variants(step: list, count: int) -> list:
+    # Single-variant steps apply to every variant.
+    return step * count if len(step) == 1 else step[:count]
+
+
+def plan_tests(steps: list) -> tuple:
+    """
+    Split the statements of the steps between the session setup and the tests.
+
+    :param steps: The steps of the tutorial, as returned by `read_steps`
+    :return: The setup statements, and the statements of each variant's test
+    """
+    count = min((len(step) for step in steps if len(step) > 1), default=1)
+    # For each statement of the chain: its version in every test, and whether
+    # all variants share it
+    chain = []
+    for step in steps:
+        variants = _variants(step, count)
+        for position in range(max(len(variant) for variant in variants)):
+            statements = [
+                variant[position] if position < len(variant) else None
+                for variant in variants
+            ]
+            shared = all(
+                s is not None and s.dump == statements[0].dump for s in statements
+            )
+            chain.append((statements, shared))
+            if not shared:
+                # Later statements depend on this one.
+                for variant in variants:
+                    chain.extend(
+                        ([s if v is variant else None for v in variants], False)
+                        for s in variant[position + 1 :]
+                    )
+                break
+    if chain:
+        # The tests must run what the tutorial builds up to.
+        chain[-1] = (chain[-1][0], False)
+
+    specific_binds = set()
+    for statements, shared in chain:
+        if not shared:
+            for s in filter(None, statements):
+                specific_binds |= s.binds
+    setup = []
+    tests = [[] for _ in range(count)]
+    # Names read by the statements that run in the tests so far
+    test_loads = set()
+    for statements, shared in chain:
+        s = statements[0]
+        if (
+            shared
+            and not (s.loads | s.binds) & specific_binds
+            and not s.binds & test_loads
+            and not is_async_code(s.source)
+        ):
+            setup.append(s)
             continue
-        # Optionally, strip leading and trailing whitespace and any quote characters
-        formatted_code = code.strip().strip('"').strip("'").replace("\\n", "\n")
-        formatted.append(formatted_code)
-    if formatted:
-        steps.append(formatted)
-
-
-with test_file.open("w") as file:
-    file.write("import pytest\n")
-    file.write('dataset_name = "Rap Battle Dataset"' + "\n")
-    for i, (first, second) in enumerate(zip(steps[0], steps[1])):
-        combined = first + "\n" + second
-        indented_code = "\n".join(["    " + line for line in combined.split("\n")])
-        test_code = f"""
-def test_code_block_{i}():
-{indented_code}
+        for test, s in zip(tests, statements):
+            if s is not None:
+                test.append(s)
+                test_loads |= s.loads
+    return setup, tests
+
+
+def _indent(statements: list) -> str:
+    code = "\n".join(s.source for s in statements)
+    return "\n".join(["    " + line if line else "" for line in code.split("\n")])
+
+
+def render_module(mdx_file: str, setup: list, tests: list) -> str:
+    """Render the pytest module of a tutorial."""
+    parts = [
+        f'"""Generated from {mdx_file} by _scripts/extract_python_eval_qs.py."""\n'
+        "import pytest\n"
+    ]
+    argument = ""
+    if setup:
+        argument = "tutorial_setup"
+        parts.append(
+            f"""
+
+@pytest.fixture(scope="session")
+def tutorial_setup():
+    \"\"\"The steps shared by every variant, run once per session.\"\"\"
+{_indent(setup)}
+    return locals()
 """
-        file.write(test_code)
-        file.write("\n")
+        )
+    for index, statements in enumerate(tests):
+        code = _indent(statements)
+        header = f"def test_code_block_{index}({argument}):"
+        if is_async_code("\n".join(s.source for s in statements)):
+            header = f"@pytest.mark.asyncio\nasync {header}"
+        body = f"    globals().update(tutorial_setup)\n{code}" if setup else code
+        parts.append(f"\n\n{header}\n{body}\n")
+    return "".join(parts)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "mdx_file",
+        nargs="?",
+        default=DEFAULT_MDX_FILE,
+        help=f"The tutorial, relative to docs/ (default: {DEFAULT_MDX_FILE}).",
+    )
+    parser.add_argument("--output", default=str(DEFAULT_OUTPUT))
+    args = parser.parse_args()
+
+    steps = read_steps(str(ROOT / "docs" / args.mdx_file))
+    if not steps:
+        parser.error(f"{args.mdx_file} has no Python code tabs")
+    setup, tests = plan_tests(steps)
+    output = Path(args.output)
+    output.parent.mkdir(parents=True, exist_ok=True)
+    write_if_changed(output, render_module(f"docs/{args.mdx_file}", setup, tests))
+    print(
+        f"{len(steps)} steps: {len(setup)} setup statements and {len(tests)} tests "
+        f"written to {output}"
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,29 +1,29 @@
 import re
 from pathlib import Path
-from typing import Tuple
+from typing import NamedTuple, Optional, Tuple
+
+from incremental import write_if_changed
+from mdx_index import file_blocks
 
 
 def extract_code_blocks(mdx_file: str) -> list[str]:
     """
-    Extract all TypeScript code blocks from an MDX file.
+    Extract all TypeScript code tabs from an MDX file, from the code block index.
 
     :param mdx_file: Path to the MDX file
     :return: A list of code blocks
     """
-    with open(mdx_file, "r") as file:
-        content = file.read()
-        # Pattern to match code inside TypeScriptBlock(\``) from code tabs
-        code_blocks = re.findall(
-            r"TypeScriptBlock\(`(.*?)`(?:,|\))", content, re.DOTALL
-        )
-        code_blocks = [
-            code_block.replace("\\n", "\n").replace("\\\\", "\\")
-            for code_block in code_blocks
-            if "<run_id>" not in code_block
-            and "<your_" not in code_block
-            and "YOUR_" not in code_block
-        ]
-        return code_blocks
+    code_blocks = [
+        block.code
+        for block in file_blocks(mdx_file, language="typescript", kinds=("tab",))
+    ]
+    return [
+        code_block.replace("\\n", "\n").replace("\\\\", "\\")
+        for code_block in code_blocks
+        if "<run_id>" not in code_block
+        and "<your_" not in code_block
+        and "YOUR_" not in code_block
+    ]
 
 
 def transform_imports(code_block: str) -> Tuple[str, str]:
@@ -77,30 +77,241 @@ const chain = chatPrompt.pipe(new ChatOpenAI());
     return code_block
 
 
-def write_jest_tests(code_blocks: list[str], output_dir: str) -> None:
+def _jest_test(index: int, code: str) -> str:
+    indented_code = "\n".join(["    " + line for line in code.strip().split("\n")])
+    return f"""
+test('test_code_block_{index}', async () => {{
+{indented_code}
+}});
+"""
+
+
+def write_jest_tests(code_blocks: list[str], output_dir: str) -> list[str]:
     """
     Write Jest unit tests to a file for each TypeScript code block.
 
+    Files whose content is already up to date are left untouched, so Jest's
+    transform cache stays valid for them.
+
     :param code_blocks: List of code blocks to test
-    :param output_file: Path to the output file
+    :param output_dir: Path to the output directory
+    :return: The paths of the test files, whether rewritten or not
     """
+    written = []
     for index, code_block in enumerate(code_blocks):
         output_file = f"{output_dir}/test_code_block_{index}.test.ts"
-        with open(output_file, "w") as file:
-            code_block = add_boilerplate(code_block)
-            imports, transformed_code = transform_imports(code_block)
-            if imports:
-                file.write(imports + "\n")
-            indented_code = "\n".join(
-                ["    " + line for line in transformed_code.strip().split("\n")]
+        code_block = add_boilerplate(code_block)
+        imports, transformed_code = transform_imports(code_block)
+        content = imports + "\n" if imports else ""
+        content += _jest_test(index, transformed_code)
+        write_if_changed(output_file, content)
+        written.append(output_file)
+    return written
+
+
+_IMPORT_PATTERN = re.compile(
+    r"""import\s+(?P<type>type\s+)?
+    (?:(?P<default>[\w$]+)\s*,?\s*)?
+    (?:\*\s*as\s+(?P<namespace>[\w$]+)\s*|\{(?P<named>[^}]*)\}\s*)?
+    (?:from\s*)?["'](?P<module>[^"']+)["']\s*;?""",
+    re.VERBOSE,
+)
+
+
+class ImportBinding(NamedTuple):
+    """A name bound by an import statement."""
+
+    local: str
+    module: str
+    # "default", "*" for a namespace import, or the exported name
+    imported: str
+    type_only: bool
+
+
+def parse_imports(imports: str) -> Optional[tuple[list, list]]:
+    """
+    Parse the import statements of a code block.
+
+    :param imports: The import statements, as returned by `transform_imports`
+    :return: The modules in import order and the names bound, or None if the
+        statements can't be parsed
+    """
+    modules = []
+    bindings = []
+    end = 0
+    for match in _IMPORT_PATTERN.finditer(imports):
+        if imports[end : match.start()].strip():
+            return None
+        end = match.end()
+        module = match["module"]
+        type_only = match["type"] is not None
+        modules.append(module)
+        if match["default"]:
+            bindings.append(
+                ImportBinding(match["default"], module, "default", type_only)
             )
-            test_code = f"""
-test('test_code_block_{index}', async () => {{
-{indented_code}
-}});
-"""
-            file.write(test_code)
-        print(f"Tests written to {output_file}")
+        if match["namespace"]:
+            bindings.append(ImportBinding(match["namespace"], module, "*", type_only))
+        for specifier in (match["named"] or "").split(","):
+            specifier = specifier.split()
+            if not specifier:
+                continue
+            is_type = type_only
+            # `type X` and `type X as Y`, but not an export named `type`
+            if specifier[0] == "type" and len(specifier) in (2, 4):
+                is_type = True
+                specifier = specifier[1:]
+            if len(specifier) == 3 and specifier[1] == "as":
+                imported, local = specifier[0], specifier[2]
+            elif len(specifier) == 1:
+                imported = local = specifier[0]
+            else:
+                return None
+            bindings.append(ImportBinding(local, module, imported, is_type))
+    if imports[end:].strip():
+        return None
+    return modules, bindings
+
+
+class _Shard:
+    """The tests of a shard file, and the imports they share."""
+
+    def __init__(self):
+        self.modules = {}
+        self.bindings = {}
+        self.tests = []
+
+    def accepts(self, bindings: list) -> bool:
+        """Whether none of the names is already imported from something else."""
+        for b in bindings:
+            known = self.bindings.get(b.local)
+            if known is not None and known[1:3] != (b.module, b.imported):
+                return False
+        return True
+
+    def add(self, index: int, code: str, modules: list, bindings: list) -> None:
+        self.modules.update(dict.fromkeys(modules))
+        for b in bindings:
+            known = self.bindings.get(b.local)
+            # A value import also provides the type.
+            if known is None or known.type_only and not b.type_only:
+                self.bindings[b.local] = b
+        self.tests.append(_jest_test(index, code))
+
+    def render_imports(self) -> str:
+        lines = []
+        for module in self.modules:
+            bindings = [b for b in self.bindings.values() if b.module == module]
+            if not bindings:
+                lines.append(f'import "{module}";')
+            for b in bindings:
+                if b.imported == "*" or b.imported == "default" and b.type_only:
+                    keyword = "import type" if b.type_only else "import"
+                    clause = f"* as {b.local}" if b.imported == "*" else b.local
+                    lines.append(f'{keyword} {clause} from "{module}";')
+            bindings = [
+                b
+                for b in bindings
+                if b.imported != "*" and not (b.imported == "default" and b.type_only)
+            ]
+            for type_only, keyword in [(False, "import"), (True, "import type")]:
+                group = [b for b in bindings if b.type_only == type_only]
+                # A second default import of the module is imported by name.
+                clause = [b.local for b in group if b.imported == "default"][:1]
+                named = [
+                    b.local if b.local == b.imported else f"{b.imported} as {b.local}"
+                    for b in group
+                    if b.local not in clause
+                ]
+                if named:
+                    clause.append("{ " + ", ".join(named) + " }")
+                if clause:
+                    lines.append(f'{keyword} {", ".join(clause)} from "{module}";')
+        return "\n".join(lines)
+
+
+def write_jest_shards(
+    code_blocks: list[str], output_dir: str, shards: int
+) -> list[str]:
+    """
+    Write the Jest tests of TypeScript code blocks into a few bundled files.
+
+    Blocks are split into `shards` runs of consecutive blocks, each written to
+    one file: Jest pays its module registry, transform and worker startup costs
+    per file rather than per block. The imports of a shard are hoisted to the
+    top of its file and deduplicated, while every block keeps its own `test()`
+    scope, so the names a block declares don't clash with the other blocks'.
+
+    A block importing a name that its shard already imports from something else
+    goes to the next shard that doesn't, or to an extra one. A block whose
+    imports can't be parsed gets a file of its own.
+
+    :param code_blocks: List of code blocks to test
+    :param output_dir: Path to the output directory
+    :param shards: The number of files to write, unless blocks conflict
+    :return: The paths of the test files, whether rewritten or not
+    """
+    bundles = [_Shard() for _ in range(min(shards, len(code_blocks)))]
+    count = len(bundles)
+    isolated = []
+    for index, code_block in enumerate(code_blocks):
+        imports, transformed_code = transform_imports(add_boilerplate(code_block))
+        parsed = parse_imports(imports)
+        if parsed is None:
+            isolated.append(imports + "\n" + _jest_test(index, transformed_code))
+            continue
+        first = index * count // len(code_blocks)
+        shard = next(
+            (b for b in bundles[first:] + bundles[:first] if b.accepts(parsed[1])),
+            None,
+        )
+        if shard is None:
+            shard = _Shard()
+            bundles.append(shard)
+        shard.add(index, transformed_code, *parsed)
+    contents = []
+    for shard in bundles:
+        if not shard.tests:
+            # Blocks that can't be bundled may leave a shard empty.
+            continue
+        imports = shard.render_imports()
+        contents.append((imports + "\n" if imports else "") + "".join(shard.tests))
+    written = []
+    for number, content in enumerate(contents + isolated):
+        output_file = f"{output_dir}/test_code_blocks_{number}.test.ts"
+        write_if_changed(output_file, content)
+        written.append(output_file)
+    return written
+
+
+def remove_stale_tests(output_dir: str, keep: list[str]) -> list[str]:
+    """
+    Remove generated tests that are no longer produced.
+
+    :param output_dir: Path to the output directory
+    :param keep: The test files to keep
+    :return: The removed files
+    """
+    keep = {str(Path(path)) for path in keep}
+    removed = []
+    for f in Path(output_dir).glob("*"):
+        if str(f) not in keep:
+            f.unlink()
+            removed.append(str(f))
+    return removed
+
+
+def jest_dir_for(tests_root: Path, mdx_file: str) -> Path:
+    """
+    Return the directory of Jest tests generated for an MDX file.
+
+    Tests mirror the docs layout: `a/b/page.mdx` becomes `a/b/page/`.
+
+    :param tests_root: Root of the generated Jest tests
+    :param mdx_file: Path to the MDX file, relative to the docs root
+    """
+    path = Path(mdx_file)
+    return tests_root / path.parent / path.stem
 
 
 def main(mdx_file: str, output_dir: str) -> None:
@@ -108,21 +319,20 @@ def main(mdx_file: str, output_dir: str) -> None:
     Main function to extract TypeScript code blocks from MDX and write to Jest file.
 
     :param mdx_file: Path to the MDX file
-    :param output_file: Path to the output file
+    :param output_dir: Path to the output directory
     """
     code_blocks = extract_code_blocks(mdx_file)
-    write_jest_tests(code_blocks, output_dir)
+    written = write_jest_tests(code_blocks, output_dir)
+    remove_stale_tests(output_dir, written)
+    for output_file in written:
+        print(f"Tests written to {output_file}")
 
 
 if __name__ == "__main__":
     root = Path(__file__).parent.parent.absolute()
     files = ["tracing/tracing-faq.mdx"]
     for file in files:
-        stem = Path(file).stem
-        dest_folder = root / "tests/js_unit_tests" / Path(file).parent / stem
-        # Remove recursive all files in the folder
-        for f in dest_folder.glob("*"):
-            f.unlink()
+        dest_folder = jest_dir_for(root / "tests/js_unit_tests", file)
         dest_folder.mkdir(parents=True, exist_ok=True)
         main(
             str(root / "docs" / file),
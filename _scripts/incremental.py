@@ -0,0 +1,52 @@
+import os
+import sys
+from pathlib import Path
+from typing import Iterable, Union
+
+sys.path.insert(0, str(Path(__file__).parents[1] / "subdirectories" / "scripts"))
+
+# Shared with the cookbook build, so both incremental builds hash and write alike.
+from build_cache import BuildManifest, hash_bytes, write_if_changed  # noqa: E402,F401
+
+
+def generator_hash(scripts: Iterable[Union[str, Path]]) -> str:
+    """Hash the generator scripts, so that changing them regenerates every test."""
+    return hash_bytes(*(Path(script).read_bytes() for script in sorted(map(str, scripts))))
+
+
+class SnippetManifest(BuildManifest):
+    """
+    A persistent record of the tests generated from each MDX file.
+
+    A BuildManifest with a single stage, keyed by MDX file: each entry stores the
+    content hash of the MDX file, the hash of the generator scripts, and the
+    output files generated from it.
+    """
+
+    STAGE = "snippets"
+
+    def __init__(self, path: Union[str, Path], generator_hash: str):
+        super().__init__(str(path), generator_hash)
+
+    def source_hash(self, mdx_path: Union[str, Path]) -> str:
+        return hash_bytes(Path(mdx_path).read_bytes())
+
+    def is_fresh(self, key: str, source_hash: str) -> bool:
+        return super().is_fresh(self.STAGE, key, source_hash)
+
+    def record(self, key: str, source_hash: str, outputs: Iterable[str]) -> None:
+        """Record the tests of an MDX file, deleting those it no longer produces."""
+        outputs = [str(output) for output in outputs]
+        for output in set(self.outputs(self.STAGE, key)) - set(outputs):
+            if os.path.exists(output):
+                os.remove(output)
+        super().record(self.STAGE, key, source_hash, outputs)
+
+    def prune(self, live_keys: Iterable[str]) -> list[str]:
+        """
+        Forget MDX files that no longer exist and delete their generated tests.
+
+        :param live_keys: The MDX files that still exist
+        :return: The removed output files
+        """
+        return super().prune(self.STAGE, live_keys)
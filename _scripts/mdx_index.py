@@ -0,0 +1,420 @@
+"""A persistent index of the code blocks of the docs.
+
+Every MDX file is tokenized once into its code blocks, which are stored in a
+SQLite database with their language, kind, line span, enclosing `<CodeTabs>`
+group and content hash. The extractors query the index instead of scanning the
+files themselves; a file is only tokenized again when it changes.
+
+Blocks are of three kinds:
+
+- "tab": code tab helpers like `PythonBlock(\`...\`)`, up to the first backtick
+  followed by `,` or `)`, possibly on the next line
+- "fence": fenced code blocks; the language is the fence's info string, and the
+  content of indented fences, e.g. in lists, is dedented by the fence's indent
+- "content": `content: \`...\`` fields of CodeTabs tab objects; the language is
+  the tab's `language`, or else its `value`
+
+Apart from that dedent, code is stored as it appears in the file: escapes in
+tabs aren't undone, and fences don't include their last newline.
+
+    python _scripts/mdx_index.py [--rebuild] [--language python] [mdx_file ...]
+"""
+import argparse
+import functools
+import os
+import re
+import sqlite3
+import sys
+from pathlib import Path
+from typing import Iterable, Iterator, NamedTuple, Optional, Union
+
+from incremental import hash_bytes
+
+ROOT = Path(__file__).parent.parent.absolute()
+DOCS_ROOT = ROOT / "docs"
+INDEX_PATH = ROOT / "tests/.mdx-index.sqlite"
+
+
+class Block(NamedTuple):
+    """A code block of an MDX file."""
+
+    language: str
+    kind: str
+    code: str
+    # 1-based lines of the MDX file on which the code starts and ends
+    start_line: int
+    end_line: int
+    # Line of the enclosing <CodeTabs, if any
+    group: Optional[int]
+    hash: str
+
+
+# Languages of the code tab helpers; other helpers are named after theirs, e.g.
+# "shell" for ShellBlock.
+_TAB_LANGUAGES = {
+    "PythonBlock": "python",
+    "AsyncPythonBlock": "python",
+    "TypeScriptBlock": "typescript",
+}
+# Everything the tokenizer stops at. They are found with plain string searches,
+# which are much faster than a regex alternation, and checked afterwards.
+_TOKENS = (
+    "```",
+    "Block(`",
+    "content: `",
+    "<CodeTabs",
+    "</CodeTabs>",
+    "/>",
+    "value:",
+    "language:",
+)
+_FENCE = re.compile(r"`{3,}(?P<info>[^`\s]*)[^`\n]*$", re.MULTILINE)
+_FIELD = re.compile(r'(value|language):\s*"([^"]*)"')
+_COMPONENT = re.compile(r"\w*Block$")
+# Tabs end at a backtick followed by `,` or `)`, possibly on the next line.
+_TAB_END = re.compile(r"`(?:[ \t]*\n[ \t]*)?[,)]")
+
+
+@functools.lru_cache(maxsize=None)
+def _closing_fence(length: int) -> re.Pattern:
+    return re.compile(r"^[ \t]*`{%d,}[ \t]*$" % length, re.MULTILINE)
+
+
+@functools.lru_cache(maxsize=None)
+def _fence_indent(indent: int) -> re.Pattern:
+    return re.compile(r"^[ \t]{0,%d}" % indent, re.MULTILINE)
+
+
+def _tab_language(component: str) -> str:
+    return _TAB_LANGUAGES.get(component, component[: -len("Block")].lower())
+
+
+def iter_blocks(text: str) -> Iterator[Block]:
+    """
+    Lazily tokenize the text of an MDX file into code blocks, in document order.
+
+    The text is scanned once, from token to token, and lines are only counted
+    up to the tokens found. Blocks that are still open at the end of the text are dropped,
+    like everything after an unclosed fence.
+
+    :param text: The content of the file
+    :return: An iterator of blocks
+    """
+    group = None
+    tab_fields = {}
+    # Line of the position `counted`
+    lineno, counted = 1, 0
+    found = {token: text.find(token) for token in _TOKENS}
+    pos = 0
+    while True:
+        for token, at in found.items():
+            if -1 < at < pos:
+                found[token] = text.find(token, pos)
+        candidates = [(at, token) for token, at in found.items() if at != -1]
+        if not candidates:
+            return
+        start, token = min(candidates)
+        lineno += text.count("\n", counted, start)
+        counted = start
+        pos = start + len(token)
+        line_start = text.rfind("\n", 0, start) + 1
+        indent = text[line_start:start]
+        match = None
+        if token == "```" and not indent.strip():
+            match = _FENCE.match(text, start)
+        if match:
+            # The first line of a fence is always content, even if it is itself a
+            # fence.
+            first_line_end = text.find("\n", match.end() + 1)
+            closing = first_line_end != -1 and _closing_fence(
+                match.start("info") - start
+            ).search(text, first_line_end + 1)
+            if not closing:
+                return
+            # Drop the newline before the closing fence.
+            code = text[match.end() + 1 : closing.start() - 1]
+            if indent:
+                code = _fence_indent(len(indent)).sub("", code)
+            end_line = lineno + text.count("\n", start, closing.start()) - 1
+            kind, language, start_line = "fence", match.group("info"), lineno + 1
+            pos = closing.end()
+        elif token == "Block(`":
+            component = _COMPONENT.search(text, line_start, start + len("Block"))
+            end = _TAB_END.search(text, pos)
+            if end is None:
+                return
+            code = text[pos : end.start()]
+            kind, language, start_line = "tab", _tab_language(component.group()), lineno
+            end_line = lineno + code.count("\n")
+            pos = end.start() + 1
+        elif token == "content: `":
+            end = text.find("`", pos)
+            if end == -1:
+                return
+            code = text[pos:end]
+            language = tab_fields.get("language", tab_fields.get("value", ""))
+            kind, start_line, end_line = "content", lineno, lineno + code.count("\n")
+            pos = end + 1
+        else:
+            if token == "<CodeTabs":
+                group = lineno
+            elif token == "</CodeTabs>" or (token == "/>" and not indent.strip()):
+                group = None
+            elif token in ("value:", "language:") and not re.match(r"\w", indent[-1:]):
+                match = _FIELD.match(text, start)
+                if match and match.group(1) == "value":
+                    tab_fields = {"value": match.group(2)}
+                elif match:
+                    tab_fields["language"] = match.group(2)
+            continue
+        yield Block(
+            language,
+            kind,
+            code,
+            start_line,
+            end_line,
+            group,
+            hash_bytes(code.encode()),
+        )
+
+
+def tokenizer_hash() -> str:
+    """Hash the tokenizer, so that changing it tokenizes every file again."""
+    with open(__file__, "rb") as f:
+        return hash_bytes(f.read())
+
+
+class MdxIndex:
+    """
+    The code blocks of the MDX files under a root, persisted in SQLite.
+
+    Files are keyed by their path relative to the root. A file's blocks are
+    refreshed when its size or mtime changed and its content hash differs from
+    the indexed one. Several processes can read the index at once, and each keeps
+    the blocks it read in memory for as long as the file doesn't change.
+    """
+
+    def __init__(
+        self, path: Union[str, Path] = INDEX_PATH, root: Union[str, Path] = DOCS_ROOT
+    ):
+        self.path = Path(path)
+        self.root = Path(root)
+        # (mtime_ns, size) and blocks of the files read by this process
+        self._blocks = {}
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.db = sqlite3.connect(str(self.path), timeout=60)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        with self.db:
+            self.db.executescript("""
+                CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+                CREATE TABLE IF NOT EXISTS files (
+                    path TEXT PRIMARY KEY, mtime_ns INTEGER, size INTEGER, hash TEXT
+                );
+                CREATE TABLE IF NOT EXISTS blocks (
+                    path TEXT,
+                    position INTEGER,
+                    language TEXT,
+                    kind TEXT,
+                    start_line INTEGER,
+                    end_line INTEGER,
+                    code_group INTEGER,
+                    hash TEXT,
+                    code TEXT,
+                    PRIMARY KEY (path, position)
+                );
+                """)
+            version = tokenizer_hash()
+            row = self.db.execute(
+                "SELECT value FROM meta WHERE key = 'tokenizer'"
+            ).fetchone()
+            if row is None or row[0] != version:
+                self.db.execute("DELETE FROM files")
+                self.db.execute("DELETE FROM blocks")
+                self.db.execute(
+                    "INSERT OR REPLACE INTO meta VALUES ('tokenizer', ?)", (version,)
+                )
+
+    def close(self) -> None:
+        self.db.close()
+
+    def _key(self, mdx_file: Union[str, Path]) -> str:
+        # Plain string operations, as this runs for every query
+        relative = os.path.relpath(os.path.join(self.root, mdx_file), self.root)
+        return relative.replace(os.sep, "/")
+
+    def _refresh_file(self, key: str) -> bool:
+        path = os.path.join(self.root, key)
+        row = self.db.execute(
+            "SELECT mtime_ns, size, hash FROM files WHERE path = ?", (key,)
+        ).fetchone()
+        stat = os.stat(path)
+        if row is not None and row[:2] == (stat.st_mtime_ns, stat.st_size):
+            return False
+        with open(path, "rb") as f:
+            data = f.read()
+        content_hash = hash_bytes(data)
+        with self.db:
+            self.db.execute(
+                "INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?)",
+                (key, stat.st_mtime_ns, stat.st_size, content_hash),
+            )
+            if row is not None and row[2] == content_hash:
+                return False
+            self.db.execute("DELETE FROM blocks WHERE path = ?", (key,))
+            text = data.decode("utf-8")
+            self.db.executemany(
+                "INSERT INTO blocks VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    (
+                        key,
+                        position,
+                        block.language,
+                        block.kind,
+                        block.start_line,
+                        block.end_line,
+                        block.group,
+                        block.hash,
+                        block.code,
+                    )
+                    for position, block in enumerate(iter_blocks(text))
+                ),
+            )
+        return True
+
+    def refresh(self, mdx_files: Optional[Iterable[str]] = None) -> int:
+        """
+        Bring the index up to date.
+
+        :param mdx_files: Paths relative to the root (default: every MDX file
+            under the root, forgetting the ones that no longer exist)
+        :return: The number of files that were tokenized
+        """
+        if mdx_files is None:
+            keys = sorted(
+                path.relative_to(self.root).as_posix()
+                for path in self.root.rglob("*.mdx")
+            )
+            with self.db:
+                indexed = {row[0] for row in self.db.execute("SELECT path FROM files")}
+                for key in indexed - set(keys):
+                    self.db.execute("DELETE FROM files WHERE path = ?", (key,))
+                    self.db.execute("DELETE FROM blocks WHERE path = ?", (key,))
+        else:
+            keys = [self._key(mdx_file) for mdx_file in mdx_files]
+        return sum(self._refresh_file(key) for key in keys)
+
+    def blocks(
+        self,
+        mdx_file: Union[str, Path],
+        language: Optional[str] = None,
+        kinds: Optional[tuple] = None,
+    ) -> list:
+        """
+        Return the blocks of a file in document order, refreshing it if needed.
+
+        :param mdx_file: Path to the MDX file, relative to the root or absolute
+        :param language: Only return blocks of this language
+        :param kinds: Only return blocks of these kinds
+        """
+        key = self._key(mdx_file)
+        stat = os.stat(os.path.join(self.root, key))
+        cached = self._blocks.get(key)
+        if cached is None or cached[0] != (stat.st_mtime_ns, stat.st_size):
+            self._refresh_file(key)
+            rows = self.db.execute(
+                "SELECT language, kind, code, start_line, end_line, code_group, hash"
+                " FROM blocks WHERE path = ? ORDER BY position",
+                (key,),
+            )
+            cached = (stat.st_mtime_ns, stat.st_size), [Block(*row) for row in rows]
+            self._blocks[key] = cached
+        return [
+            block
+            for block in cached[1]
+            if (language is None or block.language == language)
+            and (kinds is None or block.kind in kinds)
+        ]
+
+
+_INDEX = None
+_INDEX_PID = None
+
+
+def use_index(
+    path: Union[str, Path] = INDEX_PATH, root: Union[str, Path] = DOCS_ROOT
+) -> MdxIndex:
+    """Open the index `file_blocks` serves the files under `root` from."""
+    global _INDEX, _INDEX_PID
+    if _INDEX is not None and _INDEX_PID == os.getpid():
+        _INDEX.close()
+    _INDEX, _INDEX_PID = MdxIndex(path, root), os.getpid()
+    return _INDEX
+
+
+def default_index() -> MdxIndex:
+    """Return the index opened by `use_index`, by default the docs tree's."""
+    if _INDEX is None:
+        return use_index()
+    if _INDEX_PID != os.getpid():
+        # A connection inherited from a forked parent must not be used.
+        return use_index(_INDEX.path, _INDEX.root)
+    return _INDEX
+
+
+def file_blocks(
+    mdx_file: Union[str, Path],
+    language: Optional[str] = None,
+    kinds: Optional[tuple] = None,
+) -> Iterator[Block]:
+    """
+    Yield the code blocks of an MDX file in document order.
+
+    Files under docs/, or the root given to `use_index`, are served from the
+    persistent index; other files are tokenized as they are read.
+
+    :param mdx_file: Path to the MDX file
+    :param language: Only yield blocks of this language
+    :param kinds: Only yield blocks of these kinds
+    """
+    path = os.path.abspath(mdx_file)
+    index = default_index()
+    if path.startswith(os.path.join(index.root, "")):
+        yield from index.blocks(path, language, kinds)
+        return
+    with open(path, "r") as file:
+        text = file.read()
+    for block in iter_blocks(text):
+        if (language is None or block.language == language) and (
+            kinds is None or block.kind in kinds
+        ):
+            yield block
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "mdx_files",
+        nargs="*",
+        help="Print the blocks of these MDX files, relative to docs/.",
+    )
+    parser.add_argument(
+        "--rebuild", action="store_true", help="Tokenize every file again."
+    )
+    parser.add_argument("--language", help="Only print blocks of this language.")
+    args = parser.parse_args()
+
+    if args.rebuild:
+        INDEX_PATH.unlink(missing_ok=True)
+    index = default_index()
+    print(f"Tokenized {index.refresh()} files", file=sys.stderr)
+    for mdx_file in args.mdx_files:
+        for block in index.blocks(mdx_file, args.language):
+            print(
+                f"{mdx_file}:{block.start_line}-{block.end_line}: {block.language}"
+                f" {block.kind} group={block.group} {block.hash[:12]}"
+            )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,623 @@
+"""An in-process stand-in for the LangSmith API, for running doc snippets offline.
+
+The server keeps projects, runs, datasets, examples and feedback in memory and
+implements the endpoints the docs snippets exercise: tracing ingestion, run
+queries (including the filter grammar used in the docs, e.g.
+`and(eq(metadata_key, 'user_id'), eq(metadata_value, '...'))`), datasets,
+examples and feedback. Point a client at it through the endpoint setting:
+
+    python _scripts/mock_langsmith_server.py --port 1984
+    LANGSMITH_ENDPOINT=http://127.0.0.1:1984 LANGSMITH_API_KEY=mock pytest tests/py_unit_tests
+"""
+import argparse
+import ast
+import contextlib
+import datetime
+import json
+import re
+import threading
+import uuid
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Iterator, Optional
+from urllib.parse import parse_qs, urlparse
+
+TENANT_ID = "00000000-0000-0000-0000-000000000000"
+
+# Tell clients to send runs as JSON batches rather than (compressed) multipart.
+INFO = {
+    "version": "0.0.0-mock",
+    "instance_flags": {},
+    "batch_ingest_config": {
+        "use_multipart_endpoint": False,
+        "scale_up_qsize_trigger": 1000,
+        "scale_up_nthreads_limit": 16,
+        "scale_down_nempty_trigger": 4,
+        "size_limit": 100,
+        "size_limit_bytes": 20_971_520,
+    },
+}
+
+
+def _now() -> str:
+    return datetime.datetime.now(datetime.timezone.utc).isoformat()
+
+
+class FilterSyntaxError(ValueError):
+    """Raised for run filters the mock server can't parse."""
+
+
+# Filter grammar: call := name "(" [arg ("," arg)*] ")"
+#                 arg  := call | string | number | name
+_TOKEN_PATTERN = re.compile(
+    r"""\s*(?:
+        (?P<string>"(?:[^"\\]|\\.)*"|'(?:[^'\\]|\\.)*')
+      | (?P<number>-?\d+(?:\.\d+)?)
+      | (?P<name>[A-Za-z_][A-Za-z0-9_.]*)
+      | (?P<punct>[(),])
+    )""",
+    re.VERBOSE,
+)
+
+
+def parse_filter(expression: str) -> Any:
+    """
+    Parse a run filter into nested `(operator, [arguments])` tuples.
+
+    Strings and numbers become Python values; bare names (fields and `null`)
+    stay strings wrapped in a `("field", name)` tuple.
+    """
+    tokens = []
+    pos = 0
+    expression = expression.strip()
+    while pos < len(expression):
+        match = _TOKEN_PATTERN.match(expression, pos)
+        if not match or match.end() == pos:
+            raise FilterSyntaxError(f"Unexpected input at {pos}: {expression[pos:]!r}")
+        kind = match.lastgroup
+        tokens.append((kind, match.group(kind)))
+        pos = match.end()
+        while pos < len(expression) and expression[pos].isspace():
+            pos += 1
+
+    def parse_arg(i):
+        kind, value = tokens[i]
+        if kind in ("string", "number"):
+            return ast.literal_eval(value), i + 1
+        if kind == "name":
+            if i + 1 < len(tokens) and tokens[i + 1] == ("punct", "("):
+                args = []
+                i += 2
+                while tokens[i] != ("punct", ")"):
+                    arg, i = parse_arg(i)
+                    args.append(arg)
+                    if tokens[i] == ("punct", ","):
+                        i += 1
+                return (value, args), i + 1
+            return ("field", value), i + 1
+        raise FilterSyntaxError(f"Unexpected {value!r}")
+
+    try:
+        tree, end = parse_arg(0)
+    except IndexError:
+        raise FilterSyntaxError(f"Unterminated filter: {expression!r}") from None
+    if end != len(tokens):
+        raise FilterSyntaxError(f"Trailing input in filter: {expression!r}")
+    return tree
+
+
+def _field(run: dict, name: str) -> Any:
+    if name == "null":
+        return None
+    if name == "latency":
+        if not run.get("end_time"):
+            return None
+        start = datetime.datetime.fromisoformat(run["start_time"])
+        end = datetime.datetime.fromisoformat(run["end_time"])
+        return (end - start).total_seconds()
+    if name == "is_root":
+        return run.get("parent_run_id") is None
+    if name == "metadata":
+        return (run.get("extra") or {}).get("metadata") or {}
+    return run.get(name)
+
+
+def _compare(op: str, left: Any, right: Any) -> bool:
+    if op == "eq":
+        return (
+            str(left) == str(right)
+            if left is not None and right is not None
+            else left == right
+        )
+    if op == "neq":
+        return not _compare("eq", left, right)
+    if left is None or right is None:
+        return False
+    if isinstance(right, (int, float)):
+        left = float(left)
+    elif isinstance(left, str) and re.match(r"\d{4}-\d{2}-\d{2}", str(right)):
+        left = datetime.datetime.fromisoformat(left.replace("Z", "+00:00"))
+        right = datetime.datetime.fromisoformat(str(right).replace("Z", "+00:00"))
+    return {
+        "gt": left > right,
+        "gte": left >= right,
+        "lt": left < right,
+        "lte": left <= right,
+    }[op]
+
+
+def _value(run: dict, arg: Any) -> Any:
+    if isinstance(arg, tuple) and arg[0] == "field":
+        return _field(run, arg[1])
+    return arg
+
+
+def matches(run: dict, tree: Any) -> bool:
+    """Whether a run matches a parsed filter."""
+    op, args = tree
+    if op == "and":
+        # eq(metadata_key, k) followed by eq(metadata_value, v) means metadata[k] == v.
+        metadata = _field(run, "metadata")
+        pending_key = None
+        for arg in args:
+            if arg[0] == "eq" and arg[1][0] == ("field", "metadata_key"):
+                pending_key = arg[1][1]
+                if pending_key not in metadata:
+                    return False
+            elif arg[0] == "eq" and arg[1][0] == ("field", "metadata_value"):
+                value = arg[1][1]
+                if pending_key is not None:
+                    if str(metadata.get(pending_key)) != str(value):
+                        return False
+                elif value not in map(str, metadata.values()):
+                    return False
+                pending_key = None
+            elif not matches(run, arg):
+                return False
+        return True
+    if op == "or":
+        return any(matches(run, arg) for arg in args)
+    if op == "not":
+        return not matches(run, args[0])
+    if op == "has":
+        container = _value(run, args[0]) or []
+        return _value(run, args[1]) in container
+    if op == "search":
+        needle = str(_value(run, args[-1])).lower()
+        haystack = json.dumps(
+            [run.get("name"), run.get("inputs"), run.get("outputs"), run.get("error")]
+        ).lower()
+        return needle in haystack
+    if op in ("eq", "neq") and args[0] == ("field", "metadata_key"):
+        return (args[1] in _field(run, "metadata")) == (op == "eq")
+    if op in ("eq", "neq") and args[0] == ("field", "metadata_value"):
+        found = str(args[1]) in map(str, _field(run, "metadata").values())
+        return found == (op == "eq")
+    if op in ("eq", "neq", "gt", "gte", "lt", "lte"):
+        return _compare(op, _value(run, args[0]), _value(run, args[1]))
+    if op == "in":
+        return _value(run, args[0]) in [_value(run, arg) for arg in args[1:]]
+    raise FilterSyntaxError(f"Unsupported filter operator: {op}")
+
+
+class Store:
+    """The in-memory state of the mock server."""
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.projects = {}
+        self.runs = {}
+        self.datasets = {}
+        self.examples = {}
+        self.feedback = {}
+
+    def project(
+        self, name: Optional[str] = None, project_id: Optional[str] = None
+    ) -> dict:
+        """Return a project by id or name, creating named projects on first use."""
+        with self.lock:
+            if project_id is not None:
+                return self.projects.get(str(project_id))
+            for project in self.projects.values():
+                if project["name"] == name:
+                    return project
+            return self.create_project({"name": name or "default"})
+
+    def create_project(self, body: dict) -> dict:
+        with self.lock:
+            project = {
+                "tenant_id": TENANT_ID,
+                "start_time": _now(),
+                "reference_dataset_id": None,
+                "description": None,
+                "extra": None,
+                **body,
+                "id": str(body.get("id") or uuid.uuid4()),
+            }
+            self.projects[project["id"]] = project
+            return project
+
+    def upsert_run(self, body: dict, patch: bool = False) -> dict:
+        with self.lock:
+            run_id = str(body.get("id") or uuid.uuid4())
+            if patch and run_id in self.runs:
+                self.runs[run_id].update(
+                    {k: v for k, v in body.items() if v is not None}
+                )
+                return self.runs[run_id]
+            session_id = body.get("session_id")
+            if session_id is None:
+                session_id = self.project(name=body.get("session_name"))["id"]
+            run = {
+                "inputs": {},
+                "outputs": None,
+                "extra": {},
+                "tags": [],
+                "events": [],
+                "error": None,
+                "end_time": None,
+                "parent_run_id": None,
+                "start_time": _now(),
+                **body,
+                "id": run_id,
+                "trace_id": str(body.get("trace_id") or run_id),
+                "session_id": str(session_id),
+            }
+            run["status"] = (
+                "error"
+                if run["error"]
+                else ("success" if run["end_time"] else "pending")
+            )
+            self.runs[run_id] = run
+            return run
+
+    def query_runs(self, query: dict) -> list:
+        sessions = {str(s) for s in query.get("session") or []}
+        ids = {str(i) for i in query.get("id") or []}
+        trees = [parse_filter(query[key]) for key in ("filter",) if query.get(key)]
+        with self.lock:
+            runs = list(self.runs.values())
+        selected = []
+        for run in runs:
+            if sessions and run["session_id"] not in sessions:
+                continue
+            if ids and run["id"] not in ids:
+                continue
+            if query.get("run_type") and run.get("run_type") != query["run_type"]:
+                continue
+            if query.get("is_root") is not None and (
+                (run.get("parent_run_id") is None) != query["is_root"]
+            ):
+                continue
+            if query.get("trace") and run["trace_id"] != str(query["trace"]):
+                continue
+            if query.get("parent_run") and str(run.get("parent_run_id")) != str(
+                query["parent_run"]
+            ):
+                continue
+            if (
+                query.get("error") is not None
+                and bool(run.get("error")) != query["error"]
+            ):
+                continue
+            if all(matches(run, tree) for tree in trees):
+                selected.append(run)
+        selected.sort(key=lambda run: run["start_time"], reverse=True)
+        return selected
+
+    def create_dataset(self, body: dict) -> dict:
+        with self.lock:
+            if any(d["name"] == body.get("name") for d in self.datasets.values()):
+                raise ConflictError(f"Dataset {body.get('name')} already exists")
+            dataset = {
+                "description": None,
+                "data_type": "kv",
+                "inputs_schema_definition": None,
+                "outputs_schema_definition": None,
+                "example_count": 0,
+                "modified_at": _now(),
+                **body,
+                "id": str(body.get("id") or uuid.uuid4()),
+                "tenant_id": TENANT_ID,
+                "created_at": _now(),
+            }
+            self.datasets[dataset["id"]] = dataset
+            return dataset
+
+    def create_example(self, body: dict) -> dict:
+        with self.lock:
+            example = {
+                "inputs": {},
+                "outputs": None,
+                "metadata": None,
+                "source_run_id": None,
+                **body,
+                "id": str(body.get("id") or uuid.uuid4()),
+                "dataset_id": str(body["dataset_id"]),
+                "created_at": body.get("created_at") or _now(),
+                "modified_at": _now(),
+            }
+            self.examples[example["id"]] = example
+            dataset = self.datasets.get(example["dataset_id"])
+            if dataset is not None:
+                dataset["example_count"] = sum(
+                    e["dataset_id"] == dataset["id"] for e in self.examples.values()
+                )
+            return example
+
+    def create_feedback(self, body: dict) -> dict:
+        with self.lock:
+            run = self.runs.get(str(body.get("run_id")), {})
+            feedback = {
+                "score": None,
+                "value": None,
+                "comment": None,
+                "correction": None,
+                "feedback_source": None,
+                **body,
+                "id": str(body.get("id") or uuid.uuid4()),
+                "trace_id": str(
+                    body.get("trace_id") or run.get("trace_id") or body.get("run_id")
+                ),
+                "created_at": _now(),
+                "modified_at": _now(),
+            }
+            self.feedback[feedback["id"]] = feedback
+            return feedback
+
+
+class ConflictError(Exception):
+    pass
+
+
+class NotFoundError(Exception):
+    pass
+
+
+def _paginate(items: list, params: dict) -> list:
+    offset = int(params.get("offset", 0))
+    limit = params.get("limit")
+    return items[offset : offset + int(limit)] if limit is not None else items[offset:]
+
+
+class Handler(BaseHTTPRequestHandler):
+    """Route LangSmith API requests to the store."""
+
+    server_version = "MockLangSmith/0.1"
+    store: Store
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status: int, body: Any = None) -> None:
+        data = json.dumps(body, default=str).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _body(self) -> Any:
+        length = int(self.headers.get("Content-Length") or 0)
+        data = self.rfile.read(length) if length else b""
+        if not data or not self.headers.get("Content-Type", "").startswith(
+            "application/json"
+        ):
+            return data
+        return json.loads(data)
+
+    def _route(self, method: str) -> None:
+        url = urlparse(self.path)
+        # Accept both `http://host` and `http://host/api/v1` style endpoints.
+        path = re.sub(r"^/api(?=/v1/)", "", url.path)
+        path = re.sub(r"^/v1(?!/platform)", "", path).rstrip("/") or "/"
+        params = {k: v if len(v) > 1 else v[0] for k, v in parse_qs(url.query).items()}
+        parts = path.strip("/").split("/")
+        handler = getattr(self, f"{method}_{parts[0]}", None)
+        try:
+            if handler is None:
+                raise NotFoundError(
+                    f"{method} {url.path} is not supported by the mock server"
+                )
+            status, body = handler(parts[1:], params)
+        except NotFoundError as e:
+            status, body = HTTPStatus.NOT_FOUND, {"detail": str(e)}
+        except ConflictError as e:
+            status, body = HTTPStatus.CONFLICT, {"detail": str(e)}
+        except FilterSyntaxError as e:
+            status, body = HTTPStatus.BAD_REQUEST, {"detail": str(e)}
+        self._send(status, body)
+
+    def do_GET(self):
+        self._route("get")
+
+    def do_POST(self):
+        self._route("post")
+
+    def do_PATCH(self):
+        self._route("patch")
+
+    def do_DELETE(self):
+        self._route("delete")
+
+    # Info
+
+    def get_info(self, parts, params):
+        return HTTPStatus.OK, INFO
+
+    # Projects ("sessions")
+
+    def get_sessions(self, parts, params):
+        if parts:
+            project = self.store.project(project_id=parts[0])
+            if project is None:
+                raise NotFoundError(f"Project {parts[0]} not found")
+            return HTTPStatus.OK, project
+        projects = list(self.store.projects.values())
+        if "name" in params:
+            projects = [p for p in projects if p["name"] == params["name"]]
+        return HTTPStatus.OK, _paginate(projects, params)
+
+    def post_sessions(self, parts, params):
+        return HTTPStatus.OK, self.store.create_project(self._body())
+
+    def patch_sessions(self, parts, params):
+        project = self.store.project(project_id=parts[0])
+        if project is None:
+            raise NotFoundError(f"Project {parts[0]} not found")
+        project.update(self._body())
+        return HTTPStatus.OK, project
+
+    # Runs
+
+    def get_runs(self, parts, params):
+        run = self.store.runs.get(parts[0]) if parts else None
+        if run is None:
+            raise NotFoundError(f"Run {parts} not found")
+        return HTTPStatus.OK, run
+
+    def post_runs(self, parts, params):
+        if not parts:
+            self.store.upsert_run(self._body())
+            return HTTPStatus.ACCEPTED, {}
+        if parts[0] == "batch":
+            body = self._body()
+            for run in body.get("post") or []:
+                self.store.upsert_run(run)
+            for run in body.get("patch") or []:
+                self.store.upsert_run(run, patch=True)
+            return HTTPStatus.ACCEPTED, {}
+        if parts[0] == "multipart":
+            # Multipart uploads aren't parsed; /info asks clients to send batches.
+            self._body()
+            return HTTPStatus.ACCEPTED, {}
+        if parts[0] == "query":
+            query = self._body()
+            runs = self.store.query_runs(query)
+            offset = int(query.get("cursor") or 0)
+            limit = int(query.get("limit") or 100)
+            page = runs[offset : offset + limit]
+            next_cursor = str(offset + limit) if offset + limit < len(runs) else None
+            return HTTPStatus.OK, {"runs": page, "cursors": {"next": next_cursor}}
+        raise NotFoundError(f"POST /runs/{'/'.join(parts)} is not supported")
+
+    def patch_runs(self, parts, params):
+        self.store.upsert_run({**self._body(), "id": parts[0]}, patch=True)
+        return HTTPStatus.ACCEPTED, {}
+
+    # Datasets and examples
+
+    def get_datasets(self, parts, params):
+        if parts:
+            dataset = self.store.datasets.get(parts[0])
+            if dataset is None:
+                raise NotFoundError(f"Dataset {parts[0]} not found")
+            return HTTPStatus.OK, dataset
+        datasets = list(self.store.datasets.values())
+        if "name" in params:
+            datasets = [d for d in datasets if d["name"] == params["name"]]
+        if "id" in params:
+            ids = params["id"] if isinstance(params["id"], list) else [params["id"]]
+            datasets = [d for d in datasets if d["id"] in ids]
+        return HTTPStatus.OK, _paginate(datasets, params)
+
+    def post_datasets(self, parts, params):
+        return HTTPStatus.OK, self.store.create_dataset(self._body())
+
+    def patch_datasets(self, parts, params):
+        dataset = self.store.datasets.get(parts[0]) if parts else None
+        if dataset is None:
+            raise NotFoundError(f"Dataset {parts} not found")
+        dataset.update(self._body())
+        return HTTPStatus.OK, dataset
+
+    def delete_datasets(self, parts, params):
+        with self.store.lock:
+            if self.store.datasets.pop(parts[0], None) is None:
+                raise NotFoundError(f"Dataset {parts[0]} not found")
+            for example_id, example in list(self.store.examples.items()):
+                if example["dataset_id"] == parts[0]:
+                    del self.store.examples[example_id]
+        return HTTPStatus.OK, {}
+
+    def get_examples(self, parts, params):
+        if parts:
+            example = self.store.examples.get(parts[0])
+            if example is None:
+                raise NotFoundError(f"Example {parts[0]} not found")
+            return HTTPStatus.OK, example
+        examples = list(self.store.examples.values())
+        if "dataset" in params:
+            examples = [e for e in examples if e["dataset_id"] == params["dataset"]]
+        if "id" in params:
+            ids = params["id"] if isinstance(params["id"], list) else [params["id"]]
+            examples = [e for e in examples if e["id"] in ids]
+        examples.sort(key=lambda e: e["created_at"])
+        return HTTPStatus.OK, _paginate(examples, params)
+
+    def post_examples(self, parts, params):
+        body = self._body()
+        if parts and parts[0] == "bulk":
+            return HTTPStatus.OK, [self.store.create_example(e) for e in body]
+        return HTTPStatus.OK, self.store.create_example(body)
+
+    # Feedback
+
+    def get_feedback(self, parts, params):
+        feedback = list(self.store.feedback.values())
+        if "run" in params:
+            runs = params["run"] if isinstance(params["run"], list) else [params["run"]]
+            feedback = [f for f in feedback if str(f["run_id"]) in runs]
+        return HTTPStatus.OK, _paginate(feedback, params)
+
+    def post_feedback(self, parts, params):
+        return HTTPStatus.OK, self.store.create_feedback(self._body())
+
+
+def make_server(host: str = "127.0.0.1", port: int = 0, store: Optional[Store] = None):
+    """Create a mock server; port 0 picks a free port."""
+    handler = type("BoundHandler", (Handler,), {"store": store or Store()})
+    return ThreadingHTTPServer((host, port), handler)
+
+
+@contextlib.contextmanager
+def serve(host: str = "127.0.0.1", port: int = 0) -> Iterator[str]:
+    """
+    Run a mock server in a background thread.
+
+    :return: A context manager yielding the server's endpoint URL
+    """
+    server = make_server(host, port)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield f"http://{host}:{server.server_address[1]}"
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def client_env(endpoint: str) -> dict:
+    """Environment variables that point LangSmith clients at an endpoint."""
+    return {
+        "LANGSMITH_ENDPOINT": endpoint,
+        "LANGCHAIN_ENDPOINT": endpoint,
+        "LANGSMITH_API_KEY": "mock-api-key",
+        "LANGCHAIN_API_KEY": "mock-api-key",
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=1984)
+    args = parser.parse_args()
+
+    server = make_server(args.host, args.port)
+    endpoint = f"http://{args.host}:{server.server_address[1]}"
+    for key, value in client_env(endpoint).items():
+        print(f"export {key}={value}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,248 @@
+"""Run the Python snippets of the docs concurrently, each in its own interpreter.
+
+Snippets are extracted from the MDX sources the same way the generated pytest
+modules are. Each one runs in a fresh Python process with its own working
+directory and a timeout, so snippets can't leak state into each other, a hanging
+snippet can't stall the sweep, and independent snippets run in parallel.
+
+    python _scripts/run_snippets.py [--workers N] [--timeout S] [mdx_file ...]
+
+With `--mock-server`, snippets talk to an in-process mock of the LangSmith API
+instead of the real service, so the sweep runs offline and without credentials.
+"""
+import argparse
+import ast
+import builtins
+import contextlib
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import textwrap
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import NamedTuple, Optional
+
+import extract_python_blocks
+import mock_langsmith_server
+from extract_doc_snippets import DOCS_ROOT, discover_mdx_files
+
+
+class Snippet(NamedTuple):
+    """A code block to run, and how to run it."""
+
+    mdx_file: str
+    index: int
+    line: int
+    code: str
+    # Contains top-level `await`, `async for` or `async with`
+    is_async: bool
+    # Uses names defined by the shared boilerplate, e.g. `client`
+    uses_setup: bool
+
+
+class SnippetResult(NamedTuple):
+    mdx_file: str
+    index: int
+    line: int
+    # "passed", "failed" or "timeout"
+    outcome: str
+    duration: float
+    output: str = ""
+
+
+def defined_names(code: str) -> set[str]:
+    """Return the names a piece of code binds at module level."""
+    names = set()
+    for node in ast.walk(ast.parse(code)):
+        if isinstance(node, (ast.Import, ast.ImportFrom)):
+            names.update((alias.asname or alias.name).split(".")[0] for alias in node.names)
+        elif isinstance(node, ast.Name) and isinstance(node.ctx, ast.Store):
+            names.add(node.id)
+        elif isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            names.add(node.name)
+    return names
+
+
+def uses_names(code: str, names: set[str]) -> bool:
+    """
+    Whether code reads any of `names` without defining them itself.
+
+    Code that can't be parsed is assumed to use them, so that it fails with its
+    own error rather than a missing setup.
+    """
+    try:
+        tree = ast.parse(code)
+    except SyntaxError:
+        return True
+    loaded = {
+        node.id
+        for node in ast.walk(tree)
+        if isinstance(node, ast.Name) and isinstance(node.ctx, ast.Load)
+    }
+    return bool((loaded & names) - defined_names(code))
+
+
+def collect_snippets(mdx_files: list[str], setup: str) -> list[Snippet]:
+    """
+    Extract and classify the snippets of the given MDX files.
+
+    :param mdx_files: Paths to the MDX files, relative to the docs root
+    :param setup: Boilerplate that snippets may rely on
+    """
+    setup_names = defined_names(setup) - set(dir(builtins))
+    snippets = []
+    for mdx_file in mdx_files:
+        diagnostics = []
+        blocks = extract_python_blocks.iter_testable_blocks(
+            str(DOCS_ROOT / mdx_file), diagnostics
+        )
+        for index, block in enumerate(blocks):
+            snippets.append(
+                Snippet(
+                    mdx_file,
+                    index,
+                    block.line,
+                    block.code,
+                    is_async=extract_python_blocks.is_async_code(block.code),
+                    uses_setup=uses_names(block.code, setup_names),
+                )
+            )
+        for diagnostic in diagnostics:
+            print(
+                f"{mdx_file}:{diagnostic.line}: skipped, {diagnostic.message}",
+                file=sys.stderr,
+            )
+    return snippets
+
+
+def build_program(snippet: Snippet, setup: str) -> str:
+    """Return a standalone program that runs a snippet."""
+    program = setup if snippet.uses_setup else ""
+    if snippet.is_async:
+        return (
+            program
+            + "import asyncio\n\n\nasync def _snippet():\n"
+            + textwrap.indent(snippet.code, "    ")
+            + "\n\n\nasyncio.run(_snippet())\n"
+        )
+    return program + snippet.code + "\n"
+
+
+def run_snippet(
+    snippet: Snippet, setup: str, timeout: float, env: Optional[dict] = None
+) -> SnippetResult:
+    """Run a snippet in a fresh interpreter and working directory."""
+    start = time.perf_counter()
+    with tempfile.TemporaryDirectory(prefix="snippet-") as cwd:
+        try:
+            process = subprocess.run(
+                [sys.executable, "-c", build_program(snippet, setup)],
+                cwd=cwd,
+                env=env,
+                capture_output=True,
+                text=True,
+                timeout=timeout,
+            )
+        except subprocess.TimeoutExpired:
+            outcome, output = "timeout", f"Timed out after {timeout}s"
+        else:
+            outcome = "passed" if process.returncode == 0 else "failed"
+            output = process.stderr[-4000:]
+    return SnippetResult(
+        snippet.mdx_file,
+        snippet.index,
+        snippet.line,
+        outcome,
+        time.perf_counter() - start,
+        output,
+    )
+
+
+def run_snippets(
+    snippets: list[Snippet],
+    setup: str,
+    workers: Optional[int] = None,
+    timeout: float = 60,
+    env: Optional[dict] = None,
+) -> list[SnippetResult]:
+    """
+    Run snippets concurrently.
+
+    Every snippet runs in its own process, so the threads here only wait on them.
+
+    :return: One result per snippet, in input order
+    """
+    workers = max(1, workers or os.cpu_count() or 1)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return list(
+            executor.map(lambda s: run_snippet(s, setup, timeout, env), snippets)
+        )
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "mdx_files",
+        nargs="*",
+        help="MDX files relative to docs/ (default: every MDX file).",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=None,
+        help="Number of snippets run at once (default: CPU count).",
+    )
+    parser.add_argument(
+        "--timeout",
+        type=float,
+        default=60,
+        help="Seconds after which a snippet is killed (default: 60).",
+    )
+    parser.add_argument(
+        "--mock-server",
+        action="store_true",
+        help="Point snippets at a local mock of the LangSmith API.",
+    )
+    parser.add_argument("--report", help="Write a JSON report to this path.")
+    args = parser.parse_args()
+
+    setup = extract_python_blocks.PYTHON_BOILERPLATE
+    start = time.perf_counter()
+    snippets = collect_snippets(
+        [Path(f).as_posix() for f in args.mdx_files] or discover_mdx_files(), setup
+    )
+    with contextlib.ExitStack() as stack:
+        env = None
+        if args.mock_server:
+            endpoint = stack.enter_context(mock_langsmith_server.serve())
+            env = {**os.environ, **mock_langsmith_server.client_env(endpoint)}
+        results = run_snippets(
+            snippets, setup, workers=args.workers, timeout=args.timeout, env=env
+        )
+
+    failures = [result for result in results if result.outcome != "passed"]
+    for result in failures:
+        print(f"{result.mdx_file}:{result.line} [{result.outcome}]", file=sys.stderr)
+        print(textwrap.indent(result.output.strip(), "    "), file=sys.stderr)
+    print(
+        f"{len(results) - len(failures)} passed, {len(failures)} failed "
+        f"in {time.perf_counter() - start:.2f}s"
+    )
+    if args.report:
+        with open(args.report, "w") as f:
+            json.dump(
+                [
+                    {**result._asdict(), **snippet._asdict()}
+                    for snippet, result in zip(snippets, results)
+                ],
+                f,
+                indent=2,
+            )
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,247 @@
+"""A pytest plugin that skips doc snippet tests that already passed.
+
+Every test is keyed on its normalized source, the module-level code around it
+(imports, boilerplate, fixtures), the versions of Python and of the
+distributions they import, always including langsmith, and the LangSmith
+endpoint it talks to, so that a pass against the mock server of
+mock_langsmith_server.py doesn't stand for one against the live API. A test that
+passed under an identical key is skipped with a cache hit, so a docs change only
+reruns the snippets it touched, and a langsmith release reruns them all:
+
+    pytest tests/py_unit_tests [--rerun-snippets] [--snippet-results PATH]
+
+Sources are compared as ASTs, so formatting, comments and test names don't
+matter: regenerating the tests after a block is inserted above others doesn't
+invalidate them. Only passes are recorded, in tests/.snippet-results.json;
+persist that file between CI jobs to share them. Passes expire after 30 days,
+so every snippet still runs against the live API now and then.
+"""
+import ast
+import functools
+import importlib.metadata
+import inspect
+import json
+import os
+import platform
+import textwrap
+import time
+from pathlib import Path
+from typing import Iterable, Optional, Union
+from urllib.parse import urlsplit
+
+import pytest
+
+from incremental import hash_bytes
+
+DEFAULT_RESULTS_PATH = Path(__file__).parents[1] / "tests/.snippet-results.json"
+# Always part of the key, as every snippet exercises it
+ALWAYS_VERSIONED = ("langsmith",)
+MAX_AGE = 30 * 24 * 3600
+# Read by the langsmith client in this order
+ENDPOINT_VARIABLES = ("LANGSMITH_ENDPOINT", "LANGCHAIN_ENDPOINT")
+DEFAULT_ENDPOINT = "https://api.smith.langchain.com"
+_LOOPBACK_HOSTS = ("127.0.0.1", "localhost", "::1")
+
+
+class SnippetResults:
+    """
+    A persistent record of the snippet keys whose tests passed.
+
+    Each key maps to the time it last passed. Saving merges with the file on
+    disk, so that parallel runs don't lose each other's passes.
+    """
+
+    VERSION = 1
+
+    def __init__(self, path: Union[str, Path]):
+        self.path = Path(path)
+        self.passes = self._load()
+        self.recorded = {}
+
+    def _load(self) -> dict:
+        try:
+            data = json.loads(self.path.read_text())
+        except (FileNotFoundError, ValueError):
+            return {}
+        return data.get("passes", {}) if data.get("version") == self.VERSION else {}
+
+    def passed(self, key: str) -> bool:
+        """Whether the key passed within the last MAX_AGE seconds."""
+        return time.time() - self.passes.get(key, 0) < MAX_AGE
+
+    def record(self, key: str) -> None:
+        self.passes[key] = self.recorded[key] = time.time()
+
+    def save(self) -> None:
+        if not self.recorded:
+            return
+        passes = {**self._load(), **self.recorded}
+        cutoff = time.time() - MAX_AGE
+        passes = {key: at for key, at in passes.items() if at >= cutoff}
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_name(f"{self.path.name}.{os.getpid()}.tmp")
+        tmp_path.write_text(
+            json.dumps({"version": self.VERSION, "passes": passes}, sort_keys=True)
+        )
+        os.replace(tmp_path, self.path)
+
+
+def _imported_modules(nodes: Iterable[ast.AST]) -> set:
+    modules = set()
+    for node in nodes:
+        for n in ast.walk(node):
+            if isinstance(n, ast.Import):
+                modules.update(alias.name.split(".")[0] for alias in n.names)
+            elif isinstance(n, ast.ImportFrom) and n.module and not n.level:
+                modules.add(n.module.split(".")[0])
+    return modules
+
+
+@functools.lru_cache(maxsize=None)
+def _distributions() -> dict:
+    return importlib.metadata.packages_distributions()
+
+
+@functools.lru_cache(maxsize=None)
+def _version(distribution: str) -> str:
+    try:
+        return importlib.metadata.version(distribution)
+    except importlib.metadata.PackageNotFoundError:
+        return "missing"
+
+
+def dependency_versions(modules: Iterable[str]) -> list:
+    """
+    Return the versions of the distributions providing modules, and of Python.
+
+    Modules of the standard library or of no distribution are left out; a
+    distribution that isn't installed is versioned "missing".
+    """
+    distributions = set(ALWAYS_VERSIONED)
+    for module in modules:
+        distributions.update(_distributions().get(module, ()))
+    versions = [f"python=={platform.python_version()}"]
+    versions.extend(f"{d}=={_version(d)}" for d in sorted(distributions))
+    return versions
+
+
+def snippet_endpoint() -> str:
+    """
+    Return the LangSmith endpoint the snippets run against, as part of their key.
+
+    The mock server listens on a free port, so the port of a loopback endpoint
+    is left out: passes against one mock server are valid for the next.
+    """
+    endpoint = next(
+        (os.environ[name] for name in ENDPOINT_VARIABLES if os.environ.get(name)),
+        DEFAULT_ENDPOINT,
+    )
+    url = urlsplit(endpoint.rstrip("/"))
+    if url.hostname in _LOOPBACK_HOSTS:
+        return f"{url.scheme}://{url.hostname}{url.path}"
+    return endpoint.rstrip("/")
+
+
+@functools.lru_cache(maxsize=None)
+def _module_context(path: str) -> tuple:
+    """The normalized module-level code of a test module, and the modules it imports."""
+    with open(path) as f:
+        tree = ast.parse(f.read())
+    context = [
+        node
+        for node in tree.body
+        if not (
+            isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef))
+            and node.name.startswith("test")
+        )
+    ]
+    return "\n".join(ast.dump(node) for node in context), _imported_modules(context)
+
+
+def snippet_key(item: pytest.Item) -> Optional[str]:
+    """
+    Return the cache key of a test, or None if its source can't be read.
+
+    :param item: A test function collected from a module
+    """
+    function = getattr(item, "function", None)
+    module = getattr(item, "module", None)
+    if function is None or module is None or getattr(item, "callspec", None):
+        return None
+    try:
+        node = ast.parse(textwrap.dedent(inspect.getsource(function))).body[0]
+        context, context_modules = _module_context(module.__file__)
+    except (OSError, TypeError, SyntaxError):
+        return None
+    # Tests are numbered in document order, so their names aren't part of the key.
+    node.name = ""
+    modules = context_modules | _imported_modules([node])
+    return hash_bytes(
+        ast.dump(node).encode(),
+        context.encode(),
+        "\n".join(dependency_versions(modules)).encode(),
+        snippet_endpoint().encode(),
+    )
+
+
+class SnippetResultsPlugin:
+    """Skips cached passes, and records new ones at the end of the session."""
+
+    def __init__(self, results: SnippetResults, rerun: bool):
+        self.results = results
+        self.rerun = rerun
+        self.keys = {}
+        self.hits = 0
+
+    @pytest.hookimpl(trylast=True)
+    def pytest_collection_modifyitems(self, items: list) -> None:
+        for item in items:
+            key = snippet_key(item)
+            if key is None:
+                continue
+            self.keys[item.nodeid] = key
+            if not self.rerun and self.results.passed(key):
+                self.hits += 1
+                item.add_marker(
+                    pytest.mark.skip(reason=f"snippet cache hit ({key[:12]})")
+                )
+
+    def pytest_runtest_logreport(self, report: pytest.TestReport) -> None:
+        key = self.keys.get(report.nodeid)
+        if key is not None and report.when == "call" and report.passed:
+            self.results.record(key)
+
+    def pytest_sessionfinish(self) -> None:
+        self.results.save()
+
+    def pytest_terminal_summary(self, terminalreporter) -> None:
+        if self.keys:
+            terminalreporter.write_line(
+                f"snippet results: {self.hits} cache hits, "
+                f"{len(self.keys) - self.hits} snippets run, "
+                f"{len(self.results.recorded)} new passes recorded in "
+                f"{self.results.path}"
+            )
+
+
+def pytest_addoption(parser: pytest.Parser) -> None:
+    group = parser.getgroup("snippet results")
+    group.addoption(
+        "--snippet-results",
+        default=str(DEFAULT_RESULTS_PATH),
+        help="Where passing snippet keys are recorded "
+        "(default: tests/.snippet-results.json).",
+    )
+    group.addoption(
+        "--rerun-snippets",
+        action="store_true",
+        help="Run every snippet, even the ones that passed under the same key.",
+    )
+
+
+def pytest_configure(config: pytest.Config) -> None:
+    results = SnippetResults(config.getoption("snippet_results"))
+    config.pluginmanager.register(
+        SnippetResultsPlugin(results, config.getoption("rerun_snippets")),
+        "snippet_results_plugin",
+    )
@@ -0,0 +1,278 @@
+"""Regenerate cookbook pages and snippet tests as the docs are edited.
+
+Polls docs/ and the cookbook checkout and, after each burst of saves:
+
+- regenerates the pytest module and Jest tests of every changed MDX file, and
+  removes the tests of deleted ones, like extract_doc_snippets.py
+- reconverts the changed notebooks and moves the changed pages and images to
+  the old docs, like `build_cookbook.py all`
+
+Both share the manifests of those scripts, so they can be run in between. The
+exporter, Black and the code block parsers stay loaded, so a change is usually
+handled in a fraction of a second:
+
+    python _scripts/watch_docs.py [--no-docs] [--no-cookbook] [build_cookbook options]
+
+Options it doesn't know, e.g. --placement or --output-store, are passed on to
+`build_cookbook.py all`.
+"""
+import argparse
+import os
+import sys
+import time
+from pathlib import Path
+from typing import Optional
+
+sys.path.insert(0, str(Path(__file__).parents[1] / "subdirectories" / "scripts"))
+
+import extract_doc_snippets  # noqa: E402
+from incremental import SnippetManifest  # noqa: E402
+
+COOKBOOK_SUFFIXES = (".ipynb", ".md", ".png", ".jpg", ".jpeg", ".gif", ".svg")
+
+
+class TreeWatcher:
+    """
+    Detects the files of a tree that were added, modified or deleted.
+
+    Files are compared by modification time and size between two calls of
+    `poll`, so no dependency or OS notification API is needed; listing the
+    docs tree takes a few milliseconds.
+    """
+
+    def __init__(self, root: str, suffixes: tuple):
+        self.root = root
+        self.suffixes = suffixes
+        self.files = self._scan()
+
+    def _scan(self) -> dict:
+        files = {}
+        for dirpath, dirnames, filenames in os.walk(self.root):
+            dirnames[:] = [d for d in dirnames if not d.startswith(".")]
+            for file in filenames:
+                if file.endswith(self.suffixes):
+                    path = os.path.join(dirpath, file)
+                    try:
+                        stat = os.stat(path)
+                    except FileNotFoundError:
+                        continue
+                    files[path] = (stat.st_mtime_ns, stat.st_size)
+        return files
+
+    def poll(self) -> dict:
+        """
+        Return the files that changed since the last call.
+
+        Returns:
+        - dict: Whether each changed file still exists, by path.
+        """
+        files = self._scan()
+        changes = {
+            path: True for path, stat in files.items() if self.files.get(path) != stat
+        }
+        changes.update((path, False) for path in self.files.keys() - files.keys())
+        self.files = files
+        return changes
+
+    def absorb(self, paths) -> None:
+        """Take the current state of files we wrote ourselves as unchanged."""
+        for path in paths:
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                self.files.pop(path, None)
+                continue
+            if path in self.files or path.endswith(self.suffixes):
+                self.files[path] = (stat.st_mtime_ns, stat.st_size)
+
+
+class SnippetHandler:
+    """Regenerates the tests of changed MDX files."""
+
+    def __init__(self):
+        self.manifest = SnippetManifest(
+            extract_doc_snippets.MANIFEST_PATH, extract_doc_snippets.manifest_hash()
+        )
+
+    def __call__(self, changes: dict) -> None:
+        docs_root = str(extract_doc_snippets.DOCS_ROOT)
+        changed = sorted(
+            Path(os.path.relpath(path, docs_root)).as_posix()
+            for path, exists in changes.items()
+            if exists
+        )
+        if len(changed) < len(changes):
+            for removed in self.manifest.prune(
+                extract_doc_snippets.discover_mdx_files()
+            ):
+                print(f"Removed {removed}")
+        results = extract_doc_snippets.extract_files(
+            changed, workers=1, manifest=self.manifest
+        )
+        self.manifest.save()
+        for result in results:
+            for diagnostic in result.diagnostics:
+                print(
+                    f"{result.mdx_file}:{diagnostic.line}: skipped, {diagnostic.message}",
+                    file=sys.stderr,
+                )
+            if result.error:
+                print(f"{result.mdx_file}: {result.error}", file=sys.stderr)
+            else:
+                print(
+                    f"{result.mdx_file}: {result.python_blocks} Python and "
+                    f"{result.typescript_blocks} TypeScript blocks"
+                )
+
+
+class CookbookHandler:
+    """Reconverts changed notebooks and moves the cookbook to the docs."""
+
+    def __init__(self, build_args: list):
+        # Imported here so that watching only docs/ starts quickly.
+        import build_cookbook
+        import notebook_export
+
+        self.build_cookbook = build_cookbook
+        self.args = build_cookbook.build_parser().parse_args(["all"] + build_args)
+        self.manifest = None
+        if not self.args.no_cache:
+            self.manifest = build_cookbook.BuildManifest(
+                self.args.cache, build_cookbook.build_config_hash()
+            )
+        if self.args.workers is None:
+            # Convert in this process, with its warm exporter.
+            self.args.workers = 1
+        # Create the exporter now rather than on the first change.
+        options = build_cookbook.conversion_options(self.args)
+        notebook_export.get_process_exporter(
+            options["black_cache"],
+            options["max_output_bytes"],
+            options["max_notebook_bytes"],
+        )
+
+    def __call__(self, changes: dict) -> list:
+        """Handle changes; return the files written under the cookbook."""
+        notebooks = [path for path in changes if path.endswith(".ipynb")]
+        # The pages and images of changed notebooks, before and after converting,
+        # are moved along with the changed files. Without a manifest, what
+        # conversions write isn't known, so everything is moved.
+        changed = None
+        if self.manifest is not None:
+            changed = list(changes) + self._converted(notebooks)
+        if notebooks:
+            self.build_cookbook.convert_command(self.args, self.manifest, notebooks)
+        if changed is not None:
+            changed += self._converted(notebooks)
+        self.build_cookbook.move_command(self.args, self.manifest, changed)
+        if self.manifest is not None:
+            self.manifest.save()
+            return [
+                output
+                for key in self.manifest.stages.get("convert", {})
+                for output in self.manifest.outputs("convert", key)
+            ]
+        return []
+
+    def _converted(self, notebooks: list) -> list:
+        return [
+            output
+            for notebook in notebooks
+            for output in self.manifest.outputs(
+                "convert", os.path.relpath(notebook, self.args.cookbook)
+            )
+        ]
+
+
+def watch(
+    watchers: list,
+    interval: float = 0.2,
+    debounce: float = 0.3,
+    max_events: Optional[int] = None,
+) -> None:
+    """
+    Call the handler of each watcher with its changes, once saves settle.
+
+    Args:
+    - watchers (list): (TreeWatcher, handler) pairs. A handler returns the
+      files it wrote under its tree, if any, so they don't trigger it again.
+    - interval (float): Seconds between polls.
+    - debounce (float): Seconds without changes after which a burst of saves is
+      handled.
+    - max_events (int, optional): Stop after handling this many bursts.
+    """
+    events = 0
+    while max_events is None or events < max_events:
+        time.sleep(interval)
+        pending = [watcher.poll() for watcher, _ in watchers]
+        if not any(pending):
+            continue
+        settled_at = time.monotonic() + debounce
+        while time.monotonic() < settled_at:
+            time.sleep(interval)
+            for changes, (watcher, _) in zip(pending, watchers):
+                more = watcher.poll()
+                if more:
+                    changes.update(more)
+                    settled_at = time.monotonic() + debounce
+        for changes, (watcher, handler) in zip(pending, watchers):
+            if not changes:
+                continue
+            start = time.perf_counter()
+            try:
+                written = handler(changes)
+            except Exception as e:
+                # Keep watching; the next save retries.
+                print(f"{watcher.root}: {type(e).__name__}: {e}", file=sys.stderr)
+                continue
+            watcher.absorb(written or [])
+            print(
+                f"Handled {len(changes)} changes under {watcher.root} in "
+                f"{time.perf_counter() - start:.2f}s"
+            )
+        events += 1
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--no-docs", action="store_true", help="Don't watch docs/.")
+    parser.add_argument(
+        "--no-cookbook", action="store_true", help="Don't watch the cookbook."
+    )
+    parser.add_argument(
+        "--interval", type=float, default=0.2, help="Seconds between polls."
+    )
+    parser.add_argument(
+        "--debounce",
+        type=float,
+        default=0.3,
+        help="Seconds without changes before a burst of saves is handled.",
+    )
+    args, build_args = parser.parse_known_args()
+
+    watchers = []
+    if not args.no_docs:
+        watchers.append(
+            (
+                TreeWatcher(str(extract_doc_snippets.DOCS_ROOT), (".mdx",)),
+                SnippetHandler(),
+            )
+        )
+    if not args.no_cookbook:
+        handler = CookbookHandler(build_args)
+        watchers.append(
+            (TreeWatcher(handler.args.cookbook, COOKBOOK_SUFFIXES), handler)
+        )
+    if not watchers:
+        parser.error("nothing to watch")
+    for watcher, _ in watchers:
+        print(f"Watching {watcher.root} ({len(watcher.files)} files)")
+    try:
+        watch(watchers, interval=args.interval, debounce=args.debounce)
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,261 @@
+import filecmp
+import hashlib
+import json
+import os
+import shutil
+from typing import Iterable, Optional, Union
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+# ioctl that clones a file's extents on copy-on-write filesystems (Btrfs, XFS).
+_FICLONE = 0x40049409
+PLACEMENT_MODES = ("copy", "reflink", "hardlink")
+
+
+def hash_bytes(*chunks: bytes) -> str:
+    """Return the sha256 hex digest of the given byte chunks."""
+    digest = hashlib.sha256()
+    for chunk in chunks:
+        digest.update(chunk)
+    return digest.hexdigest()
+
+
+def hash_file(path: str) -> str:
+    """Return the sha256 hex digest of a file's contents."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def write_if_changed(path: Union[str, os.PathLike], content: str) -> bool:
+    """
+    Write a text file only if its content would change.
+
+    Returns:
+    - bool: Whether the file was written.
+    """
+    data = content.encode("utf-8")
+    try:
+        with open(path, "rb") as f:
+            if f.read() == data:
+                return False
+    except FileNotFoundError:
+        pass
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+    return True
+
+
+def _reflink(src: str, dest: str) -> bool:
+    if fcntl is None:
+        return False
+    try:
+        with open(src, "rb") as src_file, open(dest, "wb") as dest_file:
+            fcntl.ioctl(dest_file.fileno(), _FICLONE, src_file.fileno())
+    except OSError:
+        os.remove(dest)
+        return False
+    shutil.copystat(src, dest)
+    return True
+
+
+def _hardlink(src: str, dest: str) -> bool:
+    try:
+        os.link(src, dest)
+    except OSError:
+        return False
+    return True
+
+
+def place_file(src: str, dest: str, mode: str = "copy") -> bool:
+    """
+    Make dest a copy of src, unless it already has the same content.
+
+    "reflink" clones the file on copy-on-write filesystems and "hardlink" links
+    dest to src; both fall back to a regular copy where the filesystem doesn't
+    support them, e.g. across devices. dest is always replaced rather than
+    written to, so a source linked from a previous build is never modified. An
+    up-to-date dest is kept when it is hard-linked to src in "hardlink" mode, or
+    isn't in the other modes, so switching modes replaces it.
+
+    Args:
+    - src (str): Path to the source file.
+    - dest (str): Path to the destination file.
+    - mode (str): One of PLACEMENT_MODES.
+
+    Returns:
+    - bool: Whether dest was written.
+    """
+    if os.path.exists(dest):
+        linked = os.path.samefile(src, dest)
+        if linked == (mode == "hardlink") and (
+            linked or filecmp.cmp(src, dest, shallow=False)
+        ):
+            return False
+    tmp_path = f"{dest}.tmp"
+    if os.path.lexists(tmp_path):
+        os.remove(tmp_path)
+    placed = (mode == "reflink" and _reflink(src, tmp_path)) or (
+        mode == "hardlink" and _hardlink(src, tmp_path)
+    )
+    if not placed:
+        shutil.copy2(src, tmp_path)
+    os.replace(tmp_path, dest)
+    return True
+
+
+class BuildManifest:
+    """
+    A persistent record of what each build stage produced from which inputs.
+
+    Entries are grouped by stage (e.g. "convert", "move"). Each entry stores the
+    content hash of its inputs, the hash of the build configuration it was built
+    with, and the output paths it wrote. An entry is fresh when both hashes match
+    and every output still exists on disk.
+    """
+
+    VERSION = 1
+
+    def __init__(self, path: str, config_hash: str):
+        self.path = path
+        self.config_hash = config_hash
+        self.stages = {}
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("version") == self.VERSION:
+                self.stages = data.get("stages", {})
+
+    def is_fresh(self, stage: str, key: str, content_hash: str) -> bool:
+        entry = self.stages.get(stage, {}).get(key)
+        return (
+            entry is not None
+            and entry["hash"] == content_hash
+            and entry["config"] == self.config_hash
+            and all(os.path.exists(output) for output in entry["outputs"])
+        )
+
+    def record(
+        self, stage: str, key: str, content_hash: str, outputs: Iterable[str]
+    ) -> None:
+        self.stages.setdefault(stage, {})[key] = {
+            "hash": content_hash,
+            "config": self.config_hash,
+            "outputs": sorted(str(output) for output in outputs),
+        }
+
+    def outputs(self, stage: str, key: str) -> list:
+        entry = self.stages.get(stage, {}).get(key)
+        return list(entry["outputs"]) if entry else []
+
+    def prune(self, stage: str, live_keys: Iterable[str]) -> list:
+        """
+        Forget entries whose source no longer exists and delete their outputs.
+
+        Returns:
+        - list: The output paths that were removed.
+        """
+        live_keys = set(live_keys)
+        entries = self.stages.get(stage, {})
+        live_outputs = {
+            output
+            for key, entry in entries.items()
+            if key in live_keys
+            for output in entry["outputs"]
+        }
+        removed = []
+        for key in sorted(set(entries) - live_keys):
+            for output in entries.pop(key)["outputs"]:
+                if output not in live_outputs and os.path.exists(output):
+                    os.remove(output)
+                    removed.append(output)
+        return removed
+
+    def save(self, path: Optional[str] = None) -> None:
+        path = path or self.path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(
+                {"version": self.VERSION, "stages": self.stages},
+                f,
+                indent=1,
+                sort_keys=True,
+            )
+        os.replace(tmp_path, path)
+
+
+class ContentCache:
+    """
+    A persistent key-value store with one file per entry, bounded in size.
+
+    Keys are hex digests; entries are spread over subdirectories named after the
+    first two characters of their key. Entries are written to a temporary file
+    and renamed into place, so concurrent processes can share a cache: a reader
+    sees either a whole entry or none. Reading an entry refreshes its mtime,
+    which `evict` uses to drop the least recently used entries first.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], key)
+
+    def get(self, key: str) -> Optional[bytes]:
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+            os.utime(path)
+        except FileNotFoundError:
+            # Missing, or evicted by another process in between.
+            return None
+        return data
+
+    def put(self, key: str, data: bytes) -> None:
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.tmp.{os.getpid()}"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    def evict(self, max_bytes: int) -> int:
+        """
+        Delete the least recently used entries until the cache fits in max_bytes.
+
+        Returns:
+        - int: The number of entries deleted.
+        """
+        entries = []
+        for dirpath, _, filenames in os.walk(self.directory):
+            for file in filenames:
+                if ".tmp." in file:
+                    continue
+                try:
+                    stat = os.stat(os.path.join(dirpath, file))
+                except FileNotFoundError:
+                    continue
+                entries.append(
+                    (stat.st_mtime, stat.st_size, os.path.join(dirpath, file))
+                )
+        size = sum(entry[1] for entry in entries)
+        removed = 0
+        for _, entry_size, path in sorted(entries):
+            if size <= max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            size -= entry_size
+            removed += 1
+        return removed
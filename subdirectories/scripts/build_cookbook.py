@@ -1,124 +1,33 @@
+"""Build the old cookbook docs from the langsmith-cookbook submodule.
+
+    python subdirectories/scripts/build_cookbook.py [convert|move|all] [options]
+
+`convert` turns the cookbook notebooks into Markdown next to them, `move`
+rewrites the Markdown pages and places them and their images in the versioned
+docs, and `all` (the default) does both. Only `convert` needs nbconvert, Black
+and BeautifulSoup, so they are imported lazily and `move` starts quickly.
+"""
+import argparse
 import os
 import re
+import sys
+from importlib import metadata
 from pathlib import Path
-from shutil import copy2
-
-import nbformat
-from bs4 import BeautifulSoup
-from nbconvert import MarkdownExporter
-from nbconvert.preprocessors import Preprocessor
-from traitlets.config import Config
-from tqdm import tqdm
-from black import format_str, Mode
-from html.parser import HTMLParser
-
-_REPO_ROOT = "https://github.com/langchain-ai/langsmith-cookbook"
-
-black_mode = Mode()
-
+from typing import Optional
 
-# Cell
-class HTMLdf(HTMLParser):
-    """HTML Parser that finds a dataframe."""
-
-    df = False
-    scoped = False
-
-    def handle_starttag(self, tag, attrs):
-        if tag == "style":
-            for k, v in attrs:
-                if k == "scoped":
-                    self.scoped = True
-
-    def handle_data(self, data):
-        if ".dataframe" in data and self.scoped:
-            self.df = True
-
-    def handle_endtag(self, tag):
-        if tag == "style":
-            self.scoped = False
-
-    @classmethod
-    def search(cls, x):
-        parser = cls()
-        parser.feed(x)
-        return parser.df
-
-class RemoveEmptyCellsPreprocessor(Preprocessor):
-    """
-    A custom preprocessor to remove empty cells from the notebook.
-    """
-    def preprocess(self, notebook, resources):
-        notebook.cells = [cell for cell in notebook.cells if cell.source.strip()]
-        return notebook, resources
-
-class Black(Preprocessor):
-    """Format code that has a cell tag `black`"""
-
-    def preprocess_cell(self, cell, resources, index):
-        tags = cell.metadata.get("tags", [])
-        if cell.cell_type == "code" and "black" in tags:
-            cell.source = format_str(src_contents=cell.source, mode=black_mode).strip()
-        return cell, resources
-
-
-def clean_markdown(markdown: str, all_attrs: bool = False) -> str:
-    soup = BeautifulSoup(markdown, "html.parser")
-    for table in soup.find_all("table"):
-        md_table = html_table_to_markdown(str(table))
-        markdown = flexible_table_replacement(markdown, md_table)
-    markdown = remove_dataframe_styles(markdown, all_attrs=all_attrs)
-    markdown = remove_stray_divs(markdown)
-    return markdown
-
-class EscapePreprocessor(Preprocessor):
-    def preprocess_cell(self, cell, resources, index):
-        if cell.cell_type == "code":
-            if "outputs" in cell:
-                filter_out = set()
-                for i, output in enumerate(cell["outputs"]):
-                    if output.get("data") and output["data"].get("text/html"):
-                        # Process this later in the html processor
-                        continue
-                    if "text" in output:
-                        if not output["text"].strip():
-                            filter_out.add(i)
-                            continue
-                        output["text"] = output["text"].replace("```", r"\`\`\`")
-                    elif "data" in output:
-                        for key, value in output["data"].items():
-                            if isinstance(value, str):
-                                output["data"][key] = value.replace("```", r"\`\`\`")
-                cell["outputs"] = [
-                    output
-                    for i, output in enumerate(cell["outputs"])
-                    if i not in filter_out
-                ]
-                
-        return cell, resources
-
-
-
-class HTMLEscape(Preprocessor):
-    """
-    Place HTML in a codeblock and surround it with a <HTMLOutputBlock> component.
-    """
+from build_cache import (
+    PLACEMENT_MODES,
+    BuildManifest,
+    hash_bytes,
+    hash_file,
+    place_file,
+    write_if_changed,
+)
 
-    def preprocess_cell(self, cell, resources, index):
-        if cell.cell_type == "code":
-            for o in cell.outputs:
-                if o.get("data") and o["data"].get("text/html"):
-                    cell.metadata.html_output = True
-                    html = o["data"]["text/html"]
-                    if HTMLdf.search(html):
-                        cell.metadata.html_center = False
-                        o["data"]["text/html"] = clean_markdown(html.strip())
-                    else:
-                        cell.metadata.html_center = True
-                        o["data"]["text/html"] = "```html\n" + html.strip() + "\n```"
-                        
-        return cell, resources
+sys.path.insert(0, str(Path(__file__).parents[2] / "_scripts"))
+from build_profiler import PROFILER, add_profiling_arguments, profiling  # noqa: E402
 
+_REPO_ROOT = "https://github.com/langchain-ai/langsmith-cookbook"
 
 def add_github_backlink(content: str) -> str:
     """Inserts the 'Open In GitHub' shield link into the content after the Collab link."""
@@ -139,224 +48,346 @@ def add_github_backlink(content: str) -> str:
     return new_content
 
 
-def get_mdx_exporter():
-    """A mdx notebook exporter which composes many pre-processors together."""
-    # TODO: Combine with other ad-hoc logic
-    c = Config()
-    pp = [Black, RemoveEmptyCellsPreprocessor, EscapePreprocessor, HTMLEscape]
-    c.MarkdownExporter.preprocessors = pp
-    return MarkdownExporter(config=c)
+# Names that moved to `notebook_export`. They can still be imported from here,
+# which imports nbconvert on first use.
+_NOTEBOOK_EXPORTS = (
+    "Black",
+    "EscapePreprocessor",
+    "HTMLEscape",
+    "HTMLdf",
+    "RemoveEmptyCellsPreprocessor",
+    "clean_markdown",
+    "convert_notebook",
+    "convert_notebooks_to_markdown",
+    "find_notebooks",
+    "get_mdx_exporter",
+    "html_table_to_markdown",
+    "remove_dataframe_styles",
+    "remove_stray_divs",
+)
+
+
+def __getattr__(name: str):
+    if name in _NOTEBOOK_EXPORTS:
+        import notebook_export
+
+        return getattr(notebook_export, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def _version(distribution: str) -> str:
+    try:
+        return metadata.version(distribution)
+    except metadata.PackageNotFoundError:
+        return ""
+
+
+def build_config_hash() -> str:
+    """Hash everything besides the sources that affects the build output."""
+    # Versions are read from the package metadata, so that `move` doesn't have
+    # to import nbconvert and Black.
+    scripts = []
+    for script in (__file__, Path(__file__).with_name("notebook_export.py")):
+        with open(script, "rb") as f:
+            scripts.append(f.read())
+    return hash_bytes(
+        *scripts, _version("nbconvert").encode(), _version("black").encode()
+    )
 
 
-def convert_notebooks_to_markdown(root_path: str) -> None:
-    """
-    Convert all Jupyter notebooks in the directory to Markdown and save images.
+def _escape_brackets(line: str) -> str:
+    # Note: escaping {} will break some rendering of pandas tables in our old
+    #      cookbooks. We should consider a more robust solution in the future.
+    #      However, this is a quick fix for now since cookbooks are marked as old
+    #      and we only leave them around as past reference.
+    return (
+        line.replace("<", "&lt;")
+        .replace(">", "&gt;")
+        .replace("{", "&#123;")
+        .replace("}", "&#125;")
+    )
 
-    Args:
-    - root_path (str): Path to the root directory containing the notebooks.
-    """
-    exporter = get_mdx_exporter()
 
-    # This function will be used to save the images
-    def output_post_save(md, resources, **kwargs):
-        for filename, data in resources.get("outputs", {}).items():
-            filepath = os.path.join(resources["metadata"]["path"], filename)
-            with open(filepath, "wb") as f:
-                f.write(data)
+def replace_brackets(content: str) -> str:
+    # Search through a conent string and parse <> to &lt; and &gt;
+    in_code_block = False
+    new_lines = []
+    for line in content.split("\n"):
+        if line.startswith("```"):
+            in_code_block = not in_code_block
+        if not in_code_block:
+            # TODO: Handle single backticks
+            line = _escape_brackets(line)
+        new_lines.append(line)
+    return "\n".join(new_lines) + "\n"
 
-    for dirpath, _, filenames in tqdm(os.walk(root_path)):
-        for file in filenames:
-            if file.endswith(".ipynb"):
-                file_path = os.path.join(dirpath, file)
-                with open(file_path, "r", encoding="utf-8") as notebook_file:
-                    notebook = nbformat.read(notebook_file, as_version=4)
-                    # The exporter's `from_notebook_node` function has a `resources` parameter.
-                    # We can use this to specify where and how to save images.
-                    resources = {
-                        "metadata": {"path": dirpath}  # Set the output path for images
-                    }
-                    markdown, resources = exporter.from_notebook_node(
-                        notebook, resources=resources
-                    )
-
-                    output_post_save(markdown, resources)
-
-                    md_file_path = os.path.join(dirpath, file.replace(".ipynb", ".md"))
-                    with open(md_file_path, "w", encoding="utf-8") as md_file:
-                        md_file.write(markdown)
-
-
-def flexible_table_replacement(markdown: str, table_str: str) -> str:
-    """
-    Replace the table in the markdown with the given table string using a more flexible matching.
 
-    Args:
-    - markdown (str): The original markdown content.
-    - table_str (str): The exact table string to replace with.
+_DEAD_README_PATTERN = re.compile(r"\((?!http:|https:).*?(/README\.md\))")
 
-    Returns:
-    - str: The markdown with the table replaced.
-    """
-    start_of_table = "<table"
-    end_of_table = "</table>"
-
-    start_index = markdown.find(start_of_table)
-    end_index = (
-        markdown.find(end_of_table, start_index) + len(end_of_table)
-        if start_index != -1
-        else -1
-    )
 
-    # If both start and end are found, replace
-    if start_index != -1 and end_index != -1:
-        return markdown[:start_index] + table_str + markdown[end_index:]
-    else:
-        return markdown
+def replace_dead_readme_links(content: str) -> str:
+    # The readmes are mapped to index.md which are mapped to the parent directory
+    # by docusaurus.
+    # The pattern checks that the link does not start with "http:" or "https:",
+    # and then replaces the ending "/README.md)"
+    return _DEAD_README_PATTERN.sub("(/)", content)
+
+
+_LINK_PATTERN = re.compile(r"\]\(([^)\n]*)\)")
+_RELATIVE_LINK_PATTERN = re.compile(r"\.{1,2}/[^)]+")
+_CODE_LINK_SUFFIXES = (".py", ".ts", ".txt", ".json")
+_DOC_LINK_SUFFIXES = (".md", ".ipynb")
+_HEADING_AMPERSAND_PATTERN = re.compile(r"^(#\s+.*?)&amp;")
+
+
+def _rewrite_link_target(target: str, rel_dir: str) -> str:
+    """Rewrite a link target from a cookbook page in `rel_dir` for the docs site."""
+    if _RELATIVE_LINK_PATTERN.fullmatch(target):
+        if target.startswith("../"):
+            # For sibling or parent directory links
+            path_parts = rel_dir.split(os.sep)
+            relative_parts = target.split("/")
+            while relative_parts and relative_parts[0] == "..":
+                relative_parts.pop(0)
+                path_parts.pop()
+            absolute_link = os.path.join(
+                "/old/cookbook", *path_parts, "/".join(relative_parts)
+            )
+        else:
+            # Convert the relative link to an absolute link
+            absolute_link = os.path.join("/old/cookbook", rel_dir, target)
+        # If it's an absolute static link, just retain the last static/file.png part
+        if "/static/" in absolute_link.replace("/./", "/"):
+            target = target.replace("/./", "/")
+        else:
+            target = absolute_link.replace("/./", "/")
+    if target.endswith(_CODE_LINK_SUFFIXES):
+        # Link code files to the cookbook repository on GitHub
+        target = (
+            os.path.join(_REPO_ROOT, "blob/main", rel_dir, target.lstrip("./"))
+            .replace("/./", "/")
+            .replace("/cookbook/", "/")
+        )
+    if target.endswith(_DOC_LINK_SUFFIXES) and not target.startswith("http"):
+        # Pages are served from their parent directory
+        target = os.path.normpath(os.path.dirname(target))
+    return target
 
 
-def remove_stray_divs(markdown: str) -> str:
+def rewrite_markdown(content: str, rel_dir: str) -> str:
     """
-    Remove stray and empty <div> tags from the markdown content.
+    Apply every link and escape rule for a cookbook page in a single pass.
+
+    The content is tokenized into lines once, tracking fenced code blocks and
+    multi-line HTML comments, and each line is rewritten in place:
+
+    - `img/` paths become `static/`
+    - relative links become absolute `/old/cookbook` links, links to code files
+      point at GitHub and links to .md/.ipynb files point at their directory
+    - comments at the start of a line are dropped, together with the blank lines
+      before them
+    - `&amp;` in headings becomes `&`
+    - `<`, `>`, `{` and `}` outside code fences are escaped
+    - links to READMEs that were not rewritten are replaced with `(/)`
+    - an "Open In GitHub" badge is added after the first "Open In Collab" badge
 
     Args:
-    - markdown (str): The original markdown content.
+    - content (str): The Markdown content of the page.
+    - rel_dir (str): The page's directory, relative to the cookbook root.
 
     Returns:
-    - str: The markdown without stray and empty <div> tags.
+    - str: The rewritten content.
     """
-    soup = BeautifulSoup(markdown, "html.parser")
+    source_lines = content.split("\n")
+    lines = []
+    # Blank lines are held back because a comment that follows them removes them.
+    blank_lines = []
+    # Once a comment is found without a closing `-->`, no later one can be closed.
+    find_comments = True
+    in_code_block = False
+    add_backlink = True
+
+    def rewrite_link(match):
+        return f"]({_rewrite_link_target(match.group(1), rel_dir)})"
+
+    def rewrite_links(line):
+        # The substring checks skip the regex machinery on most lines.
+        if "img/" in line:
+            line = line.replace("img/", "static/")
+        if "](" in line:
+            line = _LINK_PATTERN.sub(rewrite_link, line)
+        return line
+
+    index = 0
+    while index < len(source_lines):
+        line = rewrite_links(source_lines[index])
+        index += 1
+        if find_comments:
+            if not line.strip():
+                blank_lines.append(line)
+                continue
+            if line.lstrip().startswith("<!--"):
+                comment_line = line
+                comment_end = index - 1
+                end = line.find("-->", line.find("<!--") + 4)
+                while end == -1 and comment_end + 1 < len(source_lines):
+                    comment_end += 1
+                    line = rewrite_links(source_lines[comment_end])
+                    end = line.find("-->")
+                if end != -1:
+                    # Drop the comment; whatever follows it stays on its last line.
+                    index = comment_end + 1
+                    blank_lines = []
+                    line = line[end + 3 :]
+                else:
+                    find_comments = False
+                    line = comment_line
+            lines.extend(blank_lines)
+            blank_lines = []
+
+        if line.startswith("#"):
+            # Bad sidebar ampersands
+            line = _HEADING_AMPERSAND_PATTERN.sub(r"\1&", line, count=1)
+        elif line.startswith("```"):
+            in_code_block = not in_code_block
+        if not in_code_block:
+            line = _escape_brackets(line)
+        if "/README.md)" in line:
+            line = _DEAD_README_PATTERN.sub("(/)", line)
+        if add_backlink and "Open In Collab" in line:
+            new_line = add_github_backlink(line)
+            add_backlink = new_line == line
+            line = new_line
+        lines.append(line)
+    lines.extend(blank_lines)
+    return "\n".join(lines).strip()
 
-    # Remove empty <div> tags
-    for div in soup.find_all("div"):
-        if not div.contents or all(
-            isinstance(c, str) and not c.strip() for c in div.contents
-        ):
-            div.extract()
 
-    # Convert back to string and check for stray <div> tags
-    cleaned_content = str(soup)
-    cleaned_content = cleaned_content.replace("<div>", "").replace("</div>", "")
+_MOVED_SUFFIXES = (".md", ".png", ".jpg", ".jpeg", ".gif", ".svg")
 
-    return cleaned_content
 
+def _destination(src: str, root_path: str, destination_path: str) -> Optional[str]:
+    """Return where a cookbook file is moved to, or None if it isn't moved."""
+    if not src.endswith(_MOVED_SUFFIXES):
+        return None
+    dest = os.path.join(destination_path, "cookbook", os.path.relpath(src, root_path))
 
-def remove_dataframe_styles(markdown: str, all_attrs: bool = False) -> str:
-    """
-    Remove style blocks related to Pandas DataFrames from the markdown content.
+    # Adjust paths
+    if src.endswith((".png", ".jpg", ".jpeg", ".gif", ".svg")):
+        dest = dest.replace("img/", "static/")
+    if src.endswith(".md"):
+        # Make the name index.md
+        dest = os.path.join(os.path.dirname(dest), "index.md")
+    return dest
 
-    Args:
-    - markdown (str): The original markdown content.
 
-    Returns:
-    - str: The markdown without the DataFrame style blocks.
+def _plan_moves(root_path: str, destination_path: str) -> dict:
     """
-    soup = BeautifulSoup(markdown, "html.parser")
+    Map every destination file to the sources that are written to it.
 
-    # Find all <style> tags with the 'scoped' attribute (commonly used by Pandas DataFrame styles)
-    attrs = {"scoped": True} if not all_attrs else None
-    for style_tag in soup.find_all("style", attrs=attrs):
-        style_tag.extract()
-
-    return str(soup)
-
-
-def html_table_to_markdown(html_content: str) -> str:
+    READMEs and converted notebooks both become the `index.md` of their directory,
+    so several sources can share a destination. They are listed in walk order;
+    the last one written wins.
     """
-    Convert an HTML table into a Markdown table.
-
-    Args:
-    - html_content (str): The HTML content containing the table.
-
-    Returns:
-    - str: The Markdown representation of the table.
+    plan = {}
+    for dirpath, _, filenames in os.walk(root_path):
+        for file in filenames:
+            src = os.path.join(dirpath, file)
+            dest = _destination(src, root_path, destination_path)
+            if dest is not None:
+                plan.setdefault(dest, []).append((dirpath, src))
+    return plan
+
+
+def move_to_docs(
+    root_path: str,
+    destination_path: str,
+    manifest: Optional[BuildManifest] = None,
+    placement: str = "copy",
+    changed: Optional[list] = None,
+) -> None:
     """
-    soup = BeautifulSoup(html_content, "html.parser")
-    table = soup.find("table")
-
-    # If no table is found, return the original content
-    if not table:
-        return html_content
-
-    # Extracting headers
-    headers = [th.get_text().strip() for th in table.find_all("th")]
-    header_str = " | ".join(headers)
-
-    # Creating separator
-    separator = "--- | " * (len(headers) - 1) + "---"
-
-    # Extracting rows
-    rows = table.find_all("tr")[1:]  # excluding header
-    row_strs = []
-    for row in rows:
-        row_strs.append(
-            " | ".join([td.get_text().strip() for td in row.find_all("td")])
-        )
+    Move all markdown files and linked images to the docs folder.
 
-    # Combining everything
-    markdown_table = "\n".join([header_str, separator] + row_strs)
-    return markdown_table
+    Files are only written when their content changes.
 
-
-def replace_brackets(content: str) -> str:
-    # Search through a conent string and parse <> to &lt; and &gt;
-    in_code_block = False
-    new_content = ""
-    for line in content.split("\n"):
-        if line.startswith("```"):
-            in_code_block = not in_code_block
-        if not in_code_block:
-            # TODO: Handle single backticks
-            line = line.replace("<", "&lt;")
-            line = line.replace(">", "&gt;")
-            # Note: this will break some rendering of pandas tables in our old cookbooks. 
-            #      We should consider a more robust solution in the future. However,
-            #      this is a quick fix for now since cookbooks are marked as old and
-            #      we only leave them around as past reference. We want to fix our build,
-            line = line.replace("{", "&#123;")
-            line = line.replace("}", "&#125;")
-        new_content += line + "\n"
-    return new_content
-
-
-def replace_dead_readme_links(content: str) -> str:
-    # The readmes are mapped to index.md which are mapped to the parent directory
-    # by docusaurus.
-    # The pattern checks that the link does not start with "http:" or "https:",
-    # and then replaces the ending "/README.md)"
-    pattern = r"\((?!http:|https:).*?(/README\.md\))"
-    return re.sub(pattern, "(/)", content)
-
-def move_to_docs(root_path: str, destination_path: str) -> None:
-    """Move all markdown files and linked images to the docs folder."""
-    img_extensions = [".png", ".jpg", ".jpeg", ".gif", ".svg"]
-    for dirpath, _, filenames in tqdm(os.walk(root_path)):
-        for file in filenames:
-            if file.endswith(tuple([".md"] + img_extensions)):
-                src = os.path.join(dirpath, file)
-                dest = os.path.join(
-                    destination_path, "cookbook", os.path.relpath(src, root_path)
+    Args:
+    - root_path (str): Path to the cookbook root directory.
+    - destination_path (str): Path to the versioned docs directory.
+    - manifest (BuildManifest, optional): When given, destinations whose sources
+      are unchanged since the last build are skipped, and destinations whose
+      sources were deleted are removed.
+    - placement (str): How images are placed: "copy", or "reflink" or
+      "hardlink" to share their data with the sources where the filesystem
+      allows it.
+    - changed (list, optional): Only move the destinations of these sources,
+      e.g. the files that just changed or were deleted; the other sources
+      aren't read. Destinations whose sources were deleted are still removed
+      when a manifest is given.
+    """
+    from tqdm import tqdm
+
+    plan = _plan_moves(root_path, destination_path)
+    keys = {dest: os.path.relpath(dest, destination_path) for dest in plan}
+    if manifest is not None:
+        removed = manifest.prune("move", keys.values())
+        _remove_empty_parents(removed, destination_path)
+    if changed is not None:
+        affected = {_destination(src, root_path, destination_path) for src in changed}
+        plan = {dest: sources for dest, sources in plan.items() if dest in affected}
+    for dest, sources in tqdm(plan.items()):
+        if manifest is not None:
+            content_hash = hash_bytes(
+                *(
+                    f"{os.path.relpath(src, root_path)}:{hash_file(src)};".encode()
+                    for _, src in sources
                 )
-
-                # Adjust paths
-                if file.endswith((".png", ".jpg", ".jpeg", ".gif", ".svg")):
-                    dest = dest.replace("img/", "static/")
-                if file.endswith(".md"):
-                    # Make the name index.md
-                    dest = os.path.join(os.path.dirname(dest), "index.md")
-
-                os.makedirs(os.path.dirname(dest), exist_ok=True)
-                copy2(src, dest)
-
-                # Adjust content in Markdown files
-                if file.endswith(".md"):
-                    with open(dest, "r", encoding="utf-8") as md_file:
-                        content = md_file.read()
-
-                    # If the destination path is /cookbook/index.md, this is the "overview" page.
-                    # Insert metadata and an introduction.
-                    if dest.endswith("/cookbook/index.md"):
-                        title, rest = content.strip().split("\n", 1)
-                        content = f"""---
+            )
+            if not dest.endswith(".md"):
+                # Changing the placement places every image again.
+                content_hash += f":{placement}"
+            if manifest.is_fresh("move", keys[dest], content_hash):
+                continue
+        # Only the last source written to a destination matters.
+        dirpath, src = sources[-1]
+        with PROFILER.stage("move", file=src):
+            _move_file(src, dest, root_path, dirpath, placement)
+        if manifest is not None:
+            manifest.record("move", keys[dest], content_hash, [os.path.abspath(dest)])
+
+
+def _remove_empty_parents(paths: list, root_path: str) -> None:
+    """Remove the directories of deleted files that are left empty, up to root_path."""
+    root_path = os.path.abspath(root_path)
+    for path in paths:
+        directory = os.path.dirname(os.path.abspath(path))
+        while directory != root_path and directory.startswith(root_path + os.sep):
+            try:
+                os.rmdir(directory)
+            except OSError:
+                # Not empty, or already removed along with another file.
+                break
+            directory = os.path.dirname(directory)
+
+
+def _move_file(
+    src: str, dest: str, root_path: str, dirpath: str, placement: str = "copy"
+) -> None:
+    """Place a single source at its destination, adjusting Markdown content."""
+    os.makedirs(os.path.dirname(dest), exist_ok=True)
+    if not src.endswith(".md"):
+        place_file(src, dest, placement)
+        return
+
+    # Adjust content in Markdown files
+    with open(src, "r", encoding="utf-8") as md_file:
+        content = md_file.read()
+
+    # If the destination path is /cookbook/index.md, this is the "overview" page.
+    # Insert metadata and an introduction.
+    if dest.endswith("/cookbook/index.md"):
+        title, rest = content.strip().split("\n", 1)
+        content = f"""---
 sidebar_label: Overview
 sidebar_position: 1
 ---
@@ -370,93 +401,227 @@ We suggest running the code by forking or cloning the repository.
 ## Introduction
 {rest}
 """
-                    content = content.replace("img/", "static/")
-
-                    def replace_relative_link(match):
-                        # Extract the relative link from the match object (excluding './')
-                        match_group = match.group(1)
-
-                        if match_group.startswith("../"):
-                            # For sibling or parent directory links
-                            path_parts = os.path.relpath(dirpath, root_path).split(
-                                os.sep
-                            )
-                            relative_parts = match_group.split("/")
-                            while relative_parts and relative_parts[0] == "..":
-                                relative_parts.pop(0)
-                                path_parts.pop()
-                            relative_link = "/".join(relative_parts)
-                            absolute_link = os.path.join(
-                                "/old/cookbook", *path_parts, relative_link
-                            )
-                        else:
-                            # Convert the relative link to an absolute link
-                            absolute_link = os.path.join(
-                                "/old/cookbook",
-                                os.path.relpath(dirpath, root_path),
-                                match_group,
-                            )
-
-                        absolute_link = absolute_link.replace("/./", "/")
-                        # If it's an absolute static link, just retain the last static/file.png part
-                        if "/static/" in absolute_link:
-                            return f"]({match_group})".replace("/./", "/")
-                        return f"]({absolute_link})"
-
-                    relative_link_pattern = re.compile(r"\]\((\.{1,2}/[^\)]+)\)")
-                    content = relative_link_pattern.sub(replace_relative_link, content)
-
-                    # Replace links to .py files or .ts files with
-                    def replace_code_links(match):
-                        # Extract the relative link from the match object (excluding './')
-                        relative_link = match.group(1).lstrip("./")
-                        absolute_link = (
-                            os.path.join(
-                                _REPO_ROOT,
-                                "blob/main",
-                                os.path.relpath(dirpath, root_path),
-                                relative_link,
-                            )
-                            .replace("/./", "/")
-                            .replace("/cookbook/", "/")
-                        )
-                        return f"]({absolute_link})"
-
-                    code_link_pattern = re.compile(r"\]\(([^)]*\.(py|ts|txt|json))\)")
-                    content = code_link_pattern.sub(replace_code_links, content)
-
-                    def replace_md_ipynb_links(match):
-                        # Extract the relative link from the match object
-                        relative_link = match.group(1)
-                        if relative_link.startswith("http"):
-                            return match.group(0)
-                        parent_dir = os.path.normpath(os.path.dirname(relative_link))
-                        return f"]({parent_dir})"
-
-                    # Skip markdown comments (DOTALL so .*? matches across newlines)
-                    content = re.sub(r"^\s*<!--.*?-->", "", content, flags=re.MULTILINE | re.DOTALL)
-                    # Bad sidebar ampersands
-                    content = re.sub(
-                        r"(^#\s+.*?)(\&amp;)(.*?$)",
-                        r"\1&\3",
-                        content,
-                        flags=re.MULTILINE,
-                    )
-                    # Fix relative links to .md or .ipynb files
-                    md_ipynb_pattern = re.compile(r"\]\(([^)]*\.(md|ipynb))\)")
-                    content = md_ipynb_pattern.sub(replace_md_ipynb_links, content)
-                    content = replace_brackets(content)
-                    content = replace_dead_readme_links(content)
-                    content = add_github_backlink(content).strip()
-
-                    with open(dest, "w", encoding="utf-8") as md_file:
-                        md_file.write(content)
+    with PROFILER.stage("rewrite_markdown"):
+        content = rewrite_markdown(content, os.path.relpath(dirpath, root_path))
+    write_if_changed(dest, content)
 
 
-if __name__ == "__main__":
-    cookbook_directory = Path(__file__).parents[1] / "langsmith-cookbook"
-    convert_notebooks_to_markdown(cookbook_directory)
+COMMANDS = ("convert", "move", "all")
+
+
+def conversion_options(args: argparse.Namespace) -> dict:
+    """The keyword arguments of `convert_notebooks_to_markdown` for the CLI options."""
+    from notebook_export import (
+        DEFAULT_BLACK_CACHE_DIR,
+        DEFAULT_BLACK_CACHE_SIZE,
+        OUTPUT_STORE_DIR,
+    )
+
+    black_cache = None
+    if not args.no_black_cache:
+        black_cache = args.black_cache or DEFAULT_BLACK_CACHE_DIR
+    return {
+        "black_cache": black_cache,
+        "black_cache_size": (
+            args.black_cache_size * 1024 * 1024
+            if args.black_cache_size is not None
+            else DEFAULT_BLACK_CACHE_SIZE
+        ),
+        "output_store": (
+            os.path.join(args.cookbook, OUTPUT_STORE_DIR) if args.output_store else None
+        ),
+        "max_output_bytes": args.max_output_kb * 1024,
+        "max_notebook_bytes": args.max_notebook_kb * 1024,
+    }
+
+
+def convert_command(
+    args: argparse.Namespace,
+    manifest: Optional[BuildManifest],
+    notebooks: Optional[list] = None,
+) -> None:
+    """Run the `convert` command, optionally for some notebooks only."""
+    from notebook_export import convert_notebooks_to_markdown, format_budget_report
+
+    with PROFILER.stage("convert_notebooks_to_markdown"):
+        over_budget = convert_notebooks_to_markdown(
+            args.cookbook,
+            workers=args.workers,
+            manifest=manifest,
+            notebooks=notebooks,
+            **conversion_options(args),
+        )
+    if over_budget:
+        print(format_budget_report(over_budget))
+
+
+def move_command(
+    args: argparse.Namespace,
+    manifest: Optional[BuildManifest],
+    changed: Optional[list] = None,
+) -> None:
+    """Run the `move` command, optionally for some changed sources only."""
+    with PROFILER.stage("move_to_docs"):
+        move_to_docs(
+            args.cookbook,
+            args.docs,
+            manifest=manifest,
+            placement=args.placement,
+            changed=changed,
+        )
+    if args.optimize_assets:
+        from optimize_assets import format_report, optimize_assets
+
+        options = {"cache_dir": args.asset_cache} if args.asset_cache else {}
+        skipped = []
+        with PROFILER.stage("optimize_assets"):
+            report = optimize_assets(
+                os.path.join(args.docs, "cookbook"),
+                workers=args.workers,
+                skipped=skipped,
+                **options,
+            )
+        for path, error in skipped:
+            print(f"{path}: skipped, {error}", file=sys.stderr)
+        print(format_report(report))
+
+
+def build_parser() -> argparse.ArgumentParser:
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument(
+        "--cookbook",
+        default=str(Path(__file__).parents[1] / "langsmith-cookbook"),
+        help="Path of the cookbook checkout.",
+    )
     # NOTE: the cookbooks directory is only used in the old version of docs and should thus
     #       only build into this directory
-    docs_directory = Path(__file__).parents[2] / "versioned_docs" / "version-old"
-    move_to_docs(cookbook_directory, docs_directory)
+    common.add_argument(
+        "--docs",
+        default=str(Path(__file__).parents[2] / "versioned_docs" / "version-old"),
+        help="Path of the versioned docs the cookbook is moved to.",
+    )
+    common.add_argument(
+        "--workers",
+        type=int,
+        default=None,
+        help="Number of processes used to convert notebooks and optimize images "
+        "(default: CPU count).",
+    )
+    common.add_argument(
+        "--cache",
+        default=str(Path(__file__).parents[1] / ".cookbook-build-cache.json"),
+        help="Path of the incremental build manifest.",
+    )
+    common.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Rebuild everything, ignoring and not updating the build manifest.",
+    )
+    add_profiling_arguments(common)
+
+    convert_options = argparse.ArgumentParser(add_help=False)
+    convert_options.add_argument(
+        "--black-cache",
+        default=None,
+        help="Directory of the persistent Black formatting cache "
+        "(default: subdirectories/.black-cache).",
+    )
+    convert_options.add_argument(
+        "--black-cache-size",
+        type=int,
+        default=None,
+        metavar="MB",
+        help="Size the Black cache is trimmed to after each build (default: 32).",
+    )
+    convert_options.add_argument(
+        "--no-black-cache",
+        action="store_true",
+        help="Format every tagged cell, without reading or writing the cache.",
+    )
+    convert_options.add_argument(
+        "--output-store",
+        action="store_true",
+        help="Write each distinct notebook image once, to static/nb-outputs in "
+        "the cookbook, and link the pages to it instead of to copies next to "
+        "their notebook.",
+    )
+
+    convert_options.add_argument(
+        "--max-output-kb",
+        type=int,
+        default=0,
+        help="Truncate or downsample outputs larger than this, e.g. 256 "
+        "(default: 0, no limit).",
+    )
+    convert_options.add_argument(
+        "--max-notebook-kb",
+        type=int,
+        default=0,
+        help="Omit the outputs of a notebook past this total, e.g. 4096 "
+        "(default: 0, no limit).",
+    )
+
+    move_options = argparse.ArgumentParser(add_help=False)
+    move_options.add_argument(
+        "--placement",
+        choices=PLACEMENT_MODES,
+        default="copy",
+        help="How images are placed in the docs: reflinks and hard links share "
+        "data with the sources and fall back to copies (default: copy).",
+    )
+    move_options.add_argument(
+        "--optimize-assets",
+        action="store_true",
+        help="Losslessly optimize the copied images and write WebP variants.",
+    )
+    move_options.add_argument(
+        "--asset-cache",
+        default=None,
+        help="Directory of the content-addressed image optimization cache "
+        "(default: subdirectories/.asset-cache).",
+    )
+
+    parser = argparse.ArgumentParser(
+        description=__doc__.splitlines()[0],
+        epilog="Without a command, `all` is run.",
+    )
+    commands = parser.add_subparsers(dest="command", metavar="command")
+    commands.add_parser(
+        "convert",
+        parents=[common, convert_options],
+        help="Convert the notebooks to Markdown.",
+    )
+    commands.add_parser(
+        "move",
+        parents=[common, move_options],
+        help="Move the Markdown pages and images to the docs.",
+    )
+    commands.add_parser(
+        "all",
+        parents=[common, convert_options, move_options],
+        help="Convert, then move.",
+    )
+    return parser
+
+
+def main(argv: Optional[list] = None) -> None:
+    argv = sys.argv[1:] if argv is None else list(argv)
+    if not argv or (argv[0] not in COMMANDS and argv[0] not in ("-h", "--help")):
+        # Keep plain `build_cookbook.py [options]` building everything.
+        argv = ["all"] + argv
+    args = build_parser().parse_args(argv)
+
+    manifest = None if args.no_cache else BuildManifest(args.cache, build_config_hash())
+    with profiling(args):
+        try:
+            if args.command in ("convert", "all"):
+                convert_command(args, manifest)
+            if args.command in ("move", "all"):
+                move_command(args, manifest)
+        finally:
+            if manifest is not None:
+                manifest.save()
+
+
+if __name__ == "__main__":
+    main()
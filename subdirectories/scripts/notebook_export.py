@@ -0,0 +1,843 @@
+"""Convert the cookbook notebooks to Markdown.
+
+This module holds everything that needs nbconvert, nbformat, Black and
+BeautifulSoup, which take most of a second to import. `build_cookbook` only
+imports it for the `convert` and `all` commands, so moving pages to the docs
+doesn't pay for it.
+"""
+import base64
+import functools
+import io
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from html.parser import HTMLParser
+from pathlib import Path
+from typing import NamedTuple, Optional
+
+import nbformat
+from black import Mode, format_str
+from black import __version__ as black_version
+from bs4 import BeautifulSoup, NavigableString, Tag
+from nbconvert import MarkdownExporter
+from nbconvert.filters import path2url
+from nbconvert.preprocessors import Preprocessor
+from PIL import Image
+from tqdm import tqdm
+from traitlets import Integer, Unicode
+from traitlets.config import Config
+
+from build_cache import BuildManifest, ContentCache, hash_bytes, hash_file
+
+sys.path.insert(0, str(Path(__file__).parents[2] / "_scripts"))
+from build_profiler import (  # noqa: E402
+    PROFILER,
+    init_worker,
+    profiled_map,
+    worker_args,
+)
+
+black_mode = Mode()
+
+DEFAULT_BLACK_CACHE_DIR = str(Path(__file__).parents[1] / ".black-cache")
+DEFAULT_BLACK_CACHE_SIZE = 32 * 1024 * 1024
+# Where `output_store` mode keeps images, relative to the cookbook root. Paths
+# containing `/static/` stay relative when the pages are moved to the docs.
+OUTPUT_STORE_DIR = os.path.join("static", "nb-outputs")
+
+
+# Cell
+class HTMLdf(HTMLParser):
+    """HTML Parser that finds a dataframe."""
+
+    df = False
+    scoped = False
+
+    def handle_starttag(self, tag, attrs):
+        if tag == "style":
+            for k, v in attrs:
+                if k == "scoped":
+                    self.scoped = True
+
+    def handle_data(self, data):
+        if ".dataframe" in data and self.scoped:
+            self.df = True
+
+    def handle_endtag(self, tag):
+        if tag == "style":
+            self.scoped = False
+
+    @classmethod
+    def search(cls, x):
+        parser = cls()
+        parser.feed(x)
+        return parser.df
+
+class ProfiledPreprocessor(Preprocessor):
+    """A preprocessor whose runs are recorded as a `preprocess:<class>` stage."""
+
+    def __call__(self, nb, resources):
+        with PROFILER.stage(f"preprocess:{type(self).__name__}"):
+            return super().__call__(nb, resources)
+
+class RemoveEmptyCellsPreprocessor(ProfiledPreprocessor):
+    """
+    A custom preprocessor to remove empty cells from the notebook.
+    """
+    def preprocess(self, notebook, resources):
+        notebook.cells = [cell for cell in notebook.cells if cell.source.strip()]
+        return notebook, resources
+
+class Black(ProfiledPreprocessor):
+    """
+    Format code that has a cell tag `black`
+
+    With `cache_dir` set, formatted cells are memoized on disk, keyed on their
+    source, the Black version and the mode, so unchanged cells aren't formatted
+    again by later builds or by other workers.
+    """
+
+    cache_dir = Unicode(
+        "", help="Directory of the persistent formatting cache (default: none)."
+    ).tag(config=True)
+
+    def preprocess_cell(self, cell, resources, index):
+        tags = cell.metadata.get("tags", [])
+        if cell.cell_type == "code" and "black" in tags:
+            cell.source = self.format(cell.source)
+        return cell, resources
+
+    def format(self, source: str) -> str:
+        if not self.cache_dir:
+            return _format_code(source)
+        cache = ContentCache(self.cache_dir)
+        key = hash_bytes(
+            black_version.encode(), repr(black_mode).encode(), source.encode()
+        )
+        cached = cache.get(key)
+        if cached is not None:
+            return cached.decode("utf-8")
+        formatted = _format_code(source)
+        cache.put(key, formatted.encode("utf-8"))
+        return formatted
+
+
+def _format_code(source: str) -> str:
+    with PROFILER.stage("black"):
+        return format_str(src_contents=source, mode=black_mode).strip()
+
+
+def clean_markdown(markdown: str, all_attrs: bool = False) -> str:
+    """
+    Convert HTML tables to Markdown and strip DataFrame styling and empty divs.
+
+    The HTML is parsed once and every transformation is applied to that tree.
+
+    Args:
+    - markdown (str): The HTML (or Markdown with embedded HTML) to clean.
+    - all_attrs (bool): Remove every <style> block, not only scoped ones.
+
+    Returns:
+    - str: The cleaned content.
+    """
+    soup = BeautifulSoup(markdown, "html.parser")
+    for table in soup.find_all("table"):
+        # Nested tables are rendered as part of their outermost table.
+        if table.find_parent("table") is None:
+            table.replace_with(NavigableString(_table_to_markdown(table)))
+    _remove_style_tags(soup, all_attrs=all_attrs)
+    _remove_empty_divs(soup)
+    return _strip_div_tags(str(soup))
+
+class EscapePreprocessor(ProfiledPreprocessor):
+    def preprocess_cell(self, cell, resources, index):
+        if cell.cell_type == "code":
+            if "outputs" in cell:
+                filter_out = set()
+                for i, output in enumerate(cell["outputs"]):
+                    if output.get("data") and output["data"].get("text/html"):
+                        # Process this later in the html processor
+                        continue
+                    if "text" in output:
+                        if not output["text"].strip():
+                            filter_out.add(i)
+                            continue
+                        output["text"] = output["text"].replace("```", r"\`\`\`")
+                    elif "data" in output:
+                        for key, value in output["data"].items():
+                            if isinstance(value, str):
+                                output["data"][key] = value.replace("```", r"\`\`\`")
+                cell["outputs"] = [
+                    output
+                    for i, output in enumerate(cell["outputs"])
+                    if i not in filter_out
+                ]
+                
+        return cell, resources
+
+
+
+class HTMLEscape(ProfiledPreprocessor):
+    """
+    Place HTML in a codeblock and surround it with a <HTMLOutputBlock> component.
+    """
+
+    def preprocess_cell(self, cell, resources, index):
+        if cell.cell_type == "code":
+            for o in cell.outputs:
+                if o.get("data") and o["data"].get("text/html"):
+                    cell.metadata.html_output = True
+                    html = o["data"]["text/html"]
+                    if HTMLdf.search(html):
+                        cell.metadata.html_center = False
+                        with PROFILER.stage("clean_markdown"):
+                            o["data"]["text/html"] = clean_markdown(html.strip())
+                    else:
+                        cell.metadata.html_center = True
+                        o["data"]["text/html"] = "```html\n" + html.strip() + "\n```"
+                        
+        return cell, resources
+
+
+class BudgetEntry(NamedTuple):
+    """An output that was cut down to fit the output budget."""
+
+    cell: int
+    output: int
+    mime_type: str
+    size: int
+    new_size: int
+    # What was done, e.g. "truncated 9,500 rows"
+    action: str
+
+
+def _size(value) -> int:
+    if isinstance(value, list):
+        return sum(_size(item) for item in value)
+    return len(value.encode("utf-8")) if isinstance(value, str) else 0
+
+
+def _output_size(output) -> int:
+    size = _size(output.get("text", "")) + _size(output.get("traceback", []))
+    return size + sum(_size(value) for value in output.get("data", {}).values())
+
+
+def _marker(message: str) -> str:
+    return f"[... {message} by the docs build ...]"
+
+
+def _truncate_text(text: str, budget: int) -> tuple:
+    """Keep the first and last lines of a text that fit in budget bytes."""
+    lines = text.splitlines(keepends=True)
+    head, tail = [], []
+    size = 0
+    # Three quarters of the budget for the head, the rest for the tail.
+    for line in lines:
+        if size + _size(line) > budget * 3 // 4:
+            break
+        head.append(line)
+        size += _size(line)
+    for line in reversed(lines[len(head) :]):
+        if size + _size(line) > budget:
+            break
+        tail.insert(0, line)
+        size += _size(line)
+    omitted = len(lines) - len(head) - len(tail)
+    if not head and not tail:
+        # A single huge line; a character takes up to 4 bytes.
+        return (
+            text[: budget // 4] + "\n" + _marker("line truncated"),
+            "truncated a line",
+        )
+    if head and not head[-1].endswith("\n"):
+        head[-1] += "\n"
+    text = "".join(head) + _marker(f"{omitted:,} lines omitted") + "\n" + "".join(tail)
+    return text, f"truncated {omitted:,} lines"
+
+
+def _truncate_dataframe(html: str, budget: int) -> Optional[tuple]:
+    """Keep the first rows of a DataFrame table that fit in budget bytes."""
+    soup = BeautifulSoup(html, "html.parser")
+    table = soup.find("table")
+    if table is None:
+        return None
+    rows = table.find_all("tr")[1:]
+    size = _size(html)
+    omitted = 0
+    while rows and size > budget:
+        row = rows.pop()
+        size -= _size(str(row))
+        row.extract()
+        omitted += 1
+    if size > budget:
+        return None
+    table.insert_after(NavigableString("\n\n" + _marker(f"{omitted:,} rows omitted")))
+    return str(soup), f"truncated {omitted:,} rows"
+
+
+def _downsample_image(data: str, budget: int) -> Optional[tuple]:
+    """Scale a base64 PNG or JPEG down until it fits in budget bytes."""
+    with Image.open(io.BytesIO(base64.b64decode(data))) as image:
+        image.load()
+        size = _size(data)
+        width, height = image.size
+        scaled = image
+        for _ in range(4):
+            # The encoded size is roughly proportional to the pixel count.
+            factor = (budget / size) ** 0.5 * 0.9
+            scaled = scaled.resize(
+                (
+                    max(1, int(scaled.width * factor)),
+                    max(1, int(scaled.height * factor)),
+                ),
+                Image.LANCZOS,
+            )
+            out = io.BytesIO()
+            if image.format == "JPEG":
+                scaled.save(out, "JPEG", quality=85)
+            else:
+                scaled.save(out, "PNG", optimize=True)
+            encoded = base64.b64encode(out.getvalue()).decode("ascii")
+            size = _size(encoded)
+            if size <= budget:
+                return encoded, (
+                    f"downsampled from {width}x{height} to {scaled.width}x{scaled.height}"
+                )
+    return None
+
+
+def _note_output(message: str):
+    return nbformat.v4.new_output("stream", name="stdout", text=_marker(message) + "\n")
+
+
+class OutputBudgetPreprocessor(ProfiledPreprocessor):
+    """
+    Cut down outputs that would bloat the generated pages.
+
+    Every representation of an output is limited to `max_output_bytes`: text
+    keeps its first and last lines, DataFrame tables their first rows, and PNG
+    and JPEG images are downsampled; images Pillow can't read are kept as they
+    are. Outputs that can't be cut down, and every output past
+    `max_notebook_bytes` for the whole notebook, are replaced by a note. Each change is noted on the page and listed in
+    `resources["output_budget"]` as a BudgetEntry.
+    """
+
+    max_output_bytes = Integer(
+        0, help="Size limit of each output representation (0: no limit)."
+    ).tag(config=True)
+    max_notebook_bytes = Integer(
+        0, help="Size limit of all outputs of a notebook (0: no limit)."
+    ).tag(config=True)
+
+    def preprocess(self, nb, resources):
+        entries = resources.setdefault("output_budget", [])
+        if not self.max_output_bytes and not self.max_notebook_bytes:
+            return nb, resources
+        used = 0
+        for cell_index, cell in enumerate(nb.cells):
+            if cell.cell_type != "code":
+                continue
+            outputs = []
+            for output_index, output in enumerate(cell.outputs):
+                fitted = [output]
+                if (
+                    self.max_output_bytes
+                    and _output_size(output) > self.max_output_bytes
+                ):
+                    fitted, notes = self._fit_output(output, resources)
+                    entries.extend(
+                        BudgetEntry(cell_index, output_index, *note) for note in notes
+                    )
+                size = sum(_output_size(o) for o in fitted)
+                if self.max_notebook_bytes and used + size > self.max_notebook_bytes:
+                    for o in fitted:
+                        _drop_extracted(o, resources)
+                    fitted = [_note_output("output omitted to fit the notebook budget")]
+                    entries.append(
+                        BudgetEntry(
+                            cell_index,
+                            output_index,
+                            "*",
+                            size,
+                            0,
+                            "omitted over the notebook budget",
+                        )
+                    )
+                    size = 0
+                used += size
+                outputs.extend(fitted)
+            cell.outputs = outputs
+        return nb, resources
+
+    def _fit_output(self, output, resources) -> tuple:
+        """
+        Cut an output down to the budget.
+
+        Returns:
+        - tuple: The outputs replacing it, and a (mime type, size, new size,
+          action) tuple for each representation that was cut down.
+        """
+        budget = self.max_output_bytes
+        notes = []
+        if _size(output.get("text", "")) > budget:
+            size = _size(output["text"])
+            output["text"], action = _truncate_text(output["text"], budget)
+            notes.append((output["name"], size, _size(output["text"]), action))
+        image_notes = []
+        for mime_type, value in list(output.get("data", {}).items()):
+            size = _size(value)
+            if size <= budget:
+                continue
+            if mime_type in ("image/png", "image/jpeg"):
+                try:
+                    result = _downsample_image(value, budget)
+                except (OSError, ValueError, Image.DecompressionBombError):
+                    # Pillow can't read it: the page gets the output as it is.
+                    notes.append((mime_type, size, size, "unreadable, kept"))
+                    continue
+            elif mime_type == "text/html" and HTMLdf.search(value):
+                result = _truncate_dataframe(value, budget)
+            elif mime_type.startswith("text/"):
+                result = _truncate_text(value, budget)
+            else:
+                result = None
+            if result is None:
+                _drop_extracted(output, resources)
+                message = f"{mime_type} output of {_format_kb(size)} omitted"
+                return [_note_output(message)], notes + [
+                    (mime_type, size, 0, "omitted")
+                ]
+            output["data"][mime_type], action = result
+            notes.append((mime_type, size, _size(output["data"][mime_type]), action))
+            if mime_type.startswith("image/"):
+                image_notes.append(_note_output(f"image {action}"))
+                # nbconvert already extracted the original image.
+                filenames = output.get("metadata", {}).get("filenames", {})
+                if filenames.get(mime_type) in resources.get("outputs", {}):
+                    resources["outputs"][filenames[mime_type]] = base64.b64decode(
+                        output["data"][mime_type]
+                    )
+        return [output] + image_notes, notes
+
+
+def _drop_extracted(output, resources) -> None:
+    """Forget the files nbconvert extracted from an output that is dropped."""
+    for filename in output.get("metadata", {}).get("filenames", {}).values():
+        resources.get("outputs", {}).pop(filename, None)
+
+
+def _format_kb(size: int) -> str:
+    return f"{size / 1024:,.0f} KB"
+
+
+def format_budget_report(entries: dict) -> str:
+    """
+    Render the outputs cut down by OutputBudgetPreprocessor, largest first.
+
+    Args:
+    - entries (dict): BudgetEntry lists by notebook path.
+    """
+    rows = sorted(
+        (
+            (entry.size, notebook, entry)
+            for notebook, notebook_entries in entries.items()
+            for entry in notebook_entries
+        ),
+        key=lambda row: (-row[0], row[1], row[2].cell, row[2].output),
+    )
+    lines = [f"{len(rows)} outputs over budget:"]
+    for _, notebook, entry in rows:
+        lines.append(
+            f"  {notebook} cell {entry.cell} output {entry.output} ({entry.mime_type}):"
+            f" {_format_kb(entry.size)} -> {_format_kb(entry.new_size)}, {entry.action}"
+        )
+    return "\n".join(lines)
+
+
+def get_mdx_exporter(
+    black_cache: Optional[str] = None,
+    max_output_bytes: int = 0,
+    max_notebook_bytes: int = 0,
+):
+    """A mdx notebook exporter which composes many pre-processors together."""
+    # TODO: Combine with other ad-hoc logic
+    c = Config()
+    pp = [
+        Black,
+        RemoveEmptyCellsPreprocessor,
+        OutputBudgetPreprocessor,
+        EscapePreprocessor,
+        HTMLEscape,
+    ]
+    c.MarkdownExporter.preprocessors = pp
+    if black_cache:
+        c.Black.cache_dir = black_cache
+    c.OutputBudgetPreprocessor.max_output_bytes = max_output_bytes
+    c.OutputBudgetPreprocessor.max_notebook_bytes = max_notebook_bytes
+    return MarkdownExporter(config=c)
+
+
+_EXPORTERS = {}
+
+
+def get_process_exporter(*options):
+    """Return the exporter for the current process, creating it on first use."""
+    if options not in _EXPORTERS:
+        _EXPORTERS[options] = get_mdx_exporter(*options)
+    return _EXPORTERS[options]
+
+
+def find_notebooks(root_path: str) -> list:
+    """
+    Find all Jupyter notebooks under the root directory.
+
+    Args:
+    - root_path (str): Path to the root directory containing the notebooks.
+
+    Returns:
+    - list: Sorted notebook paths, so that conversion order is deterministic.
+    """
+    notebooks = []
+    for dirpath, _, filenames in os.walk(root_path):
+        for file in filenames:
+            if file.endswith(".ipynb"):
+                notebooks.append(os.path.join(dirpath, file))
+    return sorted(notebooks)
+
+
+def convert_notebook(
+    file_path: str,
+    black_cache: Optional[str] = None,
+    max_output_bytes: int = 0,
+    max_notebook_bytes: int = 0,
+) -> tuple:
+    """
+    Convert a single notebook to Markdown without writing anything to disk.
+
+    Args:
+    - file_path (str): Path to the notebook.
+    - black_cache (str, optional): Directory of the Black formatting cache.
+    - max_output_bytes (int): Size limit of each output representation
+      (0: no limit).
+    - max_notebook_bytes (int): Size limit of all outputs (0: no limit).
+
+    Returns:
+    - tuple: The Markdown file path, the Markdown content, the extracted
+      outputs (a mapping of image file name to bytes) and the BudgetEntry list
+      of the outputs that were cut down.
+    """
+    with PROFILER.stage("convert", file=file_path):
+        return _convert_notebook(
+            file_path, black_cache, max_output_bytes, max_notebook_bytes
+        )
+
+
+def _convert_notebook(file_path: str, *options) -> tuple:
+    dirpath = os.path.dirname(file_path)
+    with PROFILER.stage("read"):
+        with open(file_path, "r", encoding="utf-8") as notebook_file:
+            notebook = nbformat.read(notebook_file, as_version=4)
+    # The exporter's `from_notebook_node` function has a `resources` parameter.
+    # We can use this to specify where and how to save images.
+    resources = {"metadata": {"path": dirpath}}  # Set the output path for images
+    with PROFILER.stage("export"):
+        markdown, resources = get_process_exporter(*options).from_notebook_node(
+            notebook, resources=resources
+        )
+    md_file_path = os.path.join(
+        dirpath, os.path.basename(file_path).replace(".ipynb", ".md")
+    )
+    return (
+        md_file_path,
+        markdown,
+        dict(resources.get("outputs", {})),
+        resources["output_budget"],
+    )
+
+
+def convert_notebooks_to_markdown(
+    root_path: str,
+    workers: Optional[int] = None,
+    manifest: Optional[BuildManifest] = None,
+    black_cache: Optional[str] = None,
+    black_cache_size: int = DEFAULT_BLACK_CACHE_SIZE,
+    output_store: Optional[str] = None,
+    max_output_bytes: int = 0,
+    max_notebook_bytes: int = 0,
+    notebooks: Optional[list] = None,
+) -> dict:
+    """
+    Convert all Jupyter notebooks in the directory to Markdown and save images.
+
+    Notebooks are converted concurrently in a process pool. Results are written
+    by the parent process in sorted notebook order, so the output does not depend
+    on which worker finishes first.
+
+    Args:
+    - root_path (str): Path to the root directory containing the notebooks.
+    - workers (int, optional): Number of worker processes. Defaults to the
+      number of CPUs; 1 converts serially in the current process.
+    - manifest (BuildManifest, optional): When given, notebooks whose content is
+      unchanged since the last build are skipped, and the outputs of deleted
+      notebooks are removed.
+    - black_cache (str, optional): Directory of a formatting cache shared by the
+      workers, so cells formatted by an earlier build aren't formatted again.
+    - black_cache_size (int): Size in bytes the formatting cache is trimmed to
+      after the conversion, dropping the least recently used cells first.
+    - output_store (str, optional): When given, images are written once per
+      distinct content to this directory instead of next to their notebook,
+      and the Markdown links point there. Images no notebook links to anymore
+      are removed from it.
+    - max_output_bytes (int): Size limit of each output representation; larger
+      outputs are truncated or downsampled (0: no limit).
+    - max_notebook_bytes (int): Size limit of the outputs of each notebook;
+      outputs past it are omitted (0: no limit).
+    - notebooks (list, optional): Only convert these notebooks under root_path,
+      e.g. the ones that just changed. Outputs of deleted notebooks are still
+      removed when a manifest is given.
+
+    Returns:
+    - dict: The BudgetEntry list of each converted notebook with outputs over
+      budget.
+    """
+    all_notebooks = find_notebooks(root_path)
+    if notebooks is None:
+        notebooks = all_notebooks
+    else:
+        selected = {os.path.abspath(notebook) for notebook in notebooks}
+        notebooks = [n for n in all_notebooks if os.path.abspath(n) in selected]
+    keys = {notebook: os.path.relpath(notebook, root_path) for notebook in notebooks}
+    hashes = {}
+    if manifest is not None:
+        manifest.prune(
+            "convert",
+            [os.path.relpath(notebook, root_path) for notebook in all_notebooks],
+        )
+        # Changing how outputs are written converts every notebook again.
+        mode = f":{os.path.relpath(output_store, root_path)}" if output_store else ""
+        if max_output_bytes or max_notebook_bytes:
+            mode += f":{max_output_bytes}:{max_notebook_bytes}"
+        hashes = {notebook: hash_file(notebook) + mode for notebook in notebooks}
+        notebooks = [
+            notebook
+            for notebook in notebooks
+            if not manifest.is_fresh("convert", keys[notebook], hashes[notebook])
+        ]
+    if workers is None:
+        workers = os.cpu_count() or 1
+    workers = max(1, min(workers, len(notebooks)))
+
+    # This function will be used to save the images
+    def output_post_save(md_file_path, outputs):
+        written = []
+        for filename, data in outputs.items():
+            filepath = os.path.join(os.path.dirname(md_file_path), filename)
+            with open(filepath, "wb") as f:
+                f.write(data)
+            written.append(filepath)
+        return written
+
+    convert = functools.partial(
+        convert_notebook,
+        black_cache=black_cache,
+        max_output_bytes=max_output_bytes,
+        max_notebook_bytes=max_notebook_bytes,
+    )
+    if workers == 1:
+        results = map(convert, notebooks)
+        executor = None
+    else:
+        executor = ProcessPoolExecutor(
+            max_workers=workers, initializer=init_worker, initargs=worker_args()
+        )
+        # `map` yields results in submission order regardless of completion order.
+        results = profiled_map(executor, convert, notebooks)
+    stored = set()
+    over_budget = {}
+    try:
+        for notebook, (md_file_path, markdown, outputs, budget_entries) in zip(
+            notebooks, tqdm(results, total=len(notebooks))
+        ):
+            if budget_entries:
+                over_budget[notebook] = budget_entries
+            with PROFILER.stage("write", file=notebook):
+                if output_store is None:
+                    written = output_post_save(md_file_path, outputs)
+                else:
+                    markdown, written = store_outputs(
+                        output_store, md_file_path, markdown, outputs
+                    )
+                with open(md_file_path, "w", encoding="utf-8") as md_file:
+                    md_file.write(markdown)
+            written = [os.path.abspath(path) for path in [md_file_path] + written]
+            stored.update(written[1:])
+            if manifest is not None:
+                _remove_replaced_outputs(
+                    manifest.outputs("convert", keys[notebook]), written, output_store
+                )
+                manifest.record("convert", keys[notebook], hashes[notebook], written)
+    finally:
+        if executor is not None:
+            executor.shutdown()
+        if black_cache:
+            ContentCache(black_cache).evict(black_cache_size)
+    if output_store is not None:
+        if manifest is not None:
+            # Notebooks that weren't converted still link to earlier images.
+            stored = {
+                output
+                for key in manifest.stages.get("convert", {})
+                for output in manifest.outputs("convert", key)
+            }
+            _remove_unlinked_outputs(output_store, stored)
+        elif notebooks == all_notebooks:
+            _remove_unlinked_outputs(output_store, stored)
+    return over_budget
+
+
+def store_outputs(
+    store_dir: str, md_file_path: str, markdown: str, outputs: dict
+) -> tuple:
+    """
+    Write a notebook's extracted outputs to a content-addressed directory.
+
+    Each output is stored as `<sha256><extension>`, so an image shared by several
+    notebooks is only written, and shipped, once. The Markdown's image links are
+    rewritten to point at the stored files, relative to the Markdown file.
+
+    Args:
+    - store_dir (str): The content-addressed directory.
+    - md_file_path (str): Path of the Markdown file the links are relative to.
+    - markdown (str): The exported Markdown.
+    - outputs (dict): A mapping of output file name to bytes.
+
+    Returns:
+    - tuple: The rewritten Markdown and the paths of the stored outputs.
+    """
+    stored = []
+    for filename, data in outputs.items():
+        blob = os.path.join(
+            store_dir, hash_bytes(data) + os.path.splitext(filename)[1].lower()
+        )
+        if not os.path.exists(blob):
+            os.makedirs(store_dir, exist_ok=True)
+            tmp_path = f"{blob}.tmp.{os.getpid()}"
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, blob)
+        link = Path(os.path.relpath(blob, os.path.dirname(md_file_path))).as_posix()
+        markdown = markdown.replace(f"]({path2url(filename)})", f"]({link})")
+        stored.append(blob)
+    return markdown, stored
+
+
+def _remove_replaced_outputs(
+    previous: list, written: list, output_store: Optional[str]
+) -> None:
+    """Delete outputs of a notebook's previous conversion that weren't rewritten."""
+    store = os.path.abspath(output_store) + os.sep if output_store else None
+    for output in set(previous) - set(written):
+        # Stored outputs may be shared; they are removed once nothing links them.
+        if store and output.startswith(store):
+            continue
+        if os.path.exists(output):
+            os.remove(output)
+
+
+def _remove_unlinked_outputs(store_dir: str, live: set) -> None:
+    if not os.path.isdir(store_dir):
+        return
+    for file in os.listdir(store_dir):
+        path = os.path.abspath(os.path.join(store_dir, file))
+        if path not in live:
+            os.remove(path)
+
+
+def remove_stray_divs(markdown: str) -> str:
+    """
+    Remove stray and empty <div> tags from the markdown content.
+
+    Args:
+    - markdown (str): The original markdown content.
+
+    Returns:
+    - str: The markdown without stray and empty <div> tags.
+    """
+    soup = BeautifulSoup(markdown, "html.parser")
+    _remove_empty_divs(soup)
+    return _strip_div_tags(str(soup))
+
+
+def remove_dataframe_styles(markdown: str, all_attrs: bool = False) -> str:
+    """
+    Remove style blocks related to Pandas DataFrames from the markdown content.
+
+    Args:
+    - markdown (str): The original markdown content.
+
+    Returns:
+    - str: The markdown without the DataFrame style blocks.
+    """
+    soup = BeautifulSoup(markdown, "html.parser")
+    _remove_style_tags(soup, all_attrs=all_attrs)
+    return str(soup)
+
+
+def html_table_to_markdown(html_content: str) -> str:
+    """
+    Convert an HTML table into a Markdown table.
+
+    Args:
+    - html_content (str): The HTML content containing the table.
+
+    Returns:
+    - str: The Markdown representation of the table.
+    """
+    soup = BeautifulSoup(html_content, "html.parser")
+    table = soup.find("table")
+
+    # If no table is found, return the original content
+    if not table:
+        return html_content
+    return _table_to_markdown(table)
+
+
+def _table_to_markdown(table: Tag) -> str:
+    """Convert a parsed <table> element into a Markdown table."""
+    # Extracting headers
+    headers = [th.get_text().strip() for th in table.find_all("th")]
+    header_str = " | ".join(headers)
+
+    # Creating separator
+    separator = "--- | " * (len(headers) - 1) + "---"
+
+    # Extracting rows
+    rows = table.find_all("tr")[1:]  # excluding header
+    row_strs = []
+    for row in rows:
+        row_strs.append(
+            " | ".join([td.get_text().strip() for td in row.find_all("td")])
+        )
+
+    # Combining everything
+    markdown_table = "\n".join([header_str, separator] + row_strs)
+    return markdown_table
+
+
+def _remove_style_tags(soup: BeautifulSoup, all_attrs: bool = False) -> None:
+    # Find all <style> tags with the 'scoped' attribute (commonly used by Pandas DataFrame styles)
+    attrs = {"scoped": True} if not all_attrs else None
+    for style_tag in soup.find_all("style", attrs=attrs):
+        style_tag.extract()
+
+
+def _remove_empty_divs(soup: BeautifulSoup) -> None:
+    for div in soup.find_all("div"):
+        if not div.contents or all(
+            isinstance(c, str) and not c.strip() for c in div.contents
+        ):
+            div.extract()
+
+
+def _strip_div_tags(content: str) -> str:
+    return content.replace("<div>", "").replace("</div>", "")
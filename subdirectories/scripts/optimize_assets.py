@@ -0,0 +1,350 @@
+"""Losslessly optimize the raster images of a docs tree.
+
+PNGs are recompressed at maximum zlib effort and replaced when that makes them
+smaller. Every PNG, GIF and JPEG also gets a lossless WebP variant next to it
+(`image.png.webp`) when the variant is smaller than the image. Pixels never
+change: a recompressed PNG is decoded and compared with the original before it
+is kept, and images whose colors WebP or Pillow's PNG encoder can't reproduce
+exactly are left alone. Images Pillow can't read are skipped and reported.
+
+Results are cached by content hash, so each distinct image is only processed
+once across trees and builds. Unchanged images are never rewritten.
+
+    python subdirectories/scripts/optimize_assets.py docs [--workers N] [--dry-run]
+"""
+import argparse
+import functools
+import io
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import NamedTuple, Optional
+
+import PIL
+from PIL import Image, features
+
+from build_cache import BuildManifest, hash_bytes, hash_file, place_file
+
+RASTER_EXTENSIONS = (".png", ".gif", ".jpg", ".jpeg")
+VARIANT_SUFFIX = ".webp"
+DEFAULT_CACHE_DIR = str(Path(__file__).parents[1] / ".asset-cache")
+
+# Ancillary PNG chunks that change how an image renders, kept on recompression.
+_PNG_RENDERING_INFO = ("transparency", "icc_profile", "dpi")
+# Color chunks (gAMA, sRGB, cHRM) Pillow doesn't write: PNGs with them are kept.
+_PNG_COLOR_INFO = ("gamma", "srgb", "chromaticity")
+# Color chunks WebP has no equivalent for; sRGB is what it assumes anyway.
+_WEBP_UNSUPPORTED_INFO = ("gamma", "chromaticity")
+# Modes WebP stores without converting the pixels, e.g. CMYK or 16-bit ones.
+_WEBP_MODES = ("1", "L", "LA", "P", "PA", "RGB", "RGBA")
+# What Pillow raises for images it can't read or encode
+_IMAGE_ERRORS = (OSError, ValueError, Image.DecompressionBombError)
+
+
+class DirectoryReport(NamedTuple):
+    """What optimizing the images of one directory saved."""
+
+    images: int = 0
+    original_bytes: int = 0
+    # Saved by recompressing images in place
+    recompressed_bytes_saved: int = 0
+    # Saved for clients served the WebP variants instead
+    variant_bytes_saved: int = 0
+
+
+def optimizer_config_hash() -> str:
+    """Hash the optimizer and Pillow version, so changing either reprocesses images."""
+    with open(__file__, "rb") as f:
+        return hash_bytes(f.read(), PIL.__version__.encode())
+
+
+def find_images(root_path: str) -> list:
+    """Return the sorted paths of the raster images under a directory."""
+    return sorted(
+        os.path.join(dirpath, file)
+        for dirpath, _, filenames in os.walk(root_path)
+        for file in filenames
+        if file.lower().endswith(RASTER_EXTENSIONS)
+    )
+
+
+def _same_pixels(image: Image.Image, data: bytes) -> bool:
+    with Image.open(io.BytesIO(data)) as other:
+        return image.mode == other.mode and image.tobytes() == other.tobytes()
+
+
+def _recompress_png(image: Image.Image, data: bytes) -> Optional[bytes]:
+    if getattr(image, "n_frames", 1) > 1:
+        # Animated PNGs would lose their frames.
+        return None
+    if any(key in image.info for key in _PNG_COLOR_INFO):
+        return None
+    out = io.BytesIO()
+    params = {key: image.info[key] for key in _PNG_RENDERING_INFO if key in image.info}
+    image.save(out, "PNG", optimize=True, **params)
+    optimized = out.getvalue()
+    if len(optimized) >= len(data) or not _same_pixels(image, optimized):
+        return None
+    return optimized
+
+
+def _webp_variant(image: Image.Image, size: int) -> Optional[bytes]:
+    if image.mode not in _WEBP_MODES or any(
+        key in image.info for key in _WEBP_UNSUPPORTED_INFO
+    ):
+        return None
+    out = io.BytesIO()
+    animated = getattr(image, "n_frames", 1) > 1
+    # For lossless WebP, quality is the compression effort. The maximum effort
+    # is ~20x slower for ~2% smaller files.
+    image.save(
+        out,
+        "WEBP",
+        lossless=True,
+        quality=80,
+        method=4,
+        save_all=animated,
+        icc_profile=image.info.get("icc_profile"),
+    )
+    variant = out.getvalue()
+    return variant if len(variant) < size else None
+
+
+def optimize_image(path: str, variants: bool = True) -> tuple:
+    """
+    Compute the optimized forms of an image without touching it.
+
+    Args:
+    - path (str): Path to the image.
+    - variants (bool): Whether to compute a WebP variant.
+
+    Returns:
+    - tuple: The recompressed image and the WebP variant, as bytes, each None
+      when it wouldn't be smaller.
+    """
+    with open(path, "rb") as f:
+        data = f.read()
+    with Image.open(io.BytesIO(data)) as image:
+        image.load()
+        optimized = None
+        if image.format == "PNG":
+            optimized = _recompress_png(image, data)
+        variant = None
+        if variants:
+            image.seek(0)
+            variant = _webp_variant(image, len(optimized or data))
+    return optimized, variant
+
+
+def _store_blob(cache_dir: str, data: bytes, ext: str) -> str:
+    """Write bytes to the cache under their content hash and return the path."""
+    blob = os.path.abspath(os.path.join(cache_dir, f"{hash_bytes(data)}{ext}"))
+    if not os.path.exists(blob):
+        tmp_path = f"{blob}.tmp.{os.getpid()}"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, blob)
+    return blob
+
+
+def _optimize_or_skip(path: str, variants: bool) -> tuple:
+    """Like `optimize_image`, plus the error of an image Pillow can't process."""
+    try:
+        return (*optimize_image(path, variants), None)
+    except _IMAGE_ERRORS as e:
+        return None, None, f"{type(e).__name__}: {e}"
+
+
+def _process_misses(paths: list, variants: bool, workers: Optional[int]) -> list:
+    if not paths:
+        return []
+    optimize = functools.partial(_optimize_or_skip, variants=variants)
+    workers = max(1, min(workers or os.cpu_count() or 1, len(paths)))
+    if workers == 1:
+        return [optimize(path) for path in paths]
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(optimize, paths))
+
+
+def optimize_assets(
+    root_path: str,
+    cache_dir: str = DEFAULT_CACHE_DIR,
+    workers: Optional[int] = None,
+    variants: bool = True,
+    dry_run: bool = False,
+    skipped: Optional[list] = None,
+) -> dict:
+    """
+    Optimize every raster image under a directory in place.
+
+    Args:
+    - root_path (str): Directory to optimize.
+    - cache_dir (str): Where optimized images and the cache index are stored.
+    - workers (int, optional): Number of processes optimizing images
+      (default: CPU count).
+    - variants (bool): Whether to write WebP variants next to the images.
+    - dry_run (bool): Only report what would be saved; the tree is left untouched.
+    - skipped (list, optional): Images Pillow can't read or encode are left as
+      they are and appended here as (path, error). They are tried again on the
+      next run.
+
+    Returns:
+    - dict: A DirectoryReport per directory, relative to root_path.
+    """
+    variants = variants and features.check("webp")
+    os.makedirs(cache_dir, exist_ok=True)
+    manifest = BuildManifest(
+        os.path.join(cache_dir, "index.json"),
+        optimizer_config_hash() + (":variants" if variants else ""),
+    )
+    images = find_images(root_path)
+    hashes = {path: hash_file(path) for path in images}
+    sources = {}
+    for path, content_hash in hashes.items():
+        if not manifest.is_fresh("images", content_hash, content_hash):
+            sources.setdefault(content_hash, path)
+
+    results = _process_misses(list(sources.values()), variants, workers)
+    for (content_hash, path), (optimized, variant, error) in zip(
+        sources.items(), results
+    ):
+        if error is not None:
+            if skipped is not None:
+                skipped.append((path, error))
+            continue
+        ext = os.path.splitext(path)[1].lower()
+        variant_outputs = (
+            [_store_blob(cache_dir, variant, VARIANT_SUFFIX)] if variant else []
+        )
+        if optimized is None:
+            manifest.record("images", content_hash, content_hash, variant_outputs)
+            continue
+        blob = _store_blob(cache_dir, optimized, ext)
+        manifest.record("images", content_hash, content_hash, [blob, *variant_outputs])
+        # The optimized image is already as small as it gets.
+        optimized_hash = hash_bytes(optimized)
+        manifest.record("images", optimized_hash, optimized_hash, variant_outputs)
+
+    report = {}
+    placed_variants = []
+    for path in images:
+        outputs = manifest.outputs("images", hashes[path])
+        blob = next((o for o in outputs if not o.endswith(VARIANT_SUFFIX)), None)
+        variant = next((o for o in outputs if o.endswith(VARIANT_SUFFIX)), None)
+        size = os.path.getsize(path)
+        final_size = os.path.getsize(blob) if blob else size
+        variant_size = os.path.getsize(variant) if variant else final_size
+        if not dry_run:
+            if blob:
+                place_file(blob, path, "reflink")
+            if variant:
+                place_file(variant, path + VARIANT_SUFFIX, "reflink")
+                key = os.path.abspath(path)
+                manifest.record("variants", key, hashes[path], [key + VARIANT_SUFFIX])
+                placed_variants.append(key)
+        directory = os.path.relpath(os.path.dirname(path), root_path)
+        entry = report.get(directory, DirectoryReport())
+        report[directory] = DirectoryReport(
+            entry.images + 1,
+            entry.original_bytes + size,
+            entry.recompressed_bytes_saved + size - final_size,
+            entry.variant_bytes_saved + final_size - variant_size,
+        )
+    if not dry_run:
+        _remove_stale_variants(manifest, root_path, placed_variants)
+    manifest.save()
+    return report
+
+
+def _remove_stale_variants(
+    manifest: BuildManifest, root_path: str, placed_variants: list
+) -> None:
+    """
+    Delete the WebP variants a previous run wrote under root_path and this one didn't.
+
+    Only variants recorded in the manifest are deleted, so WebP files added by
+    hand next to images are kept.
+
+    Args:
+    - manifest (BuildManifest): The manifest the variants were recorded in.
+    - root_path (str): Directory that was optimized.
+    - placed_variants (list): Absolute paths of the images given a variant.
+    """
+    root_path = os.path.abspath(root_path)
+    # The cache is shared between trees: keep what was recorded for other roots.
+    live = [
+        key
+        for key in manifest.stages.get("variants", {})
+        if os.path.commonpath([key, root_path]) != root_path
+    ]
+    manifest.prune("variants", live + placed_variants)
+
+
+def format_report(report: dict) -> str:
+    """Render a per-directory report, largest savings first."""
+    rows = sorted(
+        report.items(),
+        key=lambda item: (
+            -(item[1].recompressed_bytes_saved + item[1].variant_bytes_saved),
+            item[0],
+        ),
+    )
+    total = DirectoryReport(*map(sum, zip(DirectoryReport(), *report.values())))
+    lines = [
+        f"{'directory':<60} {'images':>6} {'original':>10}"
+        f" {'recompressed':>13} {'webp':>10}"
+    ]
+    for directory, entry in rows + [("total", total)]:
+        lines.append(
+            f"{directory:<60} {entry.images:>6} {_format_size(entry.original_bytes):>10}"
+            f" {'-' + _format_size(entry.recompressed_bytes_saved):>13}"
+            f" {'-' + _format_size(entry.variant_bytes_saved):>10}"
+        )
+    return "\n".join(lines)
+
+
+def _format_size(size: float) -> str:
+    if abs(size) < 1024:
+        return f"{size:.0f} B"
+    if abs(size) < 1024 * 1024:
+        return f"{size / 1024:.1f} KB"
+    return f"{size / 1024 / 1024:.1f} MB"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("root", help="Directory whose images are optimized.")
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=None,
+        help="Number of processes optimizing images (default: CPU count).",
+    )
+    parser.add_argument(
+        "--cache-dir",
+        default=DEFAULT_CACHE_DIR,
+        help="Directory of the content-addressed cache.",
+    )
+    parser.add_argument(
+        "--no-variants", action="store_true", help="Don't write WebP variants."
+    )
+    parser.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="Report the savings without changing any file under root.",
+    )
+    args = parser.parse_args()
+
+    skipped = []
+    report = optimize_assets(
+        args.root,
+        cache_dir=args.cache_dir,
+        workers=args.workers,
+        variants=not args.no_variants,
+        dry_run=args.dry_run,
+        skipped=skipped,
+    )
+    for path, error in skipped:
+        print(f"{path}: skipped, {error}", file=sys.stderr)
+    print(format_report(report))
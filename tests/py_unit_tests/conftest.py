@@ -0,0 +1,7 @@
+"""Skip doc snippets that already passed; see _scripts/snippet_results.py."""
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parents[2] / "_scripts"))
+
+from snippet_results import pytest_addoption, pytest_configure  # noqa: E402,F401
@@ -1,279 +1,81 @@
+"""Generated from docs/evaluation/index.mdx by _scripts/extract_python_eval_qs.py."""
 import pytest
-dataset_name = "Rap Battle Dataset"
 
-def test_code_block_0():
-    import openai
-    from langsmith.wrappers import wrap_openai
-    
-    openai_client = wrap_openai(openai.Client())
-    
-    # You evaluate any arbitrary function over the dataset.
-    # The input to the function will be the inputs dictionary for each example.
-    def predict(inputs: dict) -> dict:
-        messages = [{"role": "user", "content": inputs["question"]}]
-        response = openai_client.chat.completions.create(messages=messages, model="gpt-4o-mini")
-        return {"output": response}
-    from langsmith.schemas import Run, Example
-    
-    from langsmith.evaluation import evaluate, LangChainStringEvaluator
-    
-    def must_mention(run: Run, example: Example) -> dict:
-        prediction = run.outputs.get("output") or ""
-        required = example.outputs.get("must_mention") or []
-        score = all(phrase in prediction for phrase in required)
-        return {"key":"must_mention", "score": score}
-    
-    evaluators = [
-      must_mention,
-      LangChainStringEvaluator(
-        "criteria",
-        config={"criteria":  "harmfulness"}
-      ),
-      LangChainStringEvaluator(
-        "criteria",
-        config={
-          "criteria": {
-            "cliche": "Are the lyrics cliche?"
-            " Respond Y if they are, N if they're entirely unique."
-          }
-        },
-      ),
-    ]
-    
-    experiment_results = evaluate(
-        predict,
-        data=dataset_name,
-        evaluators=evaluators,
-        experiment_prefix="custom-rap-generator",
-        # Any experiment metadata can be specified here
-        metadata={
-          "version": "1.0.0",
-          "variant": "custom-function",
-        },
-    )
 
+@pytest.fixture(scope="session")
+def tutorial_setup():
+    """The steps shared by every variant, run once per session."""
+    from langsmith import Client
 
-def test_code_block_1():
-    from langchain_core.output_parsers import StrOutputParser
-    from langchain_core.prompts import ChatPromptTemplate
-    from langchain_openai import ChatOpenAI
-    
-    llm = ChatOpenAI(model="gpt-4o-mini", temperature=0)
-    prompt = ChatPromptTemplate.from_messages([("human", "Spit some bars about {question}.")])
-    chain = prompt | llm | StrOutputParser()
-    def predict(inputs: dict) -> dict:
-        return {"output": chain.invoke(inputs)}
-    from langsmith.schemas import Run, Example
-    
-    from langsmith.evaluation import evaluate, LangChainStringEvaluator
-    
-    def must_mention(run: Run, example: Example) -> dict:
-        prediction = run.outputs.get("output") or ""
-        required = example.outputs.get("must_mention") or []
-        score = all(phrase in prediction for phrase in required)
-        return {"key":"must_mention", "score": score}
-    
-    evaluators = [
-      must_mention,
-      LangChainStringEvaluator(
-        "criteria",
-        config={"criteria":  "harmfulness"}
-      ),
-      LangChainStringEvaluator(
-        "criteria",
-        config={
-          "criteria": {
-            "cliche": "Are the lyrics cliche?"
-            " Respond Y if they are, N if they're entirely unique."
-          }
-        },
-      ),
-    ]
-    
-    experiment_results = evaluate(
-        predict,
-        data=dataset_name,
-        evaluators=evaluators,
-        experiment_prefix="runnable-rap-generator",
-        # Any experiment metadata can be specified here
-        metadata={
-          "version": "1.0.0",
-          "variant": "runnable",
-        },
-    )
-
+    client = Client()
 
-def test_code_block_2():
-    from langchain.agents import AgentExecutor, create_openai_functions_agent
-    from langchain_core.prompts import ChatPromptTemplate
-    from langchain_core.tools import tool
-    from langchain_openai import ChatOpenAI
-    
-    prompt = ChatPromptTemplate.from_messages(
-        [
-            ("system", "Spit some bars about the topic\
-    \
-    {agent_scratchpad}"),
-            ("user", "{question}"),
-        ]
+    # Programmatically create a dataset in LangSmith
+    # For other dataset creation methods, see:
+    # https://docs.smith.langchain.com/evaluation/how_to_guides/manage_datasets_programmatically
+    # https://docs.smith.langchain.com/evaluation/how_to_guides/manage_datasets_in_application
+    dataset = client.create_dataset(
+        dataset_name="Sample dataset", description="A sample dataset in LangSmith."
     )
-    
-    @tool
-    def get_encouragement(request: str) -> str:
-        """Get some encouragement."""
-        return "You can do it!"
-    
-    tools = [get_encouragement]
-    llm = ChatOpenAI(model="gpt-4o-mini")
-    
-    def predict(inputs: dict) -> dict:
-        agent = create_openai_functions_agent(
-            llm,
-            tools=[get_encouragement],
-            prompt=prompt,
-        )
-        executor = AgentExecutor(agent=agent, tools=tools)
-        return executor.invoke(inputs)
-    from langsmith.schemas import Run, Example
-    
-    from langsmith.evaluation import evaluate, LangChainStringEvaluator
-    
-    def must_mention(run: Run, example: Example) -> dict:
-        prediction = run.outputs.get("output") or ""
-        required = example.outputs.get("must_mention") or []
-        score = all(phrase in prediction for phrase in required)
-        return {"key":"must_mention", "score": score}
-    
-    evaluators = [
-      must_mention,
-      LangChainStringEvaluator(
-        "criteria",
-        config={"criteria":  "harmfulness"}
-      ),
-      LangChainStringEvaluator(
-        "criteria",
-        config={
-          "criteria": {
-            "cliche": "Are the lyrics cliche?"
-            " Respond Y if they are, N if they're entirely unique."
-          }
+
+    # Create examples
+    examples = [
+        {
+            "inputs": {"question": "Which country is Mount Kilimanjaro located in?"},
+            "outputs": {"answer": "Mount Kilimanjaro is located in Tanzania."},
         },
-      ),
-    ]
-    
-    experiment_results = evaluate(
-        predict,
-        data=dataset_name,
-        evaluators=evaluators,
-        experiment_prefix="agent-rap-generator",
-        # Any experiment metadata can be specified here
-        metadata={
-          "version": "1.0.0",
-          "variant": "agent",
+        {
+            "inputs": {"question": "What is Earth's lowest point?"},
+            "outputs": {"answer": "Earth's lowest point is The Dead Sea."},
         },
-    )
+    ]
 
+    # Add examples to the dataset
+    client.create_examples(dataset_id=dataset.id, examples=examples)
+    from langsmith import wrappers
+    from openai import OpenAI
 
-def test_code_block_3():
-    from langchain_openai import ChatOpenAI
-    
-    llm = ChatOpenAI(model="gpt-4o-mini", temperature=0)
-    def predict(inputs: dict):
-        return {"output": llm.invoke(inputs['question']).content}
-    from langsmith.schemas import Run, Example
-    
-    from langsmith.evaluation import evaluate, LangChainStringEvaluator
-    
-    def must_mention(run: Run, example: Example) -> dict:
-        prediction = run.outputs.get("output") or ""
-        required = example.outputs.get("must_mention") or []
-        score = all(phrase in prediction for phrase in required)
-        return {"key":"must_mention", "score": score}
-    
-    evaluators = [
-      must_mention,
-      LangChainStringEvaluator(
-        "criteria",
-        config={"criteria":  "harmfulness"}
-      ),
-      LangChainStringEvaluator(
-        "criteria",
-        config={
-          "criteria": {
-            "cliche": "Are the lyrics cliche?"
-            " Respond Y if they are, N if they're entirely unique."
-          }
-        },
-      ),
-    ]
-    
-    experiment_results = evaluate(
-        predict,
-        data=dataset_name,
-        evaluators=evaluators,
-        experiment_prefix="llm-rap-generator",
-        # Any experiment metadata can be specified here
-        metadata={
-          "version": "1.0.0",
-          "variant": "raw-llm",
-        },
-    )
+    # Wrap the OpenAI client for LangSmith tracing
+    openai_client = wrappers.wrap_openai(OpenAI())
 
+    # Define the application logic you want to evaluate inside a target function
+    # The SDK will automatically send the inputs from the dataset to your target function
+    def target(inputs: dict) -> dict:
+        response = openai_client.chat.completions.create(
+            model="gpt-4o-mini",
+            messages=[
+                {"role": "system", "content": "Answer the following question accurately"},
+                {"role": "user", "content": inputs["question"]},
+            ],
+        )
+        return { "answer": response.choices[0].message.content.strip() }
+    from openevals.llm import create_llm_as_judge
+    from openevals.prompts import CORRECTNESS_PROMPT
+
+    def correctness_evaluator(inputs: dict, outputs: dict, reference_outputs: dict):
+        evaluator = create_llm_as_judge(
+            prompt=CORRECTNESS_PROMPT,
+            model="openai:o3-mini",
+            feedback_key="correctness",
+        )
+        eval_result = evaluator(
+            inputs=inputs,
+            outputs=outputs,
+            reference_outputs=reference_outputs
+        )
+        return eval_result
+    return locals()
 
-def test_code_block_4():
-    # If your predictor is stateful (e.g. it has memory),
-    # You can create a new instance of the predictor for each row in the dataset.
-    class MyPredictor:
-        def __init__(self):
-            self.state = 0
-        
-        def predict(self, input_: dict) -> dict:
-            if self.state > 0:
-                raise ValueError("This predictor is stateful and can only be called once.")
-            self.state += 1
-            return {"output": f"Bar Bar Bar {self.state}"}
-    
-    def predict(inputs: dict) -> dict:
-        predictor = MyPredictor()
-        # Return the function that will be called on the next row
-        return predictor.predict(inputs)
-    
-    from langsmith.schemas import Run, Example
-    
-    from langsmith.evaluation import evaluate, LangChainStringEvaluator
-    
-    def must_mention(run: Run, example: Example) -> dict:
-        prediction = run.outputs.get("output") or ""
-        required = example.outputs.get("must_mention") or []
-        score = all(phrase in prediction for phrase in required)
-        return {"key":"must_mention", "score": score}
-    
-    evaluators = [
-      must_mention,
-      LangChainStringEvaluator(
-        "criteria",
-        config={"criteria":  "harmfulness"}
-      ),
-      LangChainStringEvaluator(
-        "criteria",
-        config={
-          "criteria": {
-            "cliche": "Are the lyrics cliche?"
-            " Respond Y if they are, N if they're entirely unique."
-          }
-        },
-      ),
-    ]
-    
-    experiment_results = evaluate(
-        predict,
-        data=dataset_name,
-        evaluators=evaluators,
-        experiment_prefix="class-rap-generator",
-        # Any experiment metadata can be specified here
-        metadata={
-          "version": "1.0.0",
-          "variant": "custom-class",
-        },
-    )
 
+def test_code_block_0(tutorial_setup):
+    globals().update(tutorial_setup)
+    # After running the evaluation, a link will be provided to view the results in langsmith
+    experiment_results = client.evaluate(
+        target,
+        data="Sample dataset",
+        evaluators=[
+            correctness_evaluator,
+            # can add multiple evaluators here
+        ],
+        experiment_prefix="first-eval-in-langsmith",
+        max_concurrency=2,
+    )
@@ -0,0 +1,54 @@
+"""Regression tests for how doc snippets are classified as async."""
+import io
+import subprocess
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parents[2] / "_scripts"))
+
+import extract_python_blocks  # noqa: E402
+import run_snippets  # noqa: E402
+
+ASYNCIO_RUN_SNIPPET = """import asyncio
+
+
+async def main():
+    await asyncio.sleep(0)
+    print("done")
+
+
+asyncio.run(main())"""
+
+
+def test_asyncio_run_is_not_async():
+    assert not extract_python_blocks.is_async_code(ASYNCIO_RUN_SNIPPET)
+
+
+def test_top_level_await_is_async():
+    assert extract_python_blocks.is_async_code("import asyncio\nawait asyncio.sleep(0)")
+    assert extract_python_blocks.is_async_code("async with lock:\n    pass")
+
+
+def test_asyncio_run_snippet_runs():
+    snippet = run_snippets.Snippet(
+        "page.mdx",
+        0,
+        1,
+        ASYNCIO_RUN_SNIPPET,
+        is_async=extract_python_blocks.is_async_code(ASYNCIO_RUN_SNIPPET),
+        uses_setup=False,
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", run_snippets.build_program(snippet, "")],
+        capture_output=True,
+        text=True,
+    )
+    assert result.returncode == 0, result.stderr
+    assert result.stdout == "done\n"
+
+
+def test_asyncio_run_snippet_gets_a_sync_test():
+    module = io.StringIO()
+    extract_python_blocks.write_pytest_module([ASYNCIO_RUN_SNIPPET], module)
+    assert "\ndef test_code_block_0():" in module.getvalue()
+    assert "async def test_code_block_0" not in module.getvalue()
@@ -0,0 +1,26 @@
+"""Regression tests for the names of the generated pytest modules."""
+import sys
+from collections import Counter
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parents[2] / "_scripts"))
+
+import extract_doc_snippets  # noqa: E402
+
+
+def test_module_basenames_are_unique(tmp_path, monkeypatch):
+    # pytest imports modules outside packages by basename, so two generated
+    # modules with the same name can't be collected together.
+    monkeypatch.setattr(extract_doc_snippets, "PY_TESTS_ROOT", tmp_path / "py")
+    monkeypatch.setattr(extract_doc_snippets, "JS_TESTS_ROOT", tmp_path / "js")
+    results = extract_doc_snippets.extract_files(
+        extract_doc_snippets.discover_mdx_files(), workers=1
+    )
+    modules = [
+        Path(output).name
+        for result in results
+        for output in result.outputs
+        if output.endswith(".py")
+    ]
+    assert modules
+    assert [name for name, count in Counter(modules).items() if count > 1] == []
@@ -0,0 +1,49 @@
+"""Regression tests for the keys of the snippet results cache."""
+import importlib.util
+import sys
+import types
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parents[2] / "_scripts"))
+
+import snippet_results  # noqa: E402
+
+SNIPPET_MODULE = """import pytest
+
+
+def test_code_block_0():
+    print("traced")
+"""
+
+
+def _item(tmp_path: Path) -> types.SimpleNamespace:
+    """A stand-in for the pytest item of a generated snippet test."""
+    path = tmp_path / "test_page.py"
+    path.write_text(SNIPPET_MODULE)
+    spec = importlib.util.spec_from_file_location("test_page", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return types.SimpleNamespace(function=module.test_code_block_0, module=module)
+
+
+def test_mock_pass_does_not_satisfy_live_run(tmp_path, monkeypatch):
+    item = _item(tmp_path)
+    results = snippet_results.SnippetResults(tmp_path / "results.json")
+    monkeypatch.delenv("LANGCHAIN_ENDPOINT", raising=False)
+    monkeypatch.setenv("LANGSMITH_ENDPOINT", "http://127.0.0.1:40123")
+    results.record(snippet_results.snippet_key(item))
+
+    monkeypatch.delenv("LANGSMITH_ENDPOINT")
+    assert not results.passed(snippet_results.snippet_key(item))
+
+
+def test_mock_pass_satisfies_next_mock_run(tmp_path, monkeypatch):
+    item = _item(tmp_path)
+    results = snippet_results.SnippetResults(tmp_path / "results.json")
+    monkeypatch.delenv("LANGCHAIN_ENDPOINT", raising=False)
+    monkeypatch.setenv("LANGSMITH_ENDPOINT", "http://127.0.0.1:40123")
+    results.record(snippet_results.snippet_key(item))
+
+    # Each mock server listens on a free port.
+    monkeypatch.setenv("LANGSMITH_ENDPOINT", "http://127.0.0.1:40777")
+    assert results.passed(snippet_results.snippet_key(item))